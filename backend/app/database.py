@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from sqlalchemy import create_engine, Column, Index, Integer, String, DateTime, LargeBinary, Text, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -27,6 +27,63 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     last_login = Column(DateTime, default=datetime.utcnow)
 
+class AuthToken(Base):
+    __tablename__ = "auth_tokens"
+    
+    token_hash = Column(String, primary_key=True)  # SHA-256 of the bearer token; the token itself is not stored
+    username = Column(String, index=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+    
+    id = Column(String, primary_key=True, index=True)
+    document_id = Column(String, index=True, nullable=False)
+    filename = Column(String, nullable=False)
+    file_path = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    status = Column(String, index=True, nullable=False, default="queued")  # queued, parsing, embedding, indexing, completed, failed
+    pages_total = Column(Integer, nullable=True)
+    pages_parsed = Column(Integer, nullable=False, default=0)
+    chunks_total = Column(Integer, nullable=True)
+    chunks_embedded = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Document(Base):
+    __tablename__ = "documents"
+    
+    id = Column(String, primary_key=True, index=True)
+    content_hash = Column(String, unique=True, index=True, nullable=False)  # SHA-256 of the uploaded bytes
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    file_path = Column(String, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class DocumentOwner(Base):
+    __tablename__ = "document_owners"
+    __table_args__ = (UniqueConstraint("document_id", "owner", name="uq_document_owner"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(String, index=True, nullable=False)
+    owner = Column(String, index=True, nullable=False)  # Username, or "" for anonymous uploads
+    filename = Column(String, nullable=False)  # Name this owner uploaded it under
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class BankItem(Base):
+    __tablename__ = "generation_bank"
+    # Covers the per-document item count and newest id GenerationBank checks on every request
+    __table_args__ = (Index("ix_generation_bank_kind_document", "kind", "document_id", "id"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(String, index=True, nullable=False)
+    kind = Column(String, index=True, nullable=False)  # "card", or the question type of a quiz question
+    item = Column(Text, nullable=False)  # JSON of the question or card
+    embedding = Column(LargeBinary, nullable=False)  # float32 embedding of the question or card front
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 # Create tables
 Base.metadata.create_all(bind=engine)
 
@@ -54,6 +111,11 @@ def migrate_database():
             if 'last_name' not in columns:
                 cursor.execute("ALTER TABLE users ADD COLUMN last_name VARCHAR;")
             
+            # Index added after the generation bank table
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS ix_generation_bank_kind_document ON generation_bank(kind, document_id, id);"
+            )
+            
             conn.commit()
         except Exception:
             conn.rollback()
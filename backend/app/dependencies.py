@@ -0,0 +1,163 @@
+import threading
+from app.services.embeddings import EmbeddingService
+from app.services.vector_store import VectorStore
+from app.services.rag import RAGService
+from app.services.workers import IngestionWorkers
+from app.services.ingestion import IngestionPipeline
+from app.services.answer_cache import AnswerCache
+from app.services.query_batcher import QueryBatcher
+from app.services.generation_bank import GenerationBank
+
+class ServiceContainer:
+    """
+    Process-wide holder for the heavy services.
+    
+    The embedding model and the FAISS index are built once per worker and
+    shared by every router, so an upload is visible to all endpoints as soon
+    as it is indexed.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._embedding_service = None
+        self._vector_store = None
+        self._rag_service = None
+        self._answer_cache = None
+        self._query_batcher = None
+        self._generation_bank = None
+        self._workers = None
+        self._pipeline = None
+    
+    @property
+    def embedding_service(self) -> EmbeddingService:
+        if self._embedding_service is None:
+            with self._lock:
+                if self._embedding_service is None:
+                    self._embedding_service = EmbeddingService()
+        return self._embedding_service
+    
+    @property
+    def vector_store(self) -> VectorStore:
+        if self._vector_store is None:
+            dimension = self.embedding_service.get_dimension()
+            with self._lock:
+                if self._vector_store is None:
+                    vector_store = VectorStore()
+                    vector_store.load(dimension)
+                    self._vector_store = vector_store
+        return self._vector_store
+    
+    @property
+    def answer_cache(self) -> AnswerCache:
+        if self._answer_cache is None:
+            with self._lock:
+                if self._answer_cache is None:
+                    self._answer_cache = AnswerCache()
+        return self._answer_cache
+    
+    @property
+    def query_batcher(self) -> QueryBatcher:
+        if self._query_batcher is None:
+            embedding_service = self.embedding_service
+            vector_store = self.vector_store
+            with self._lock:
+                if self._query_batcher is None:
+                    self._query_batcher = QueryBatcher(embedding_service, vector_store)
+        return self._query_batcher
+    
+    @property
+    def generation_bank(self) -> GenerationBank:
+        if self._generation_bank is None:
+            with self._lock:
+                if self._generation_bank is None:
+                    self._generation_bank = GenerationBank()
+        return self._generation_bank
+    
+    @property
+    def rag_service(self) -> RAGService:
+        if self._rag_service is None:
+            vector_store = self.vector_store
+            embedding_service = self.embedding_service
+            answer_cache = self.answer_cache
+            query_batcher = self.query_batcher
+            generation_bank = self.generation_bank
+            with self._lock:
+                if self._rag_service is None:
+                    self._rag_service = RAGService(
+                        vector_store, embedding_service, answer_cache, query_batcher, generation_bank
+                    )
+        return self._rag_service
+    
+    @property
+    def workers(self) -> IngestionWorkers:
+        if self._workers is None:
+            with self._lock:
+                if self._workers is None:
+                    self._workers = IngestionWorkers()
+        return self._workers
+    
+    @property
+    def pipeline(self) -> IngestionPipeline:
+        if self._pipeline is None:
+            embedding_service = self.embedding_service
+            vector_store = self.vector_store
+            workers = self.workers
+            # Banks are built with the LLM, so the RAG service is only needed when they are on
+            rag_service = self.rag_service if self.generation_bank.enabled else None
+            with self._lock:
+                if self._pipeline is None:
+                    self._pipeline = IngestionPipeline(embedding_service, vector_store, workers, rag_service)
+        return self._pipeline
+    
+    async def start(self):
+        """Load the model and index and start background ingestion."""
+        await self.pipeline.start()
+    
+    async def shutdown(self):
+        """Stop background ingestion and release worker pools."""
+        if self._pipeline is not None:
+            await self._pipeline.stop()
+        if self._workers is not None:
+            self._workers.shutdown()
+            self._workers = None
+        if self._query_batcher is not None:
+            self._query_batcher.shutdown()
+            self._query_batcher = None
+
+container = ServiceContainer()
+
+def get_container() -> ServiceContainer:
+    """Get the process-wide service container."""
+    return container
+
+def get_embedding_service() -> EmbeddingService:
+    """Get the shared embedding service."""
+    return container.embedding_service
+
+def get_vector_store() -> VectorStore:
+    """Get the shared vector store."""
+    return container.vector_store
+
+def get_answer_cache() -> AnswerCache:
+    """Get the shared answer cache."""
+    return container.answer_cache
+
+def get_query_batcher() -> QueryBatcher:
+    """Get the shared query embedding batcher."""
+    return container.query_batcher
+
+def get_generation_bank() -> GenerationBank:
+    """Get the shared quiz and flashcard bank."""
+    return container.generation_bank
+
+def get_workers() -> IngestionWorkers:
+    """Get the shared ingestion worker pools."""
+    return container.workers
+
+def get_pipeline() -> IngestionPipeline:
+    """Get the shared ingestion pipeline."""
+    return container.pipeline
+
+def get_rag_service() -> RAGService:
+    """Get the shared RAG service."""
+    return container.rag_service
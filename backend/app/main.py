@@ -2,9 +2,11 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.routers import documents, questions, quizzes, flashcards, auth
+from app.dependencies import container
 
 app = FastAPI(
     title="AI Study Assistant API",
@@ -12,6 +14,58 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Multipart overhead allowed on top of the file itself
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+class UploadSizeLimit:
+    """
+    Rejects uploads over the limit with 413 before the body is read.
+    
+    A Content-Length over the limit is rejected at once. Bodies sent without
+    one (chunked uploads) are counted as they arrive, and the request ends
+    with 413 as soon as they pass the limit, before the form parser spools
+    the rest. Registered before CORS so the 413 still carries CORS headers.
+    """
+    
+    def __init__(self, app, path: str, max_bytes: int):
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes
+    
+    def _detail(self) -> str:
+        return f"File is too large. The maximum upload size is {documents.MAX_UPLOAD_BYTES // (1024 * 1024)} MB."
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+        
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await JSONResponse(status_code=413, content={"detail": self._detail()})(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while the form is parsed, which FastAPI passes on
+                    # to its HTTPException handler
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(
+    UploadSizeLimit,
+    path="/api/documents/upload",
+    max_bytes=documents.MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES
+)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -28,6 +82,16 @@ app.include_router(questions.router, prefix="/api/questions", tags=["questions"]
 app.include_router(quizzes.router, prefix="/api/quizzes", tags=["quizzes"])
 app.include_router(flashcards.router, prefix="/api/flashcards", tags=["flashcards"])
 
+@app.on_event("startup")
+async def load_shared_services():
+    """Load the embedding model and vector index once per worker and start ingestion."""
+    await container.start()
+
+@app.on_event("shutdown")
+async def release_shared_services():
+    """Stop background ingestion and the worker pools."""
+    await container.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "AI Study Assistant API is running"}
@@ -40,15 +104,15 @@ async def health():
 async def test_openai():
     """Test OpenAI API connection."""
     import os
-    from openai import OpenAI
+    from openai import AsyncOpenAI
     
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         return {"status": "error", "message": "OPENAI_API_KEY not found in environment"}
     
     try:
-        client = OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
+        client = AsyncOpenAI(api_key=api_key)
+        response = await client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": "Say 'API test successful' if you can read this."}],
             max_tokens=10
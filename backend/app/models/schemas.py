@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import datetime
 
 class DocumentUpload(BaseModel):
     filename: str
@@ -10,6 +11,21 @@ class DocumentResponse(BaseModel):
     filename: str
     chunks_count: int
     status: str
+    job_id: Optional[str] = None
+    duplicate: bool = False  # Same bytes were already uploaded; existing chunks are reused
+
+class IngestionJobResponse(BaseModel):
+    id: str
+    document_id: str
+    filename: str
+    status: str
+    pages_total: Optional[int] = None
+    pages_parsed: int
+    chunks_total: Optional[int] = None
+    chunks_embedded: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
 
 class QuestionRequest(BaseModel):
     question: str
@@ -21,6 +37,8 @@ class QuestionResponse(BaseModel):
     answer: str
     sources: List[dict]
     confidence: float
+    # prompt_tokens, completion_tokens, total_tokens and context_tokens
+    usage: Optional[dict] = None
 
 class QuizRequest(BaseModel):
     topic: Optional[str] = None
@@ -37,6 +55,7 @@ class QuizQuestion(BaseModel):
 class QuizResponse(BaseModel):
     questions: List[QuizQuestion]
     topic: str
+    usage: Optional[dict] = None
 
 class FlashcardRequest(BaseModel):
     text: Optional[str] = None
@@ -51,4 +70,5 @@ class Flashcard(BaseModel):
 
 class FlashcardResponse(BaseModel):
     cards: List[Flashcard]
+    usage: Optional[dict] = None
 
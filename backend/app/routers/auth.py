@@ -1,13 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from passlib.context import CryptContext
-from app.database import get_db, User
-from datetime import datetime
+from typing import Optional
+from app.database import get_db, User, AuthToken
+from datetime import datetime, timedelta
+import hashlib
+import os
+import secrets
 
 router = APIRouter()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Days a token from sign up or sign in stays valid
+AUTH_TOKEN_DAYS = int(os.getenv("AUTH_TOKEN_DAYS", "30"))
+
 class UserSignUp(BaseModel):
     username: str  # This will be the UNCW email
     password: str
@@ -30,6 +37,7 @@ class UserResponse(BaseModel):
     major: str
     created_at: str
     last_login: str
+    token: str = None  # Bearer token for requests made as this user
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
@@ -45,6 +53,42 @@ def get_password_hash(password: str) -> str:
         password = password[:72]
     return pwd_context.hash(password)
 
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def issue_token(db: Session, username: str) -> str:
+    """Create a bearer token for a user."""
+    token = secrets.token_urlsafe(32)
+    db.add(AuthToken(token_hash=_token_hash(token), username=username))
+    db.commit()
+    return token
+
+def get_current_user(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)) -> Optional[str]:
+    """
+    Username of the bearer token sent with the request, or None without one.
+    
+    An unknown or expired token is rejected with 401 rather than treated as
+    anonymous.
+    """
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Invalid authorization header")
+    auth_token = db.query(AuthToken).filter(
+        AuthToken.token_hash == _token_hash(token.strip()),
+        AuthToken.created_at >= datetime.utcnow() - timedelta(days=AUTH_TOKEN_DAYS)
+    ).first()
+    if auth_token is None:
+        raise HTTPException(status_code=401, detail="Session expired. Please sign in again.")
+    return auth_token.username
+
+def require_current_user(username: Optional[str] = Depends(get_current_user)) -> str:
+    """Username of the signed-in user; 401 if the request carries no token."""
+    if username is None:
+        raise HTTPException(status_code=401, detail="Please sign in first")
+    return username
+
 @router.post("/signup", response_model=UserResponse)
 async def signup(user_data: UserSignUp, db: Session = Depends(get_db)):
     """Create a new user account."""
@@ -82,7 +126,8 @@ async def signup(user_data: UserSignUp, db: Session = Depends(get_db)):
         year=new_user.year,
         major=new_user.major,
         created_at=new_user.created_at.isoformat() if new_user.created_at else "",
-        last_login=new_user.last_login.isoformat() if new_user.last_login else ""
+        last_login=new_user.last_login.isoformat() if new_user.last_login else "",
+        token=issue_token(db, new_user.username)
     )
 
 @router.post("/signin", response_model=UserResponse)
@@ -109,7 +154,8 @@ async def signin(user_data: UserSignIn, db: Session = Depends(get_db)):
         year=user.year,
         major=user.major,
         created_at=user.created_at.isoformat() if user.created_at else "",
-        last_login=user.last_login.isoformat() if user.last_login else ""
+        last_login=user.last_login.isoformat() if user.last_login else "",
+        token=issue_token(db, user.username)
     )
 
 @router.get("/user/{username}", response_model=UserResponse)
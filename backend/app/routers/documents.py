@@ -1,55 +1,129 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional, Tuple
+import hashlib
 import os
 import uuid
 from pathlib import Path
-from app.models.schemas import DocumentResponse
+from app.models.schemas import DocumentResponse, IngestionJobResponse
 from app.services.document_processor import DocumentProcessor
-from app.services.embeddings import EmbeddingService
+from app.services.ingestion import IngestionPipeline, JOB_COMPLETED, JOB_FAILED
+from app.services.document_registry import DocumentRegistry
 from app.services.vector_store import VectorStore
+from app.services.answer_cache import AnswerCache
+from app.services.generation_bank import GenerationBank
+from app.dependencies import get_answer_cache, get_generation_bank, get_pipeline, get_vector_store
+from app.routers.auth import get_current_user, require_current_user
 
 router = APIRouter()
 
-# Initialize services (in production, use dependency injection)
-embedding_service = EmbeddingService()
-vector_store = VectorStore()
-vector_store.load(embedding_service.get_dimension())
-
 # Path relative to project root
 PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
 UPLOAD_DIR = PROJECT_ROOT / "data" / "uploads"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Uploads are copied in blocks of this size, so memory per upload stays bounded
+UPLOAD_BLOCK_SIZE = int(os.getenv("UPLOAD_BLOCK_KB", "1024")) * 1024
+# Larger uploads are rejected with 413
+MAX_UPLOAD_BYTES = int(float(os.getenv("UPLOAD_MAX_MB", "50")) * 1024 * 1024)
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File is too large. The maximum upload size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB."
+    )
+
+async def _save_upload(file: UploadFile, path: Path) -> Tuple[str, int]:
+    """
+    Stream an upload to path in blocks, hashing it as it is written.
+    
+    Stops with 413 as soon as the upload passes MAX_UPLOAD_BYTES.
+    
+    Returns:
+        (sha256 hex digest, size in bytes)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as f:
+        while True:
+            block = await file.read(UPLOAD_BLOCK_SIZE)
+            if not block:
+                break
+            size += len(block)
+            if size > MAX_UPLOAD_BYTES:
+                raise _too_large()
+            digest.update(block)
+            await run_in_threadpool(f.write, block)
+    return digest.hexdigest(), size
+
 @router.post("/upload", response_model=DocumentResponse)
-async def upload_document(file: UploadFile = File(...)):
-    """Upload and process a document."""
+async def upload_document(
+    file: UploadFile = File(...),
+    owner: Optional[str] = Depends(get_current_user),
+    pipeline: IngestionPipeline = Depends(get_pipeline)
+):
+    """
+    Upload a document and queue it for processing.
+    
+    Returns immediately with a job id; poll /jobs/{job_id} for progress.
+    The document is linked to the signed-in user, or stored as an anonymous
+    upload without a token. If the same bytes were uploaded before, the
+    existing document is linked and its chunks and vectors are reused.
+    """
+    # Checked before any of the file is copied
+    if file.content_type not in DocumentProcessor.SUPPORTED_TYPES:
+        raise HTTPException(status_code=400, detail="Unsupported file type. Please upload PDF, DOCX, or TXT files only.")
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise _too_large()
+    
     try:
-        # Save file
-        document_id = str(uuid.uuid4())
-        file_path = UPLOAD_DIR / f"{document_id}_{file.filename}"
-        
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Save under a temporary name until the content hash is known
+        tmp_path = UPLOAD_DIR / f".upload_{uuid.uuid4()}"
+        try:
+            content_hash, size = await _save_upload(file, tmp_path)
+            
+            existing = DocumentRegistry.find_by_hash(content_hash)
+            if existing is None:
+                document_id = str(uuid.uuid4())
+                file_path = UPLOAD_DIR / f"{document_id}_{file.filename}"
+                os.replace(tmp_path, file_path)
+                document = DocumentRegistry.register(
+                    document_id, content_hash, file.filename, file.content_type, str(file_path), size
+                )
+                if document.id == document_id:
+                    DocumentRegistry.add_owner(document_id, owner, file.filename)
+                    # Parse, embed and index in the background
+                    job_id = pipeline.submit(document_id, file.filename, str(file_path), file.content_type)
+                    return DocumentResponse(
+                        id=document_id,
+                        filename=file.filename,
+                        chunks_count=0,
+                        status="queued",
+                        job_id=job_id
+                    )
+                # Another worker registered the same bytes first
+                file_path.unlink(missing_ok=True)
+                existing = document
+        finally:
+            tmp_path.unlink(missing_ok=True)
         
-        # Process file
-        processor = DocumentProcessor()
-        text, chunks = processor.process_file(str(file_path), file.content_type)
-        
-        # Generate embeddings
-        embeddings = embedding_service.embed_batch(chunks)
-        
-        # Add to vector store
-        metadata = [(document_id, i, chunk) for i, chunk in enumerate(chunks)]
-        vector_store.add_embeddings(embeddings, metadata)
-        vector_store.save()
+        # Same bytes already uploaded: link the owner and reuse the chunks
+        DocumentRegistry.add_owner(existing.id, owner, file.filename)
+        job = pipeline.latest_job(existing.id)
+        if job is None or job.status == JOB_FAILED:
+            job_id = pipeline.submit(existing.id, existing.filename, existing.file_path, existing.content_type)
+            job = pipeline.get_job(job_id)
         
         return DocumentResponse(
-            id=document_id,
+            id=existing.id,
             filename=file.filename,
-            chunks_count=len(chunks),
-            status="processed"
+            chunks_count=(job.chunks_total or 0) if job.status == JOB_COMPLETED else 0,
+            status=job.status,
+            job_id=job.id,
+            duplicate=True
         )
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_msg = str(e)
@@ -57,13 +131,32 @@ async def upload_document(file: UploadFile = File(...)):
         print(traceback.format_exc())
         
         # Provide more helpful error messages
-        if "Unsupported file type" in error_msg:
-            error_msg = f"Unsupported file type. Please upload PDF, DOCX, or TXT files only."
-        elif "No such file" in error_msg or "Permission denied" in error_msg:
+        if "No such file" in error_msg or "Permission denied" in error_msg:
             error_msg = "File upload failed. Please check file permissions."
         
         raise HTTPException(status_code=500, detail=error_msg)
 
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_ingestion_job(job_id: str):
+    """Get the progress of a document ingestion job."""
+    job = IngestionPipeline.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return IngestionJobResponse(
+        id=job.id,
+        document_id=job.document_id,
+        filename=job.filename,
+        status=job.status,
+        pages_total=job.pages_total,
+        pages_parsed=job.pages_parsed,
+        chunks_total=job.chunks_total,
+        chunks_embedded=job.chunks_embedded,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
 @router.get("/list")
 async def list_documents():
     """List all uploaded documents."""
@@ -71,8 +164,50 @@ async def list_documents():
     return {"documents": []}
 
 @router.delete("/{document_id}")
-async def delete_document(document_id: str):
-    """Delete a document."""
-    # In production, implement proper deletion
-    return {"message": "Document deleted"}
-
+async def delete_document(
+    document_id: str,
+    owner: str = Depends(require_current_user),
+    vector_store: VectorStore = Depends(get_vector_store),
+    answer_cache: AnswerCache = Depends(get_answer_cache),
+    generation_bank: GenerationBank = Depends(get_generation_bank)
+):
+    """
+    Remove the signed-in user's link to a document.
+    
+    The document and its chunks are deleted once no owners are left.
+    Documents uploaded before owners were tracked have none and are deleted
+    outright. Anonymous uploads cannot be deleted through the API.
+    """
+    remaining = DocumentRegistry.remove_owner(document_id, owner)
+    if remaining is None and DocumentRegistry.has_owners(document_id):
+        # Someone else's document
+        raise HTTPException(status_code=404, detail="Document not found")
+    if remaining:
+        return {"message": "Document unlinked", "chunks_deleted": 0}
+    
+    # Remove the uploaded file first: an ingestion job still running checks
+    # for it after adding chunks, and removes them if it is gone
+    removed_files = 0
+    for file_path in UPLOAD_DIR.glob(f"{document_id}_*"):
+        file_path.unlink(missing_ok=True)
+        removed_files += 1
+    
+    # Apply the delete on top of anything other workers have saved
+    await run_in_threadpool(vector_store.reload_if_changed, vector_store.dimension)
+    chunks_deleted = await run_in_threadpool(vector_store.delete_document, document_id)
+    
+    if chunks_deleted == 0 and removed_files == 0:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    DocumentRegistry.delete(document_id)
+    
+    # Cached answers citing the document would outlive it
+    answer_cache.invalidate_documents([document_id])
+    generation_bank.delete_document(document_id)
+    
+    if chunks_deleted:
+        # Physically drop deleted vectors once enough have accumulated
+        if not await run_in_threadpool(vector_store.maybe_compact):
+            await run_in_threadpool(vector_store.maybe_snapshot)
+    
+    return {"message": "Document deleted", "chunks_deleted": chunks_deleted}
@@ -1,28 +1,26 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from starlette.concurrency import run_in_threadpool
 from app.models.schemas import FlashcardRequest, FlashcardResponse, Flashcard
 from app.services.rag import RAGService
-from app.services.embeddings import EmbeddingService
-from app.services.vector_store import VectorStore
+from app.dependencies import get_rag_service
 
 router = APIRouter()
 
-embedding_service = EmbeddingService()
-vector_store = VectorStore()
-vector_store.load(embedding_service.get_dimension())
-rag_service = RAGService(vector_store, embedding_service)
-
 @router.post("/generate", response_model=FlashcardResponse)
-async def generate_flashcards(request: FlashcardRequest):
+async def generate_flashcards(request: FlashcardRequest, rag_service: RAGService = Depends(get_rag_service)):
     """Generate flashcards from text or documents."""
     try:
-        result = rag_service.generate_flashcards(
+        await run_in_threadpool(
+            rag_service.vector_store.reload_if_changed, rag_service.embedding_service.get_dimension()
+        )
+        result = await rag_service.generate_flashcards(
             text=request.text,
             num_cards=request.num_cards,
             document_ids=request.document_ids
         )
         
-        # Check for errors
-        if "error" in result:
+        # Check for errors; banked cards are still returned if live generation failed
+        if "error" in result and not result.get("cards"):
             # Return empty cards with error info
             return FlashcardResponse(cards=[])
         
@@ -30,7 +28,7 @@ async def generate_flashcards(request: FlashcardRequest):
             Flashcard(**c) for c in result.get("cards", [])
         ]
         
-        return FlashcardResponse(cards=cards)
+        return FlashcardResponse(cards=cards, usage=result.get("usage"))
     except Exception as e:
         import traceback
         print(f"Error in generate_flashcards endpoint: {str(e)}")
@@ -1,24 +1,21 @@
-from fastapi import APIRouter
+import json
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from app.models.schemas import QuestionRequest, QuestionResponse
 from app.services.rag import RAGService
-from app.services.embeddings import EmbeddingService
-from app.services.vector_store import VectorStore
+from app.services.answer_cache import AnswerCache
+from app.dependencies import get_answer_cache, get_rag_service
 
 router = APIRouter()
 
-# Initialize services
-embedding_service = EmbeddingService()
-vector_store = VectorStore()
-vector_store.load(embedding_service.get_dimension())
-rag_service = RAGService(vector_store, embedding_service)
-
 @router.post("/ask", response_model=QuestionResponse)
-async def ask_question(request: QuestionRequest):
+async def ask_question(request: QuestionRequest, rag_service: RAGService = Depends(get_rag_service)):
     """Answer a question using RAG."""
-    # Reload vector store to ensure we have the latest documents
-    vector_store.load(embedding_service.get_dimension())
+    # Pick up documents indexed by other workers, without re-reading an unchanged index
+    await run_in_threadpool(rag_service.vector_store.reload_if_changed, rag_service.embedding_service.get_dimension())
     
-    result = rag_service.answer_question(
+    result = await rag_service.answer_question(
         question=request.question,
         document_ids=request.document_ids,
         user_major=request.user_major,
@@ -28,6 +25,37 @@ async def ask_question(request: QuestionRequest):
     return QuestionResponse(
         answer=result["answer"],
         sources=result["sources"],
-        confidence=result["confidence"]
+        confidence=result["confidence"],
+        usage=result.get("usage")
+    )
+
+@router.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest, rag_service: RAGService = Depends(get_rag_service)):
+    """
+    Answer a question using RAG as a server-sent event stream.
+    
+    Emits a "sources" event first, then "delta" events with answer text as it
+    is generated, then "done" with the confidence and token usage (or "error").
+    """
+    await run_in_threadpool(rag_service.vector_store.reload_if_changed, rag_service.embedding_service.get_dimension())
+    
+    async def event_stream():
+        async for event, data in rag_service.answer_question_stream(
+            question=request.question,
+            document_ids=request.document_ids,
+            user_major=request.user_major,
+            user_year=request.user_year
+        ):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@router.get("/cache/stats")
+async def answer_cache_stats(answer_cache: AnswerCache = Depends(get_answer_cache)):
+    """Answer cache hit rate and size for this worker, for tuning the similarity threshold."""
+    return answer_cache.stats()
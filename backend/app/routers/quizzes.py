@@ -1,29 +1,27 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from starlette.concurrency import run_in_threadpool
 from app.models.schemas import QuizRequest, QuizResponse, QuizQuestion
 from app.services.rag import RAGService
-from app.services.embeddings import EmbeddingService
-from app.services.vector_store import VectorStore
+from app.dependencies import get_rag_service
 
 router = APIRouter()
 
-embedding_service = EmbeddingService()
-vector_store = VectorStore()
-vector_store.load(embedding_service.get_dimension())
-rag_service = RAGService(vector_store, embedding_service)
-
 @router.post("/generate", response_model=QuizResponse)
-async def generate_quiz(request: QuizRequest):
+async def generate_quiz(request: QuizRequest, rag_service: RAGService = Depends(get_rag_service)):
     """Generate a quiz from documents."""
     try:
-        result = rag_service.generate_quiz(
+        await run_in_threadpool(
+            rag_service.vector_store.reload_if_changed, rag_service.embedding_service.get_dimension()
+        )
+        result = await rag_service.generate_quiz(
             topic=request.topic,
             num_questions=request.num_questions,
             question_type=request.question_type,
             document_ids=request.document_ids
         )
         
-        # Check for errors
-        if "error" in result:
+        # Check for errors; banked questions are still returned if live generation failed
+        if "error" in result and not result.get("questions"):
             # Return empty quiz with error info
             return QuizResponse(
                 questions=[],
@@ -36,7 +34,8 @@ async def generate_quiz(request: QuizRequest):
         
         return QuizResponse(
             questions=questions,
-            topic=result.get("topic", "general")
+            topic=result.get("topic", "general"),
+            usage=result.get("usage")
         )
     except Exception as e:
         import traceback
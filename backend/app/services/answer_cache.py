@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+class _CacheEntry:
+    def __init__(self, key: tuple, embedding: np.ndarray, answer: dict, document_ids: set):
+        self.key = key
+        self.embedding = embedding
+        self.answer = answer
+        self.document_ids = document_ids
+        self.created_at = time.monotonic()
+
+class AnswerCache:
+    """
+    Cache of generated answers for repeated questions.
+    
+    A cached answer is reused when a new question is semantically close to
+    the cached one (cosine similarity of the question embeddings at or above
+    the threshold) and everything else that shaped the answer is identical:
+    the retrieved chunk ids, the document scope, the student's major and
+    year, and the model. Chunk ids never change meaning, so an upload or
+    delete in any worker that changes retrieval also changes the key.
+    
+    Entries expire after a TTL, the least recently used entry is evicted
+    when the cache is full, and entries citing a deleted document are
+    dropped. The cache is per worker process.
+    
+    Configuration (environment):
+        ANSWER_CACHE_SIZE: max cached answers, 0 disables (default 1000)
+        ANSWER_CACHE_TTL_SECONDS: entry lifetime (default 3600)
+        ANSWER_CACHE_SIMILARITY: min cosine similarity for a hit (default 0.95)
+    """
+    
+    def __init__(self):
+        self.max_entries = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+        self.ttl_seconds = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+        self.similarity_threshold = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+        self._lock = threading.Lock()
+        # Entries in least- to most-recently-used order
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+        # Entry ids by key, so a lookup only compares questions whose
+        # retrieval and context matched
+        self._by_key: Dict[tuple, List[int]] = {}
+        self._next_id = 0
+        self._stats = {"hits": 0, "misses": 0, "expirations": 0, "evictions": 0, "invalidations": 0}
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+    
+    @staticmethod
+    def make_key(
+        chunk_ids: Iterable[int],
+        document_ids: Optional[List[str]],
+        user_major: Optional[str],
+        user_year: Optional[str],
+        model_name: str,
+        has_documents: bool
+    ) -> tuple:
+        """Everything besides the question wording that determines an answer."""
+        scope = tuple(sorted(document_ids)) if document_ids else None
+        return (tuple(chunk_ids), scope, user_major or "", user_year or "", model_name, has_documents)
+    
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype='float32').reshape(-1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+    
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        ids = self._by_key[entry.key]
+        ids.remove(entry_id)
+        if not ids:
+            del self._by_key[entry.key]
+    
+    def get(self, question_embedding: np.ndarray, key: tuple) -> Optional[dict]:
+        """Cached answer for a similar question with the same key, or None."""
+        if not self.enabled:
+            return None
+        query = self._normalize(question_embedding)
+        now = time.monotonic()
+        
+        with self._lock:
+            best_id, best_similarity = None, self.similarity_threshold
+            for entry_id in list(self._by_key.get(key, ())):
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self._stats["expirations"] += 1
+                    continue
+                similarity = float(np.dot(entry.embedding, query))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            
+            if best_id is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self._stats["hits"] += 1
+            return self._entries[best_id].answer
+    
+    def put(self, question_embedding: np.ndarray, key: tuple, answer: dict, document_ids: Iterable[str]):
+        """Cache an answer. document_ids are the documents its sources came from."""
+        if not self.enabled:
+            return
+        entry = _CacheEntry(key, self._normalize(question_embedding), answer, set(document_ids))
+        
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._by_key.setdefault(key, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self._stats["evictions"] += 1
+    
+    def invalidate_documents(self, document_ids: Iterable[str]) -> int:
+        """
+        Drop answers that cite any of the given documents, or that were
+        scoped to them.
+        
+        Returns:
+            Number of entries dropped
+        """
+        document_ids = set(document_ids)
+        with self._lock:
+            stale = [
+                entry_id for entry_id, entry in self._entries.items()
+                if entry.document_ids & document_ids or (entry.key[1] and document_ids.intersection(entry.key[1]))
+            ]
+            for entry_id in stale:
+                self._remove(entry_id)
+            self._stats["invalidations"] += len(stale)
+        return len(stale)
+    
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._by_key.clear()
+    
+    def stats(self) -> dict:
+        """Hit/miss counters for tuning the similarity threshold."""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "lookups": lookups,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold
+            }
@@ -0,0 +1,146 @@
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+class ChunkStore:
+    """
+    On-disk chunk metadata, keyed by vector id.
+    
+    Rows live in a SQLite file next to the FAISS index, so a search only
+    reads the rows it returns and adding a document only appends its own
+    rows. Ids are allocated here, which keeps them unique across worker
+    processes sharing the store.
+    """
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # WAL lets readers in other workers proceed while one worker writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                page INTEGER
+            )
+        """)
+        # Stores created before page numbers were kept
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")]
+        if "page" not in columns:
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN page INTEGER")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_chunks_document_id ON chunks(document_id, deleted)")
+        self._conn.commit()
+    
+    def add(self, metadata: List[tuple], ids: Optional[Iterable[int]] = None) -> np.ndarray:
+        """
+        Append chunks and return their vector ids.
+        
+        Args:
+            metadata: List of (document_id, chunk_index, text[, page]) tuples
+            ids: Explicit ids to use (for importing existing chunks)
+        """
+        # Page numbers are optional (None for formats without pages)
+        rows = [(item[0], item[1], item[2], item[3] if len(item) > 3 else None) for item in metadata]
+        with self._lock:
+            cursor = self._conn.cursor()
+            if ids is None:
+                new_ids = []
+                for row in rows:
+                    cursor.execute(
+                        "INSERT INTO chunks (document_id, chunk_index, text, page) VALUES (?, ?, ?, ?)",
+                        row
+                    )
+                    new_ids.append(cursor.lastrowid)
+            else:
+                new_ids = list(ids)
+                cursor.executemany(
+                    "INSERT INTO chunks (id, document_id, chunk_index, text, page) VALUES (?, ?, ?, ?, ?)",
+                    [(chunk_id, *row) for chunk_id, row in zip(new_ids, rows)]
+                )
+            self._conn.commit()
+        return np.asarray(new_ids, dtype='int64')
+    
+    def add_deleted(self, ids: Iterable[int]):
+        """Record ids of deleted chunks still present in an imported index."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks (id, document_id, chunk_index, text, deleted) VALUES (?, '', 0, '', 1)",
+                [(int(i),) for i in ids]
+            )
+            self._conn.commit()
+    
+    def get(self, ids: Iterable[int]) -> Dict[int, Tuple[str, int, str, Optional[int]]]:
+        """Live chunks for the given ids, as id -> (document_id, chunk_index, text, page)."""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, document_id, chunk_index, text, page FROM chunks WHERE id IN ({placeholders}) AND deleted = 0",
+                ids
+            ).fetchall()
+        return {row[0]: (row[1], row[2], row[3], row[4]) for row in rows}
+    
+    def document_chunk_ids(self, document_ids: List[str]) -> np.ndarray:
+        """Ids of the live chunks of the given documents."""
+        if not document_ids:
+            return np.zeros(0, dtype='int64')
+        placeholders = ",".join("?" * len(document_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM chunks WHERE document_id IN ({placeholders}) AND deleted = 0",
+                list(document_ids)
+            ).fetchall()
+        return np.fromiter((row[0] for row in rows), dtype='int64', count=len(rows))
+    
+    def has_document(self, document_id: str) -> bool:
+        """Whether the document has live chunks."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM chunks WHERE document_id = ? AND deleted = 0 LIMIT 1",
+                (document_id,)
+            ).fetchone()
+        return row is not None
+    
+    def delete_document(self, document_id: str) -> List[int]:
+        """Mark a document's chunks deleted. Returns their ids."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM chunks WHERE document_id = ? AND deleted = 0",
+                (document_id,)
+            ).fetchall()
+            self._conn.execute(
+                "UPDATE chunks SET deleted = 1 WHERE document_id = ? AND deleted = 0",
+                (document_id,)
+            )
+            self._conn.commit()
+        return [row[0] for row in rows]
+    
+    def deleted_ids(self) -> List[int]:
+        """Ids of deleted chunks whose rows have not been purged yet."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM chunks WHERE deleted = 1").fetchall()
+        return [row[0] for row in rows]
+    
+    def purge(self, ids: Iterable[int]):
+        """Drop the rows of deleted chunks once they are out of the index."""
+        ids = [(int(i),) for i in ids]
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ? AND deleted = 1", ids)
+            self._conn.commit()
+    
+    def is_empty(self) -> bool:
+        """Whether the store has no rows at all."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone() is None
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
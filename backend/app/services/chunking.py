@@ -0,0 +1,230 @@
+import os
+import re
+from typing import Callable, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Supported strategies:
+#   sentence  - pack whole sentences up to the token budget
+#   paragraph - pack whole paragraphs; headings always start a new chunk
+#   window    - fixed-size sliding windows of words, ignoring structure
+STRATEGIES = ("sentence", "paragraph", "window")
+
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_APPROX_TOKEN = re.compile(r"\w+|[^\w\s]")
+# Numbered headings ("2.1 Methods", "IV. Results") and short all-caps lines;
+# markdown headings and "Chapter 3 ..." are checked separately
+_HEADING = re.compile(r'^((\d+(\.\d+)*\.?|[IVXLC]+\.)\s+[A-Z][^.!?]{0,78}|[A-Z0-9][A-Z0-9 ,:&()\-]{2,78})$')
+_HEADING_WORD = re.compile(r'^(chapter|section|part|unit|lecture)\s+\w+', re.IGNORECASE)
+
+def approximate_token_counts(texts: Sequence[str]) -> np.ndarray:
+    """Token counts without a tokenizer: words and punctuation marks."""
+    return np.fromiter((len(_APPROX_TOKEN.findall(text)) for text in texts), dtype='int64', count=len(texts))
+
+def tokenizer_counter(tokenizer) -> Callable[[Sequence[str]], np.ndarray]:
+    """Batch token counter using a Hugging Face tokenizer (no special tokens)."""
+    def count(texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros(0, dtype='int64')
+        encoded = tokenizer(
+            list(texts),
+            add_special_tokens=False,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False
+        )["input_ids"]
+        return np.fromiter((len(ids) for ids in encoded), dtype='int64', count=len(encoded))
+    return count
+
+def is_heading(paragraph: str) -> bool:
+    """Whether a paragraph starts with a heading line."""
+    first_line = paragraph.strip().split("\n", 1)[0].strip()
+    if not first_line or len(first_line) > 80:
+        return False
+    if first_line.startswith("#") or _HEADING_WORD.match(first_line):
+        return True
+    if first_line[-1] in ".!?,;":
+        return False
+    return bool(_HEADING.match(first_line))
+
+class Chunker:
+    """
+    Token-aware chunker fed one page at a time.
+    
+    Text is split into units (sentences, paragraphs or words, depending on
+    the strategy). Unit lengths are counted in model tokens with one batched
+    tokenizer call per page, and units are packed into chunks of at most
+    max_tokens with a cumulative sum, so each chunk fits the embedding
+    model's input instead of being truncated. Consecutive chunks share about
+    overlap_tokens of trailing units. Units too long for one chunk are split
+    into sentences, then words.
+    
+    Each chunk is emitted as soon as no later unit could be added to it, so
+    early pages can be embedded while later ones are still being parsed.
+    Chunks are tagged with the page their first unit came from.
+    
+    Configuration (environment):
+        CHUNK_STRATEGY: sentence, paragraph or window (default sentence)
+        CHUNK_MAX_TOKENS: tokens per chunk, capped by the model limit (default 128)
+        CHUNK_OVERLAP_TOKENS: tokens shared by consecutive chunks (default 16)
+    """
+    
+    def __init__(
+        self,
+        tokenizer=None,
+        strategy: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        overlap_tokens: Optional[int] = None,
+        model_max_tokens: Optional[int] = None
+    ):
+        self.strategy = (strategy or os.getenv("CHUNK_STRATEGY", "sentence")).lower()
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"Unsupported CHUNK_STRATEGY: {self.strategy}. Use one of {', '.join(STRATEGIES)}")
+        self.max_tokens = max_tokens or int(os.getenv("CHUNK_MAX_TOKENS", "128"))
+        if model_max_tokens:
+            # Leave room for the [CLS] and [SEP] tokens
+            self.max_tokens = min(self.max_tokens, model_max_tokens - 2)
+        if overlap_tokens is None:
+            overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", "16"))
+        self.overlap_tokens = min(overlap_tokens, self.max_tokens // 2)
+        self.count_tokens = tokenizer_counter(tokenizer) if tokenizer is not None else approximate_token_counts
+        
+        # Units not yet emitted (or kept as overlap), with their pages,
+        # token counts and whether a new section starts at them
+        self._units: List[str] = []
+        self._pages: List[Optional[int]] = []
+        self._counts: List[int] = []
+        self._breaks: List[bool] = []
+        # Trailing text of the last page, which may continue on the next one
+        self._carry = ""
+        self._carry_page: Optional[int] = None
+    
+    def _split(self, text: str, final: bool) -> Tuple[List[str], List[bool], str]:
+        """Split text into (units, section breaks, unfinished tail)."""
+        if self.strategy == "window":
+            words = text.split()
+            # A word cut by the page end continues on the next page
+            if not final and words and not text[-1:].isspace():
+                return words[:-1], [False] * (len(words) - 1), words[-1]
+            return words, [False] * len(words), ""
+        
+        separator = _PARAGRAPH_BREAK if self.strategy == "paragraph" else _SENTENCE_BREAK
+        pieces = separator.split(text)
+        tail = "" if final else pieces.pop()
+        units = [piece.strip() for piece in pieces]
+        breaks = [self.strategy == "paragraph" and is_heading(unit) for unit in units]
+        keep = [i for i, unit in enumerate(units) if unit]
+        return [units[i] for i in keep], [breaks[i] for i in keep], tail
+    
+    def _append(self, units: List[str], breaks: List[bool], first_page: Optional[int], page: Optional[int]):
+        """Count and buffer units; the first came from first_page, the rest from page."""
+        if not units:
+            return
+        counts = self.count_tokens(units)
+        for i, (unit, count, section_break) in enumerate(zip(units, counts, breaks)):
+            unit_page = first_page if i == 0 else page
+            if count > self.max_tokens and self.strategy == "paragraph":
+                # Too long for one chunk: fall back to sentences
+                sentences = [sentence for sentence in _SENTENCE_BREAK.split(unit) if sentence]
+                if len(sentences) > 1:
+                    self._append(sentences, [section_break] + [False] * (len(sentences) - 1), unit_page, unit_page)
+                    continue
+            if count > self.max_tokens and self.strategy != "window":
+                # Too long for one chunk: fall back to words
+                words = unit.split()
+                word_counts = self.count_tokens(words)
+                self._units.extend(words)
+                self._counts.extend(int(c) for c in word_counts)
+                self._pages.extend([unit_page] * len(words))
+                self._breaks.extend([section_break] + [False] * (len(words) - 1))
+            else:
+                self._units.append(unit)
+                self._counts.append(int(count))
+                self._pages.append(unit_page)
+                self._breaks.append(section_break)
+    
+    def _emit(self, final: bool) -> List[Tuple[Optional[int], str]]:
+        """Pack buffered units into chunks, keeping back the last one unless final."""
+        n = len(self._units)
+        if n == 0:
+            return []
+        cum = np.concatenate(([0], np.cumsum(self._counts, dtype='int64')))
+        section_starts = np.flatnonzero(self._breaks)
+        
+        chunks = []
+        start = 0
+        while start < n:
+            # Furthest end that keeps the chunk within budget (at least one unit)
+            end = max(int(np.searchsorted(cum, cum[start] + self.max_tokens, side='right')) - 1, start + 1)
+            # Never run across a heading
+            next_section = section_starts[np.searchsorted(section_starts, start, side='right'):]
+            at_section = len(next_section) > 0 and next_section[0] <= end
+            if at_section:
+                end = int(next_section[0])
+            elif end >= n and not final:
+                # More text may still fit in this chunk
+                break
+            
+            joiner = "\n\n" if self.strategy == "paragraph" else " "
+            chunks.append((self._pages[start], joiner.join(self._units[start:end])))
+            if end >= n:
+                start = n
+                break
+            if at_section or self.overlap_tokens == 0:
+                start = end
+            else:
+                # Keep trailing units worth up to overlap_tokens for the next chunk
+                overlap_start = int(np.searchsorted(cum, cum[end] - self.overlap_tokens, side='left'))
+                start = min(max(overlap_start, start + 1), end)
+        
+        del self._units[:start], self._pages[:start], self._counts[:start], self._breaks[:start]
+        return chunks
+    
+    def _over_budget(self, text: str) -> bool:
+        # A text never has more tokens than characters, so short texts skip counting
+        return len(text) > self.max_tokens and self.count_tokens([text])[0] > self.max_tokens
+    
+    def _flush(self, text: str, page: Optional[int]):
+        """Buffer unfinished text as complete units."""
+        units, breaks, _ = self._split(text, final=True)
+        self._append(units, breaks, page, page)
+    
+    def add_page(self, page: Optional[int], text: str) -> List[Tuple[Optional[int], str]]:
+        """Add a page of text. Returns the (page, chunk) pairs it completed."""
+        previous, previous_page = self._carry, self._carry_page
+        if previous:
+            joiner = " " if self.strategy == "window" else "\n"
+            joined = previous + joiner + text
+            first_page = previous_page
+        else:
+            joined = text
+            first_page = page
+        units, breaks, self._carry = self._split(joined, final=False)
+        self._carry_page = page if units else first_page
+        self._append(units, breaks, first_page, page)
+        
+        # Pages without breaks (slides, tables) would otherwise grow the tail
+        # and re-split it on every page; end it at page boundaries instead
+        if self._over_budget(self._carry):
+            if not units and previous:
+                self._flush(previous, previous_page)
+                self._carry, self._carry_page = text, page
+            if self._over_budget(self._carry):
+                carry, self._carry = self._carry, ""
+                self._flush(carry, self._carry_page)
+        return self._emit(final=False)
+    
+    def finish(self) -> List[Tuple[Optional[int], str]]:
+        """Flush the remaining text. Returns the final (page, chunk) pairs."""
+        carry, self._carry = self._carry, ""
+        units, breaks, _ = self._split(carry, final=True)
+        self._append(units, breaks, self._carry_page, self._carry_page)
+        return self._emit(final=True)
+    
+    def chunk_pages(self, pages: Sequence[Tuple[Optional[int], str]]) -> List[Tuple[Optional[int], str]]:
+        """Chunk a sequence of (page, text) pages in one go."""
+        chunks = []
+        for page, text in pages:
+            chunks.extend(self.add_page(page, text))
+        chunks.extend(self.finish())
+        return chunks
@@ -0,0 +1,172 @@
+import os
+import re
+from typing import List, Optional, Sequence
+from app.services.chunking import approximate_token_counts
+
+try:
+    import tiktoken
+except ImportError:  # Optional: token counts are approximated without it
+    tiktoken = None
+
+_WORD = re.compile(r"\w+")
+
+# Bounds (in words) of the overlap looked for between neighbouring chunks;
+# shorter matches are more likely coincidence than chunker overlap
+_MIN_OVERLAP_WORDS = 3
+_MAX_OVERLAP_WORDS = 200
+
+class TokenCounter:
+    """
+    Counts tokens the way the chat model does, with tiktoken when it is
+    installed and the encoding is available locally; otherwise words and
+    punctuation marks are counted as an approximation.
+    """
+    
+    def __init__(self, model_name: str):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                # Deployment names (Azure) are not model names
+                self.encoding = self._load("o200k_base")
+            except Exception as e:
+                print(f"tiktoken encoding unavailable ({e}); approximating token counts")
+    
+    @staticmethod
+    def _load(name: str):
+        try:
+            return tiktoken.get_encoding(name)
+        except Exception as e:
+            print(f"tiktoken encoding unavailable ({e}); approximating token counts")
+            return None
+    
+    def count_many(self, texts: Sequence[str]) -> List[int]:
+        """Token counts of several texts."""
+        if not texts:
+            return []
+        if self.encoding is not None:
+            return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(list(texts))]
+        return approximate_token_counts(texts).tolist()
+    
+    def count(self, text: str) -> int:
+        return self.count_many([text])[0]
+    
+    def count_messages(self, messages: List[dict]) -> int:
+        """Approximate prompt tokens of chat messages (content plus per-message overhead)."""
+        return sum(self.count_many([m["content"] for m in messages])) + 4 * len(messages) + 3
+    
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of text within max_tokens."""
+        if self.encoding is not None:
+            tokens = self.encoding.encode_ordinary(text)
+            return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+        if self.count(text) <= max_tokens:
+            return text
+        # Binary search over word boundaries
+        bounds = [m.end() for m in re.finditer(r"\S+", text)]
+        low, high = 0, len(bounds)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count(text[:bounds[mid - 1]]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:bounds[low - 1]] if low else ""
+
+class Context:
+    """Chunks chosen for a prompt, with the text to use for each."""
+    
+    def __init__(self, results: List[dict], texts: List[str], counts: List[int], dropped: int):
+        self.results = results
+        # Chunk texts with the overlap they share with a chosen neighbour removed
+        self.texts = texts
+        self.counts = counts
+        self.tokens = sum(counts)
+        # Candidates left out as near-duplicates or for lack of budget
+        self.dropped = dropped
+
+class ContextBuilder:
+    """
+    Packs retrieved chunks into a prompt context within a token budget.
+    
+    Chunks are taken best first. A chunk mostly contained in one already
+    taken (by word 3-gram overlap) is dropped; when two neighbouring chunks
+    of a document are both taken, the text the chunker repeated between
+    them is cut from the later one. Chunks are added while they fit the
+    budget. Free-form text is truncated to the same budget.
+    
+    Configuration (environment):
+        CONTEXT_MAX_TOKENS: tokens of retrieved or pasted text per prompt (default 3000)
+        CONTEXT_DUPLICATE_OVERLAP: share of a chunk's 3-grams found in a taken
+            chunk above which it is a near-duplicate (default 0.8)
+    """
+    
+    def __init__(self, model_name: str, max_tokens: Optional[int] = None):
+        self.counter = TokenCounter(model_name)
+        self.max_tokens = max_tokens or int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+        self.duplicate_overlap = float(os.getenv("CONTEXT_DUPLICATE_OVERLAP", "0.8"))
+    
+    @staticmethod
+    def _shingles(words: List[str]) -> set:
+        if len(words) < 3:
+            return {tuple(words)}
+        return set(zip(words, words[1:], words[2:]))
+    
+    @staticmethod
+    def _trim_overlap(previous: str, text: str) -> str:
+        """text without the leading words it repeats from the end of previous."""
+        head = text.split()
+        tail = previous.split()[-_MAX_OVERLAP_WORDS:]
+        for size in range(min(len(head), len(tail)), _MIN_OVERLAP_WORDS - 1, -1):
+            if tail[-size:] == head[:size]:
+                return " ".join(head[size:])
+        return text
+    
+    def build(self, results: List[dict], max_tokens: Optional[int] = None) -> Context:
+        """
+        Choose chunks for a prompt.
+        
+        Args:
+            results: Search results, best first
+            max_tokens: Override of the token budget
+        """
+        budget = max_tokens or self.max_tokens
+        packed, texts, counts, packed_shingles = [], [], [], []
+        # Position in packed of each chosen chunk, by (document, chunk index)
+        positions = {}
+        used, dropped = 0, 0
+        for result in results:
+            shingles = self._shingles(_WORD.findall(result['text'].lower()))
+            if any(len(shingles & other) >= self.duplicate_overlap * len(shingles) for other in packed_shingles):
+                dropped += 1
+                continue
+            
+            document_id, chunk_index = result.get('document_id'), result.get('chunk_index')
+            text = result['text']
+            if chunk_index is not None and (document_id, chunk_index - 1) in positions:
+                text = self._trim_overlap(packed[positions[(document_id, chunk_index - 1)]]['text'], text)
+            tokens = self.counter.count(text)
+            if not text.strip() or used + tokens > budget:
+                dropped += 1
+                continue
+            
+            positions[(document_id, chunk_index)] = len(packed)
+            packed.append(result)
+            texts.append(text)
+            counts.append(tokens)
+            packed_shingles.append(shingles)
+            used += tokens
+            
+            # The following chunk, if already taken, no longer needs to repeat this one
+            following = positions.get((document_id, chunk_index + 1)) if chunk_index is not None else None
+            if following is not None:
+                texts[following] = self._trim_overlap(result['text'], texts[following])
+                tokens = self.counter.count(texts[following])
+                used -= counts[following] - tokens
+                counts[following] = tokens
+        return Context(packed, texts, counts, dropped)
+    
+    def truncate(self, text: str, max_tokens: Optional[int] = None) -> str:
+        """Free-form text cut to the token budget."""
+        return self.counter.truncate(text, max_tokens or self.max_tokens)
@@ -1,18 +1,54 @@
 import PyPDF2
 from docx import Document
-from typing import List, Tuple
-import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+from app.services.chunking import Chunker
 
 class DocumentProcessor:
+    SUPPORTED_TYPES = (
+        "application/pdf",
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "text/plain",
+    )
+    
     @staticmethod
-    def extract_text_from_pdf(file_path: str) -> str:
-        """Extract text from PDF file."""
-        text = ""
+    def iter_pdf_pages(file_path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (page number, text) for PDF pages [start, stop).
+        
+        Page numbers are 1-based. Only one page's text is held at a time, and
+        ranges let several processes extract parts of a large PDF.
+        """
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+            stop = len(pdf_reader.pages) if stop is None else min(stop, len(pdf_reader.pages))
+            for page_index in range(start, stop):
+                yield page_index + 1, pdf_reader.pages[page_index].extract_text() or ""
+    
+    @staticmethod
+    def iter_pages(file_path: str, file_type: str) -> Iterator[Tuple[Optional[int], str]]:
+        """Yield (page number, text) for a file. Formats without pages yield one page numbered None."""
+        if file_type == "application/pdf":
+            yield from DocumentProcessor.iter_pdf_pages(file_path)
+        elif file_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+            yield None, DocumentProcessor.extract_text_from_docx(file_path)
+        elif file_type == "text/plain":
+            yield None, DocumentProcessor.extract_text_from_txt(file_path)
+        else:
+            raise ValueError(f"Unsupported file type: {file_type}")
+    
+    @staticmethod
+    def extract_text_from_pdf(file_path: str) -> str:
+        """Extract text from PDF file."""
+        # Joined once at the end: repeated += is quadratic on long documents
+        return "".join(text + "\n" for _, text in DocumentProcessor.iter_pdf_pages(file_path))
+    
+    @staticmethod
+    def count_pages(file_path: str, file_type: str) -> int:
+        """Number of pages in a file (1 for formats without pages)."""
+        if file_type == "application/pdf":
+            with open(file_path, 'rb') as file:
+                return len(PyPDF2.PdfReader(file).pages)
+        return 1
     
     @staticmethod
     def extract_text_from_docx(file_path: str) -> str:
@@ -28,42 +64,27 @@ class DocumentProcessor:
             return file.read()
     
     @staticmethod
-    def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+    def iter_chunks(
+        pages: Iterable[Tuple[Optional[int], str]],
+        chunker: Optional[Chunker] = None
+    ) -> Iterator[Tuple[Optional[int], str]]:
+        """Chunk a stream of (page number, text) pages, yielding (page number, chunk)."""
+        chunker = chunker or Chunker()
+        for page, text in pages:
+            yield from chunker.add_page(page, text)
+        yield from chunker.finish()
+    
+    @staticmethod
+    def chunk_text(text: str, chunker: Optional[Chunker] = None) -> List[str]:
         """
         Split text into chunks with overlap.
         
         Args:
             text: Input text
-            chunk_size: Target chunk size in characters
-            overlap: Number of characters to overlap between chunks
+            chunker: Chunker to use (default: configured strategy, token counts
+                approximated without a tokenizer)
         """
-        # Split by sentences first
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        
-        for sentence in sentences:
-            sentence_length = len(sentence)
-            
-            if current_length + sentence_length > chunk_size and current_chunk:
-                # Save current chunk
-                chunks.append(' '.join(current_chunk))
-                
-                # Start new chunk with overlap
-                overlap_text = ' '.join(current_chunk[-2:]) if len(current_chunk) >= 2 else current_chunk[-1]
-                current_chunk = [overlap_text, sentence]
-                current_length = len(overlap_text) + sentence_length
-            else:
-                current_chunk.append(sentence)
-                current_length += sentence_length
-        
-        # Add last chunk
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-        
-        return chunks
+        return [chunk for _, chunk in DocumentProcessor.iter_chunks([(None, text)], chunker)]
     
     @staticmethod
     def process_file(file_path: str, file_type: str) -> Tuple[str, List[str]]:
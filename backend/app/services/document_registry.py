@@ -0,0 +1,109 @@
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from app.database import SessionLocal, Document, DocumentOwner
+
+class DocumentRegistry:
+    """
+    Registry of uploaded documents by content hash.
+    
+    Identical bytes map to one document, which is parsed, embedded and
+    indexed once; every user who uploads it is linked as an owner.
+    """
+    
+    @staticmethod
+    def find_by_hash(content_hash: str) -> Optional[Document]:
+        """The document with these exact bytes, if any."""
+        db = SessionLocal()
+        try:
+            return db.query(Document).filter(Document.content_hash == content_hash).first()
+        finally:
+            db.close()
+    
+    @staticmethod
+    def register(
+        document_id: str,
+        content_hash: str,
+        filename: str,
+        content_type: str,
+        file_path: str,
+        size_bytes: int
+    ) -> Document:
+        """
+        Register a new document.
+        
+        If another upload registered the same bytes first, that document is
+        returned instead; the caller should then discard its own copy.
+        """
+        db = SessionLocal()
+        try:
+            document = Document(
+                id=document_id,
+                content_hash=content_hash,
+                filename=filename,
+                content_type=content_type,
+                file_path=file_path,
+                size_bytes=size_bytes
+            )
+            db.add(document)
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                return db.query(Document).filter(Document.content_hash == content_hash).first()
+            db.refresh(document)
+            return document
+        finally:
+            db.close()
+    
+    @staticmethod
+    def add_owner(document_id: str, owner: Optional[str], filename: str):
+        """Link an owner to a document (no-op if already linked)."""
+        db = SessionLocal()
+        try:
+            db.add(DocumentOwner(document_id=document_id, owner=owner or "", filename=filename))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+        finally:
+            db.close()
+    
+    @staticmethod
+    def remove_owner(document_id: str, owner: Optional[str]) -> Optional[int]:
+        """
+        Unlink an owner from a document.
+        
+        Returns:
+            Number of owners left, or None if the owner was not linked
+        """
+        db = SessionLocal()
+        try:
+            removed = db.query(DocumentOwner).filter(
+                DocumentOwner.document_id == document_id,
+                DocumentOwner.owner == (owner or "")
+            ).delete()
+            db.commit()
+            if not removed:
+                return None
+            return db.query(DocumentOwner).filter(DocumentOwner.document_id == document_id).count()
+        finally:
+            db.close()
+    
+    @staticmethod
+    def has_owners(document_id: str) -> bool:
+        """Whether any owner is linked to a document."""
+        db = SessionLocal()
+        try:
+            return db.query(DocumentOwner).filter(DocumentOwner.document_id == document_id).first() is not None
+        finally:
+            db.close()
+    
+    @staticmethod
+    def delete(document_id: str):
+        """Remove a document and all its owner links."""
+        db = SessionLocal()
+        try:
+            db.query(DocumentOwner).filter(DocumentOwner.document_id == document_id).delete()
+            db.query(Document).filter(Document.id == document_id).delete()
+            db.commit()
+        finally:
+            db.close()
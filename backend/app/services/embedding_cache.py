@@ -0,0 +1,146 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+
+def normalize_text(text: str) -> str:
+    """Canonical form of a text for cache keys: NFC with collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def embedding_key(model_name: str, text: str) -> bytes:
+    """Cache key for a text embedded by a model."""
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embeddings keyed by hash(model name, normalized text).
+    
+    Lookups go to an in-process LRU first and then to a SQLite file that
+    survives restarts and is shared by worker processes. Hits from disk are
+    promoted into memory.
+    
+    Rows on disk record when they were last stored or read from disk. Once
+    the file holds more than EMBEDDING_CACHE_DISK_SIZE rows, the least
+    recently used are deleted down to 90% of it. Reads served from memory
+    do not count as use, so a hot embedding may be dropped from disk while
+    still in memory.
+    
+    Configuration (environment):
+        EMBEDDING_CACHE_SIZE: embeddings kept in memory, 0 disables (default 10000)
+        EMBEDDING_CACHE_DISK: keep a persistent on-disk tier (default true)
+        EMBEDDING_CACHE_PATH: SQLite file (default vector_store/embedding_cache.db)
+        EMBEDDING_CACHE_DISK_SIZE: embeddings kept on disk, 0 for no limit (default 200000)
+    """
+    
+    def __init__(self, db_path: Optional[str] = None):
+        self.max_entries = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+        self.max_disk_entries = int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", "200000"))
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        
+        self._conn = None
+        if os.getenv("EMBEDDING_CACHE_DISK", "true").lower() in ("1", "true", "yes"):
+            if db_path is None:
+                # Path relative to project root (go up from backend/app/services)
+                project_root = Path(__file__).parent.parent.parent.parent
+                db_path = os.getenv("EMBEDDING_CACHE_PATH", str(project_root / "vector_store" / "embedding_cache.db"))
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL, used INTEGER NOT NULL DEFAULT 0)"
+            )
+            # Files written before rows were pruned
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")]
+            if "used" not in columns:
+                self._conn.execute("ALTER TABLE embeddings ADD COLUMN used INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_used ON embeddings(used)")
+            self._conn.commit()
+            # Estimate, grown by this process's inserts; recounted before pruning
+            self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    
+    def _remember(self, key: bytes, vector: np.ndarray):
+        """Add to the memory tier. Call with the lock held."""
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Cached embeddings for whichever of the keys are present."""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is None:
+                    missing.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            
+            if missing and self._conn is not None:
+                # Stay under SQLite's bound-parameter limit
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                        batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype='float32')
+                        found[key] = vector
+                        self._remember(key, vector)
+                    if rows:
+                        self._conn.execute(
+                            f"UPDATE embeddings SET used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                            [int(time.time())] + [key for key, _ in rows]
+                        )
+                self._conn.commit()
+        return found
+    
+    def put_many(self, items: Dict[bytes, np.ndarray]):
+        """Store embeddings in both tiers."""
+        if not items:
+            return
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if self._conn is not None:
+                now = int(time.time())
+                inserted = self._conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, used) VALUES (?, ?, ?)",
+                    [(key, np.asarray(vector, dtype='float32').tobytes(), now) for key, vector in items.items()]
+                ).rowcount
+                self._disk_entries += max(inserted, 0)
+                if 0 < self.max_disk_entries < self._disk_entries:
+                    self._prune()
+                self._conn.commit()
+    
+    def _prune(self):
+        """Delete the least recently used rows down to 90% of the disk limit. Call with the lock held."""
+        # Other workers insert too
+        self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._disk_entries - int(self.max_disk_entries * 0.9)
+        if self._disk_entries <= self.max_disk_entries or excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY used LIMIT ?)",
+            (excess,)
+        )
+        self._disk_entries -= excess
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
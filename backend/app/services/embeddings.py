@@ -1,26 +1,129 @@
+import os
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List
+import torch
+from typing import List, Optional
+from app.services.embedding_cache import EmbeddingCache, embedding_key
+
+PRECISIONS = ("float32", "float16", "int8")
 
 class EmbeddingService:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    """
+    Sentence embeddings with batched, length-sorted inference.
+    
+    Texts to encode are sorted by length and cut into batches of
+    EMBEDDING_BATCH_SIZE, so each batch pads to similar lengths instead of
+    to the longest chunk in upload order.
+    
+    Configuration (environment):
+        EMBEDDING_BATCH_SIZE: texts per forward pass (default 64)
+        EMBEDDING_THREADS: torch intra-op threads, unset keeps torch's default
+        EMBEDDING_PRECISION: float32, float16 (GPU only) or int8 (dynamic
+            quantization of the linear layers, CPU) (default float32)
+        EMBEDDING_BACKEND: torch or onnx; onnx needs sentence-transformers>=3.2
+            with optimum[onnxruntime] installed (default torch)
+    """
+    
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", cache: Optional[EmbeddingCache] = None):
         """
         Initialize embedding model.
         all-MiniLM-L6-v2 is fast and good for most use cases.
         Alternatives: 'all-mpnet-base-v2' (better quality, slower)
         """
-        self.model = SentenceTransformer(model_name)
+        self.batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+        self.precision = os.getenv("EMBEDDING_PRECISION", "float32").lower()
+        if self.precision not in PRECISIONS:
+            raise ValueError(f"Unsupported EMBEDDING_PRECISION: {self.precision}. Use one of {', '.join(PRECISIONS)}")
+        self.backend = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+        
+        threads = os.getenv("EMBEDDING_THREADS")
+        if threads:
+            torch.set_num_threads(int(threads))
+        
+        self.model = self._load_model(model_name)
         self.model_name = model_name
+        # Reduced-precision vectors differ slightly, so they get their own keys
+        self.cache_namespace = model_name
+        if (self.backend, self.precision) != ("torch", "float32"):
+            self.cache_namespace = f"{model_name}:{self.backend}:{self.precision}"
+        # Repeated texts (fixed queries, re-uploaded files) become lookups
+        self.cache = cache if cache is not None else EmbeddingCache()
+    
+    def _load_model(self, model_name: str) -> SentenceTransformer:
+        """Load the model with the configured backend and precision."""
+        if self.backend == "onnx":
+            try:
+                return SentenceTransformer(model_name, backend="onnx")
+            except (TypeError, ImportError, ValueError) as e:
+                print(f"ONNX backend unavailable ({e}), using torch")
+                self.backend = "torch"
+        
+        model = SentenceTransformer(model_name)
+        if self.precision == "float16":
+            if model.device.type == "cuda":
+                model.half()
+            else:
+                print("float16 inference needs a GPU, using float32")
+                self.precision = "float32"
+        elif self.precision == "int8":
+            if model.device.type == "cpu":
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            else:
+                print("int8 dynamic quantization runs on CPU only, using float32")
+                self.precision = "float32"
+        return model
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in length-sorted batches, returned in input order."""
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        sorted_texts = [texts[i] for i in order]
+        batches = []
+        with torch.inference_mode():
+            for start in range(0, len(sorted_texts), self.batch_size):
+                batches.append(self.model.encode(
+                    sorted_texts[start:start + self.batch_size],
+                    batch_size=self.batch_size,
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                ))
+        encoded = np.empty((len(texts), batches[0].shape[1]), dtype='float32')
+        encoded[order] = np.vstack(batches)
+        return encoded
     
     def embed_text(self, text: str) -> np.ndarray:
         """Generate embedding for a single text."""
-        return self.model.encode(text, convert_to_numpy=True)
+        return self.embed_batch([text])[0]
     
     def embed_batch(self, texts: List[str]) -> np.ndarray:
-        """Generate embeddings for a batch of texts."""
-        return self.model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
+        """Generate embeddings for a batch of texts, encoding only uncached ones."""
+        keys = [embedding_key(self.cache_namespace, text) for text in texts]
+        cached = self.cache.get_many(keys)
+        
+        # Encode each distinct uncached text once
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in pending:
+                pending[key] = text
+        if pending:
+            encoded = self._encode(list(pending.values()))
+            new = dict(zip(pending.keys(), encoded))
+            self.cache.put_many(new)
+            cached.update(new)
+        
+        if not texts:
+            return np.zeros((0, self.get_dimension()), dtype='float32')
+        return np.vstack([cached[key] for key in keys])
+    
+    @property
+    def tokenizer(self):
+        """The model's tokenizer, for measuring texts in model tokens."""
+        return self.model.tokenizer
+    
+    @property
+    def max_seq_length(self) -> int:
+        """Tokens the model reads per text; longer inputs are truncated."""
+        return self.model.max_seq_length
     
     def get_dimension(self) -> int:
         """Get the dimension of embeddings."""
         return self.model.get_sentence_embedding_dimension()
-
@@ -0,0 +1,174 @@
+import asyncio
+import itertools
+import math
+import os
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+import numpy as np
+from app.services.chunking import Chunker
+from app.services.index_factory import normalized
+
+# Pieces pasted text is cut into before being grouped into sections
+_PIECE_TOKENS = 200
+
+class FanOut:
+    """
+    Splits large quiz and flashcard requests into sections generated concurrently.
+    
+    Source material is grouped, in order, into enough sections that none is
+    over GENERATION_SECTION_TOKENS or asked for more than
+    GENERATION_ITEMS_PER_SECTION items. Each section asks for its share of
+    the items, a little over since merging drops duplicates. Sections run
+    concurrently, so a large request takes about as long as its slowest
+    section. Results are merged round-robin across sections, and items too
+    similar (by embedding) to one already kept are dropped.
+    
+    Configuration (environment):
+        GENERATION_FANOUT: split large requests into sections (default true)
+        GENERATION_SECTION_TOKENS: max tokens of source material per section (default 1500)
+        GENERATION_ITEMS_PER_SECTION: max items asked of one section (default 8)
+        GENERATION_MAX_SECTIONS: max sections per request (default 8)
+        GENERATION_CONCURRENCY: max sections of one request in flight; the
+            LLM client's limit still applies across requests (default 8)
+        GENERATION_DUPLICATE_SIMILARITY: cosine similarity from which two
+            items are duplicates (default 0.9)
+        GENERATION_OVERSAMPLE: items asked per item wanted (default 1.25)
+    """
+    
+    def __init__(self):
+        self.enabled = os.getenv("GENERATION_FANOUT", "true").lower() in ("1", "true", "yes")
+        self.section_tokens = int(os.getenv("GENERATION_SECTION_TOKENS", "1500"))
+        self.items_per_section = int(os.getenv("GENERATION_ITEMS_PER_SECTION", "8"))
+        self.max_sections = int(os.getenv("GENERATION_MAX_SECTIONS", "8"))
+        self.concurrency = int(os.getenv("GENERATION_CONCURRENCY", "8"))
+        self.duplicate_similarity = float(os.getenv("GENERATION_DUPLICATE_SIMILARITY", "0.9"))
+        self.oversample = float(os.getenv("GENERATION_OVERSAMPLE", "1.25"))
+    
+    @property
+    def material_tokens(self) -> int:
+        """Most source material a request can use, or 0 to keep the context builder's budget."""
+        return self.section_tokens * self.max_sections if self.enabled else 0
+    
+    def chunks_for(self, num_items: int, top_k: int) -> int:
+        """Chunks to retrieve for a request of num_items."""
+        if not self.enabled:
+            return top_k
+        # Two chunks per item gives each section enough distinct material
+        return max(top_k, min(2 * num_items, 100))
+    
+    def split_text(self, text: str) -> List[str]:
+        """Pasted text cut at sentence boundaries into pieces to group into sections."""
+        if not self.enabled:
+            return [text]
+        chunker = Chunker(strategy="sentence", max_tokens=_PIECE_TOKENS, overlap_tokens=0)
+        return [piece for _, piece in chunker.chunk_pages([(None, text)])] or [text]
+    
+    def pack(self, texts: Sequence[str], counts: Sequence[int]) -> List[str]:
+        """Consecutive texts packed into sections of up to GENERATION_SECTION_TOKENS, however many that takes."""
+        sections, current, used = [], [], 0
+        for text, tokens in zip(texts, counts):
+            if current and used + tokens > self.section_tokens:
+                sections.append("\n\n".join(current))
+                current, used = [], 0
+            current.append(text)
+            used += tokens
+        if current:
+            sections.append("\n\n".join(current))
+        return sections
+    
+    def plan(self, texts: Sequence[str], counts: Sequence[int], num_items: int) -> List[Tuple[str, int]]:
+        """
+        Group consecutive texts into sections.
+        
+        Args:
+            texts: Source material in reading order
+            counts: Token count of each text
+            num_items: Items wanted in total
+        
+        Returns:
+            (section text, items to ask of it) pairs
+        """
+        total = sum(counts)
+        sections = 1
+        if self.enabled:
+            sections = max(math.ceil(num_items / self.items_per_section), math.ceil(total / self.section_tokens))
+            sections = max(1, min(self.max_sections, sections, len(texts)))
+        if sections == 1:
+            return [("\n\n".join(texts), num_items)]
+        
+        # Each text goes to the section its middle token falls in, which
+        # keeps sections close to equal size
+        groups = [[] for _ in range(sections)]
+        group_tokens = [0] * sections
+        start = 0
+        for text, tokens in zip(texts, counts):
+            index = min(sections - 1, int((start + tokens / 2) * sections / max(total, 1)))
+            groups[index].append(text)
+            group_tokens[index] += tokens
+            start += tokens
+        return [
+            ("\n\n".join(group), max(1, math.ceil(num_items * self.oversample * tokens / max(total, 1))))
+            for group, tokens in zip(groups, group_tokens)
+            if group
+        ]
+    
+    async def generate(
+        self,
+        sections: List[Tuple[str, int]],
+        generate: Callable[[str, int], Awaitable[tuple]],
+        concurrency: Optional[int] = None
+    ) -> List[tuple]:
+        """
+        Run generate(section text, item count) for every section, at most
+        concurrency (default GENERATION_CONCURRENCY) at a time.
+        
+        Failed sections are logged and left out; if all of them fail, the
+        first error is raised.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+        
+        async def run(section: str, count: int):
+            async with semaphore:
+                return await generate(section, count)
+        
+        outcomes = await asyncio.gather(*(run(section, count) for section, count in sections), return_exceptions=True)
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        if errors and len(errors) == len(outcomes):
+            raise errors[0]
+        for error in errors:
+            print(f"Section generation failed ({len(errors)}/{len(outcomes)} sections): {error}")
+        return [outcome for outcome in outcomes if not isinstance(outcome, BaseException)]
+    
+    async def merge(
+        self,
+        groups: List[List[dict]],
+        key: Callable[[dict], str],
+        embed: Callable[[str], Awaitable[np.ndarray]],
+        num_items: int
+    ) -> List[dict]:
+        """
+        Merge per-section items, dropping near-duplicates.
+        
+        Args:
+            groups: Items of each section
+            key: Text of an item to compare (question, card front)
+            embed: Async text embedding function
+            num_items: Items wanted
+        """
+        # Round-robin, so the items kept cover every section
+        items = [
+            item for round_items in itertools.zip_longest(*groups)
+            for item in round_items
+            if isinstance(item, dict)
+        ]
+        if len(groups) <= 1 or not items:
+            return items[:num_items]
+        
+        embeddings = normalized(np.vstack(await asyncio.gather(*(embed(key(item)) for item in items))))
+        kept = []
+        for i in range(len(items)):
+            if kept and float((embeddings[kept] @ embeddings[i]).max()) >= self.duplicate_similarity:
+                continue
+            kept.append(i)
+            if len(kept) == num_items:
+                break
+        return [items[i] for i in kept]
@@ -0,0 +1,142 @@
+import json
+import os
+import random
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import func
+from app.database import SessionLocal, BankItem
+from app.services.index_factory import normalized
+
+# Kind of banked flashcards; quiz questions are banked under their question type
+CARD = "card"
+# The only question type generated at ingest time
+BANK_QUESTION_TYPE = "multiple_choice"
+
+class GenerationBank:
+    """
+    Quiz questions and flashcards pre-generated per document section at
+    ingest time, so most generation requests are served from the database
+    without calling the LLM.
+    
+    Each item is stored with the embedding of its question (or card front).
+    A request with a topic picks among the items most similar to it; without
+    one, items are picked at random. Picks are random within a pool twice
+    the size of the request, so repeated requests vary. When too few items
+    qualify, the caller generates the rest live.
+    
+    Each document's items and embeddings are kept in memory per kind. A
+    request only reads the item count and newest id of each document from
+    the database, and reloads a document whose bank changed, including
+    banks built or deleted by other workers.
+    
+    Configuration (environment):
+        BANK_ENABLED: build a bank for each ingested document and serve from it (default false)
+        BANK_QUESTIONS_PER_SECTION: quiz questions generated per section (default 5)
+        BANK_CARDS_PER_SECTION: flashcards generated per section (default 5)
+        BANK_CONCURRENCY: sections of one document generated at a time, kept
+            low so bank builds leave LLM capacity to live requests (default 2)
+        BANK_MIN_RELEVANCE: cosine similarity to the topic an item needs to be served (default 0.35)
+    """
+    
+    def __init__(self):
+        self.enabled = os.getenv("BANK_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.questions_per_section = int(os.getenv("BANK_QUESTIONS_PER_SECTION", "5"))
+        self.cards_per_section = int(os.getenv("BANK_CARDS_PER_SECTION", "5"))
+        self.concurrency = int(os.getenv("BANK_CONCURRENCY", "2"))
+        self.min_relevance = float(os.getenv("BANK_MIN_RELEVANCE", "0.35"))
+        # (document_id, kind) -> ((item count, newest id), JSON items, embeddings)
+        self._cache: Dict[Tuple[str, str], Tuple[tuple, List[str], np.ndarray]] = {}
+    
+    def add(self, document_id: str, kind: str, items: List[dict], embeddings: np.ndarray):
+        """Store items of one kind for a document."""
+        if not items:
+            return
+        embeddings = normalized(embeddings)
+        db = SessionLocal()
+        try:
+            db.add_all([
+                BankItem(document_id=document_id, kind=kind, item=json.dumps(item), embedding=embedding.tobytes())
+                for item, embedding in zip(items, embeddings)
+            ])
+            db.commit()
+        finally:
+            db.close()
+        self._cache.pop((document_id, kind), None)
+    
+    def delete_document(self, document_id: str) -> int:
+        """Remove a document's items. Returns the number removed."""
+        db = SessionLocal()
+        try:
+            deleted = db.query(BankItem).filter(BankItem.document_id == document_id).delete()
+            db.commit()
+        finally:
+            db.close()
+        for key in [key for key in self._cache if key[0] == document_id]:
+            del self._cache[key]
+        return deleted
+    
+    def _banks(self, kind: str, document_ids: Optional[List[str]]) -> List[Tuple[List[str], np.ndarray]]:
+        """JSON items and normalized embeddings of each document with items of this kind."""
+        db = SessionLocal()
+        try:
+            query = db.query(BankItem.document_id, func.count(BankItem.id), func.max(BankItem.id)).filter(BankItem.kind == kind)
+            if document_ids:
+                query = query.filter(BankItem.document_id.in_(document_ids))
+            versions = {document_id: (count, newest) for document_id, count, newest in query.group_by(BankItem.document_id)}
+            
+            banks = []
+            for document_id, version in versions.items():
+                cached = self._cache.get((document_id, kind))
+                if cached is None or cached[0] != version:
+                    rows = db.query(BankItem.item, BankItem.embedding).filter(
+                        BankItem.document_id == document_id, BankItem.kind == kind
+                    ).order_by(BankItem.id).all()
+                    embeddings = np.frombuffer(b"".join(row[1] for row in rows), dtype='float32').reshape(len(rows), -1)
+                    cached = (version, [row[0] for row in rows], embeddings)
+                    self._cache[(document_id, kind)] = cached
+                banks.append(cached[1:])
+        finally:
+            db.close()
+        
+        # Banks deleted by other workers
+        for key in [
+            key for key in self._cache
+            if key[1] == kind and key[0] not in versions and (not document_ids or key[0] in document_ids)
+        ]:
+            del self._cache[key]
+        return banks
+    
+    def select(
+        self,
+        kind: str,
+        num_items: int,
+        document_ids: Optional[List[str]] = None,
+        topic_embedding: Optional[np.ndarray] = None
+    ) -> List[dict]:
+        """
+        Pick up to num_items banked items.
+        
+        Args:
+            kind: CARD or a question type
+            num_items: Items wanted
+            document_ids: Documents to pick from (default: all)
+            topic_embedding: If given, only items at least BANK_MIN_RELEVANCE
+                similar to it are picked, most similar first
+        """
+        if num_items <= 0:
+            return []
+        banks = self._banks(kind, document_ids)
+        items = [item for bank_items, _ in banks for item in bank_items]
+        if not items:
+            return []
+        
+        if topic_embedding is None:
+            picked = random.sample(range(len(items)), min(num_items, len(items)))
+            return [json.loads(items[i]) for i in picked]
+        
+        topic = normalized(topic_embedding.reshape(1, -1))[0]
+        scores = np.concatenate([embeddings @ topic for _, embeddings in banks])
+        relevant = np.flatnonzero(scores >= self.min_relevance)
+        pool = relevant[np.argsort(-scores[relevant], kind="stable")][:2 * num_items]
+        picked = sorted(random.sample(list(pool), min(num_items, len(pool))), key=lambda i: -scores[i])
+        return [json.loads(items[i]) for i in picked]
@@ -0,0 +1,151 @@
+import os
+from typing import Optional
+import faiss
+import numpy as np
+
+# Supported index types:
+#   flat     - exact brute-force scan (baseline)
+#   hnsw     - graph index, no training needed
+#   ivf_flat - inverted lists over k-means cells, needs training
+#   ivf_pq   - inverted lists with product-quantized vectors, needs training
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+TRAINED_INDEX_TYPES = ("ivf_flat", "ivf_pq")
+
+# New indexes score by inner product over L2-normalized vectors (cosine
+# similarity). Indexes built with L2 distance before are still searched
+# as such until rebuilt (see migrate_vector_index.py --cosine).
+METRIC = faiss.METRIC_INNER_PRODUCT
+
+def configured_index_type() -> str:
+    """Index type from VECTOR_INDEX_TYPE (default flat)."""
+    index_type = os.getenv("VECTOR_INDEX_TYPE", "flat").lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported VECTOR_INDEX_TYPE: {index_type}. Use one of {', '.join(INDEX_TYPES)}")
+    return index_type
+
+def _ivf_nlist(n_vectors: int) -> int:
+    """Number of IVF cells: VECTOR_IVF_NLIST, or about 4*sqrt(n)."""
+    nlist = os.getenv("VECTOR_IVF_NLIST")
+    if nlist:
+        return int(nlist)
+    return max(1, min(65536, int(4 * np.sqrt(max(n_vectors, 1)))))
+
+def min_training_vectors(index_type: str, n_vectors: int) -> int:
+    """Vectors needed to train an index of this type (0 if untrained)."""
+    if index_type not in TRAINED_INDEX_TYPES:
+        return 0
+    # FAISS warns below ~39 points per centroid
+    needed = 39 * _ivf_nlist(n_vectors)
+    if index_type == "ivf_pq":
+        needed = max(needed, 39 * (1 << int(os.getenv("VECTOR_PQ_NBITS", "8"))))
+    return needed
+
+def build_index(dimension: int, index_type: str, training_vectors: Optional[np.ndarray] = None) -> faiss.Index:
+    """
+    Build an empty inner-product index of the given type.
+    
+    Trained types are trained on training_vectors. If there are too few of
+    them, a flat index is returned instead.
+    
+    Configuration (environment):
+        VECTOR_HNSW_M: graph neighbours per node (default 32)
+        VECTOR_HNSW_EF_CONSTRUCTION: build-time search depth (default 200)
+        VECTOR_IVF_NLIST: number of IVF cells (default about 4*sqrt(n))
+        VECTOR_PQ_M: PQ sub-quantizers, must divide the dimension (default 16)
+        VECTOR_PQ_NBITS: bits per PQ code (default 8)
+    """
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dimension)
+    
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, int(os.getenv("VECTOR_HNSW_M", "32")), METRIC)
+        index.hnsw.efConstruction = int(os.getenv("VECTOR_HNSW_EF_CONSTRUCTION", "200"))
+        apply_search_params(index)
+        return index
+    
+    n_vectors = 0 if training_vectors is None else len(training_vectors)
+    if n_vectors < min_training_vectors(index_type, n_vectors):
+        print(f"Not enough vectors to train {index_type} ({n_vectors}); using flat index")
+        return faiss.IndexFlatIP(dimension)
+    
+    nlist = _ivf_nlist(n_vectors)
+    quantizer = faiss.IndexFlatIP(dimension)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, METRIC)
+    elif index_type == "ivf_pq":
+        pq_m = int(os.getenv("VECTOR_PQ_M", "16"))
+        if dimension % pq_m != 0:
+            raise ValueError(f"VECTOR_PQ_M={pq_m} must divide the embedding dimension {dimension}")
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, int(os.getenv("VECTOR_PQ_NBITS", "8")), METRIC)
+    else:
+        raise ValueError(f"Unsupported index type: {index_type}")
+    
+    index.train(np.ascontiguousarray(training_vectors, dtype='float32'))
+    prepare_index(index)
+    return index
+
+def build_id_index(dimension: int, index_type: str, training_vectors: Optional[np.ndarray] = None) -> faiss.IndexIDMap2:
+    """Build an empty index of the given type, addressed by stable chunk ids."""
+    return faiss.IndexIDMap2(build_index(dimension, index_type, training_vectors))
+
+def inner_index(index: faiss.Index) -> faiss.Index:
+    """The index wrapped by an id map, or the index itself."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+def is_inner_product(index: faiss.Index) -> bool:
+    """Whether an index scores by inner product (over normalized vectors)."""
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+def normalized(vectors: np.ndarray) -> np.ndarray:
+    """Row-wise L2-normalized float32 copy of vectors."""
+    vectors = np.array(vectors, dtype='float32', order='C')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def index_type_of(index: faiss.Index) -> str:
+    """Name of the index type of an existing index."""
+    index = inner_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+def prepare_index(index: faiss.Index):
+    """Apply search params and enable id lookups on a new or loaded index."""
+    index = inner_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        # Needed to reconstruct vectors by id (scoped search, rebuilds)
+        index.make_direct_map()
+    apply_search_params(index)
+
+def apply_search_params(index: faiss.Index):
+    """
+    Apply query-time params from the environment.
+    
+    VECTOR_HNSW_EF_SEARCH: HNSW search depth (default 64)
+    VECTOR_IVF_NPROBE: IVF cells visited per query (default 16)
+    """
+    index = inner_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = int(os.getenv("VECTOR_HNSW_EF_SEARCH", "64"))
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = int(os.getenv("VECTOR_IVF_NPROBE", "16"))
+
+def search_parameters(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Search params restricted to selector, of the type the index expects."""
+    index = inner_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = index.hnsw.efSearch
+    elif isinstance(index, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = index.nprobe
+    else:
+        params = faiss.SearchParameters()
+    params.sel = selector
+    return params
@@ -0,0 +1,248 @@
+import json
+import os
+import struct
+import threading
+import uuid
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, single worker only
+    fcntl = None
+
+OP_ADD = 1
+OP_DELETE = 2
+
+# op, count, dimension, crc32 of payload
+_HEADER = struct.Struct("<BIII")
+
+class Manifest:
+    """Names the current snapshot and the log that continues it."""
+    
+    def __init__(self, sequence: int, snapshot: Optional[str], wal: str, lsn: int):
+        self.sequence = sequence
+        # Snapshot file holding every change before lsn (None: empty index)
+        self.snapshot = snapshot
+        # Log file whose byte 0 is log position lsn
+        self.wal = wal
+        self.lsn = lsn
+    
+    def to_dict(self) -> dict:
+        return {"sequence": self.sequence, "snapshot": self.snapshot, "wal": self.wal, "lsn": self.lsn}
+
+class IndexLog:
+    """
+    Crash-safe persistence for the FAISS index: snapshots plus an append log.
+    
+    Every add or delete is appended to the log, so saving a new document
+    costs the size of that document. Snapshots are written to a temporary
+    file and renamed into place, then a small manifest is atomically
+    replaced to point at them, so readers never see a torn file. Loading
+    reads the snapshot named by the manifest and replays the log after it.
+    
+    Positions in the log are tracked as LSNs (byte offsets that keep counting
+    across snapshots), so a worker can replay just what it has not seen yet.
+    """
+    
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self.manifest_path = f"{store_path}.manifest.json"
+        self._thread_lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+    
+    def _path(self, name: str) -> str:
+        return os.path.join(os.path.dirname(self.store_path), name)
+    
+    @contextmanager
+    def lock(self):
+        """Exclusive write lock across threads and worker processes."""
+        with self._thread_lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                self._lock_file = open(f"{self.store_path}.lock", "a+")
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_file is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+    
+    def read_manifest(self) -> Optional[Manifest]:
+        """Current manifest, or None if nothing has been written yet."""
+        try:
+            with open(self.manifest_path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return Manifest(data["sequence"], data["snapshot"], data["wal"], data["lsn"])
+    
+    def _write_manifest(self, manifest: Manifest):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest.to_dict(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+    
+    def signature(self) -> Optional[tuple]:
+        """
+        Cheap fingerprint of the on-disk state: a new snapshot changes the
+        manifest and a new log record grows the log.
+        """
+        try:
+            manifest_stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        manifest = self.read_manifest()
+        try:
+            wal_size = os.path.getsize(self._path(manifest.wal))
+        except FileNotFoundError:
+            wal_size = 0
+        return (manifest_stat.st_ino, manifest_stat.st_mtime_ns, manifest.sequence, wal_size)
+    
+    def wal_end(self, manifest: Manifest) -> int:
+        """LSN just past the last byte of the log."""
+        try:
+            return manifest.lsn + os.path.getsize(self._path(manifest.wal))
+        except FileNotFoundError:
+            return manifest.lsn
+    
+    def read_snapshot(self, manifest: Manifest) -> Optional[np.ndarray]:
+        """Serialized index bytes of the manifest's snapshot."""
+        if manifest.snapshot is None:
+            return None
+        return np.fromfile(self._path(manifest.snapshot), dtype='uint8')
+    
+    def append(self, manifest: Manifest, op: int, ids: np.ndarray, vectors: Optional[np.ndarray] = None) -> int:
+        """
+        Append a record to the log. Call with the lock held.
+        
+        Returns:
+            LSN just past the new record
+        """
+        ids = np.ascontiguousarray(ids, dtype='int64')
+        payload = ids.tobytes()
+        dimension = 0
+        if vectors is not None:
+            vectors = np.ascontiguousarray(vectors, dtype='float32')
+            dimension = vectors.shape[1]
+            payload += vectors.tobytes()
+        header = _HEADER.pack(op, len(ids), dimension, zlib.crc32(payload))
+        
+        with open(self._path(manifest.wal), "ab") as f:
+            f.write(header + payload)
+            f.flush()
+            os.fsync(f.fileno())
+            end = f.tell()
+        return manifest.lsn + end
+    
+    def replay(self, manifest: Manifest, from_lsn: int) -> Iterator[Tuple[int, np.ndarray, Optional[np.ndarray], int]]:
+        """
+        Read log records from from_lsn on.
+        
+        Yields (op, ids, vectors, lsn after the record). Stops at the first
+        incomplete or corrupt record, which is a write cut short by a crash.
+        """
+        try:
+            f = open(self._path(manifest.wal), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(from_lsn - manifest.lsn)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return
+                op, count, dimension, crc = _HEADER.unpack(header)
+                payload = bytearray(f.read(count * 8 + count * dimension * 4))
+                if len(payload) < count * 8 + count * dimension * 4 or zlib.crc32(payload) != crc:
+                    return
+                ids = np.frombuffer(payload[:count * 8], dtype='int64')
+                vectors = None
+                if dimension:
+                    vectors = np.frombuffer(payload[count * 8:], dtype='float32').reshape(count, dimension)
+                yield op, ids, vectors, manifest.lsn + f.tell()
+    
+    def truncate(self, manifest: Manifest, lsn: int):
+        """Cut a torn tail off the log. Call with the lock held."""
+        path = self._path(manifest.wal)
+        if os.path.exists(path) and os.path.getsize(path) > lsn - manifest.lsn:
+            with open(path, "r+b") as f:
+                f.truncate(lsn - manifest.lsn)
+    
+    def create(self) -> Manifest:
+        """Start an empty log with no snapshot. Call with the lock held."""
+        manifest = Manifest(0, None, f"{os.path.basename(self.store_path)}.0.wal", 0)
+        open(self._path(manifest.wal), "ab").close()
+        self._write_manifest(manifest)
+        return manifest
+    
+    def write_snapshot(self, data: np.ndarray, lsn: int) -> Optional[Manifest]:
+        """
+        Write a snapshot of everything before lsn and start a new log.
+        
+        The snapshot file is written under a new name first. Then, under the
+        lock, records appended after lsn are carried into the new log and the
+        manifest is switched over. Files of the old generation are removed.
+        
+        Returns:
+            The new manifest, or None if another snapshot got in first
+        """
+        with self.lock():
+            base_manifest = self.read_manifest()
+        sequence = (base_manifest.sequence if base_manifest else 0) + 1
+        # Unique names: another worker may be writing the same sequence
+        name = f"{os.path.basename(self.store_path)}.{sequence}.{uuid.uuid4().hex[:8]}"
+        snapshot_name = f"{name}.index"
+        wal_name = f"{name}.wal"
+        
+        tmp_path = self._path(snapshot_name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            data.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(snapshot_name))
+        
+        with self.lock():
+            current = self.read_manifest()
+            superseded = (current.sequence if current else 0) != sequence - 1 or (current is not None and lsn < current.lsn)
+            if not superseded:
+                # Carry over records appended while the snapshot was written
+                tail = b""
+                if current is not None:
+                    try:
+                        with open(self._path(current.wal), "rb") as f:
+                            f.seek(lsn - current.lsn)
+                            tail = f.read()
+                    except FileNotFoundError:
+                        pass
+                with open(self._path(wal_name), "wb") as f:
+                    f.write(tail)
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                manifest = Manifest(sequence, snapshot_name, wal_name, lsn)
+                self._write_manifest(manifest)
+        
+        if superseded:
+            os.remove(self._path(snapshot_name))
+            return None
+        if current is not None:
+            for name in (current.snapshot, current.wal):
+                if name:
+                    try:
+                        os.remove(self._path(name))
+                    except FileNotFoundError:
+                        pass
+        return manifest
+    
+    def wal_bytes(self, manifest: Manifest) -> int:
+        """Size of the log since the last snapshot."""
+        return self.wal_end(manifest) - manifest.lsn
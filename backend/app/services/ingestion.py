@@ -0,0 +1,262 @@
+import asyncio
+import os
+import traceback
+import uuid
+from datetime import datetime
+from typing import List, Optional, Tuple
+import numpy as np
+from app.database import SessionLocal, IngestionJob
+from app.services.chunking import Chunker
+from app.services.embeddings import EmbeddingService
+from app.services.vector_store import VectorStore
+from app.services.workers import IngestionWorkers
+from app.services.rag import RAGService
+
+# Job states, in pipeline order
+JOB_QUEUED = "queued"
+JOB_PARSING = "parsing"
+JOB_EMBEDDING = "embedding"
+JOB_INDEXING = "indexing"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+class IngestionPipeline:
+    """
+    Background pipeline that parses, embeds and indexes uploaded documents.
+    
+    Jobs are persisted in the ingestion_jobs table, so progress can be polled
+    from any worker and unfinished jobs are picked up again after a restart.
+    
+    With a RAG service whose generation bank is enabled, each completed
+    document's quiz and flashcard bank is built in the background. A build
+    interrupted by a restart is not resumed; requests then generate live.
+    
+    Configuration (environment):
+        INGEST_WORKERS: jobs processed concurrently per process (default 2)
+        INGEST_EMBED_BATCH: chunks embedded between progress updates (default 64)
+    """
+    
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        vector_store: VectorStore,
+        workers: IngestionWorkers,
+        rag_service: Optional[RAGService] = None
+    ):
+        self.embedding_service = embedding_service
+        self.vector_store = vector_store
+        self.workers = workers
+        self.rag_service = rag_service
+        self.concurrency = int(os.getenv("INGEST_WORKERS", "2"))
+        self.embed_batch_size = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        # Bank builds in flight, kept referenced until they finish
+        self._bank_tasks = set()
+    
+    async def start(self):
+        """Start the job workers and re-queue jobs left unfinished by a restart."""
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        
+        db = SessionLocal()
+        try:
+            pending = db.query(IngestionJob).filter(
+                IngestionJob.status.notin_([JOB_COMPLETED, JOB_FAILED])
+            ).order_by(IngestionJob.created_at).all()
+            for job in pending:
+                self._queue.put_nowait(job.id)
+        finally:
+            db.close()
+    
+    async def stop(self):
+        """Stop the job workers. Interrupted jobs resume on the next start."""
+        for task in self._tasks + list(self._bank_tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._bank_tasks, return_exceptions=True)
+        self._tasks = []
+        self._bank_tasks = set()
+    
+    def submit(self, document_id: str, filename: str, file_path: str, content_type: str) -> str:
+        """Record a new ingestion job and queue it. Returns the job id."""
+        job_id = str(uuid.uuid4())
+        db = SessionLocal()
+        try:
+            db.add(IngestionJob(
+                id=job_id,
+                document_id=document_id,
+                filename=filename,
+                file_path=file_path,
+                content_type=content_type,
+                status=JOB_QUEUED
+            ))
+            db.commit()
+        finally:
+            db.close()
+        
+        self._queue.put_nowait(job_id)
+        return job_id
+    
+    @staticmethod
+    def get_job(job_id: str) -> Optional[IngestionJob]:
+        """Load a job by id."""
+        db = SessionLocal()
+        try:
+            return db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+        finally:
+            db.close()
+    
+    @staticmethod
+    def latest_job(document_id: str) -> Optional[IngestionJob]:
+        """Most recent job for a document."""
+        db = SessionLocal()
+        try:
+            return db.query(IngestionJob).filter(
+                IngestionJob.document_id == document_id
+            ).order_by(IngestionJob.created_at.desc()).first()
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _update_job(job_id: str, **fields):
+        """Persist progress fields for a job."""
+        fields["updated_at"] = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            db.query(IngestionJob).filter(IngestionJob.id == job_id).update(fields)
+            db.commit()
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _claim_job(job: IngestionJob) -> bool:
+        """
+        Move a job to parsing unless another worker process got there first.
+        
+        The update only matches the job as this worker last saw it, so when
+        several processes re-queue the same job after a restart only one runs it.
+        """
+        db = SessionLocal()
+        try:
+            claimed = db.query(IngestionJob).filter(
+                IngestionJob.id == job.id,
+                IngestionJob.status == job.status,
+                IngestionJob.updated_at == job.updated_at
+            ).update({"status": JOB_PARSING, "updated_at": datetime.utcnow()})
+            db.commit()
+            return claimed == 1
+        finally:
+            db.close()
+    
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in ingestion job {job_id}: {e}")
+                print(traceback.format_exc())
+                self._update_job(job_id, status=JOB_FAILED, error=str(e))
+            finally:
+                self._queue.task_done()
+    
+    async def _build_bank(self, document_id: str, texts: List[str]):
+        try:
+            await self.rag_service.build_bank(document_id, texts)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error building generation bank for document {document_id}: {e}")
+            print(traceback.format_exc())
+    
+    def _deleted(self, job: IngestionJob) -> bool:
+        """
+        Whether the document was deleted while its job ran, failing the job
+        if so. Deleting a document removes its file before its chunks.
+        """
+        if os.path.exists(job.file_path):
+            return False
+        self._update_job(job.id, status=JOB_FAILED, error="Document was deleted during processing")
+        return True
+    
+    async def _embed_next(self, job_id: str, chunks: List[Tuple[Optional[int], str]], start: int, batches: list) -> int:
+        """Embed the next batch of chunks after start. Returns the number embedded so far."""
+        batch = [text for _, text in chunks[start:start + self.embed_batch_size]]
+        batches.append(await self.workers.embed_batch(self.embedding_service, batch))
+        end = start + len(batch)
+        self._update_job(job_id, chunks_embedded=end)
+        return end
+    
+    async def _run(self, job_id: str):
+        job = self.get_job(job_id)
+        if job is None or job.status in (JOB_COMPLETED, JOB_FAILED):
+            return
+        
+        loop = asyncio.get_running_loop()
+        # A restart during indexing may have already saved the document
+        if job.status == JOB_INDEXING and await loop.run_in_executor(None, self.vector_store.has_document, job.document_id):
+            self._update_job(job_id, status=JOB_COMPLETED)
+            return
+        
+        if not self._claim_job(job):
+            return
+        
+        # Drop chunks left by an earlier attempt, interrupted or failed; a
+        # no-op for a document that has none
+        await loop.run_in_executor(None, self.vector_store.delete_document, job.document_id)
+        
+        # Extract pages in the process pool and chunk them as they arrive.
+        # Full batches are embedded while later pages are still being parsed.
+        page_count = await self.workers.count_pages(job.file_path, job.content_type)
+        self._update_job(job_id, pages_total=page_count, pages_parsed=0, chunks_total=0, chunks_embedded=0)
+        
+        # Chunks are sized in the embedding model's own tokens
+        chunker = Chunker(
+            tokenizer=self.embedding_service.tokenizer,
+            model_max_tokens=self.embedding_service.max_seq_length
+        )
+        chunks: List[Tuple[Optional[int], str]] = []
+        batches = []
+        embedded = 0
+        pages_parsed = 0
+        async for pages in self.workers.iter_pages(job.file_path, job.content_type, page_count):
+            chunks.extend(await self.workers.chunk_pages(chunker, pages))
+            pages_parsed += len(pages)
+            self._update_job(job_id, pages_parsed=pages_parsed, chunks_total=len(chunks))
+            while len(chunks) - embedded >= self.embed_batch_size:
+                if self._deleted(job):
+                    return
+                embedded = await self._embed_next(job_id, chunks, embedded, batches)
+        
+        chunks.extend(await self.workers.chunk_pages(chunker, [], final=True))
+        self._update_job(job_id, status=JOB_EMBEDDING, chunks_total=len(chunks))
+        while embedded < len(chunks):
+            if self._deleted(job):
+                return
+            embedded = await self._embed_next(job_id, chunks, embedded, batches)
+        
+        # Add to vector store; the append log makes this durable, so only
+        # the new document is written rather than the whole index. Runs in a
+        # thread: it waits for the log lock other workers hold while writing.
+        self._update_job(job_id, status=JOB_INDEXING)
+        if batches:
+            if self._deleted(job):
+                return
+            metadata = [(job.document_id, i, text, page) for i, (page, text) in enumerate(chunks)]
+            await loop.run_in_executor(None, self.vector_store.add_embeddings, np.vstack(batches), metadata)
+            if self._deleted(job):
+                # Deleted between the check and the add, after the delete
+                # looked for chunks: remove them here
+                await loop.run_in_executor(None, self.vector_store.delete_document, job.document_id)
+                return
+            await loop.run_in_executor(None, self.vector_store.maybe_snapshot)
+        
+        self._update_job(job_id, status=JOB_COMPLETED)
+        
+        # The document is searchable now; its bank fills in behind it
+        if batches and self.rag_service is not None and self.rag_service.generation_bank.enabled:
+            task = asyncio.create_task(self._build_bank(job.document_id, [text for _, text in chunks]))
+            self._bank_tasks.add(task)
+            task.add_done_callback(self._bank_tasks.discard)
@@ -0,0 +1,248 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+# BM25 parameters: term-frequency saturation and length normalization
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Rank constant for reciprocal-rank fusion; larger values flatten the
+# advantage of the top ranks
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Words with dots, dashes or pluses inside stay whole ("csc-131", "c++", "3.14");
+# their parts are indexed too, so "CSC 131" still matches "CSC-131"
+_TERM = re.compile(r"\w+(?:[.\-+]\w+)*\+*")
+_TERM_PART = re.compile(r"[.\-+]+")
+_STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+what which who whom how why when where does do did about into than then there these those can
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased index terms of a text, without stopwords."""
+    terms = []
+    for term in _TERM.findall(text.lower()):
+        if term not in _STOPWORDS:
+            terms.append(term)
+        parts = [part for part in _TERM_PART.split(term) if part]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part not in _STOPWORDS)
+    return terms
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """
+    Fuse ranked id lists: each id scores sum(1 / (k + rank)) over the lists
+    it appears in (rank from 1).
+    
+    Returns:
+        (id, fused score) pairs, best first
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+# One posting: chunk id, term frequency and chunk length (in terms)
+_POSTING = np.dtype([('chunk', '<i8'), ('tf', '<i4'), ('length', '<i4')])
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk texts, keyed by vector id.
+    
+    Postings live in a SQLite file next to the FAISS index. Each add writes
+    one packed segment per term, so a term's posting list is a handful of
+    blobs read straight into numpy, and a query costs a few index lookups
+    and vector operations even for common terms. Document frequencies are
+    the segment sizes, so nothing global is rewritten on add. Deletes drop
+    or rewrite only the segments of the affected add, and worker processes
+    share the file like the ChunkStore.
+    
+    Configuration (environment):
+        BM25_K1: term-frequency saturation (default 1.2)
+        BM25_B: document-length normalization (default 0.75)
+    """
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            -- Segments are keyed by the add they came from (its smallest chunk id)
+            CREATE TABLE IF NOT EXISTS segments (
+                term TEXT NOT NULL,
+                segment INTEGER NOT NULL,
+                postings BLOB NOT NULL,
+                PRIMARY KEY (term, segment)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS ix_segments_segment ON segments(segment);
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id INTEGER PRIMARY KEY,
+                segment INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_chunks_segment ON chunks(segment);
+            -- Running totals for BM25, so queries never scan all chunks
+            CREATE TABLE IF NOT EXISTS stats (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                chunks INTEGER NOT NULL,
+                total_length INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO stats (id, chunks, total_length) VALUES (0, 0, 0);
+        """)
+        self._conn.commit()
+    
+    def add(self, chunk_ids: Iterable[int], texts: Iterable[str]):
+        """Index chunks (ids already indexed are skipped)."""
+        items = [(int(chunk_id), text) for chunk_id, text in zip(chunk_ids, texts)]
+        if not items:
+            return
+        with self._lock:
+            cursor = self._conn.cursor()
+            existing = set()
+            for start in range(0, len(items), 500):
+                batch = [chunk_id for chunk_id, _ in items[start:start + 500]]
+                existing.update(row[0] for row in cursor.execute(
+                    f"SELECT chunk_id FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                ))
+            items = [(chunk_id, text) for chunk_id, text in items if chunk_id not in existing]
+            if not items:
+                return
+            
+            # Chunk ids are unique, so the smallest one names this segment
+            segment = min(chunk_id for chunk_id, _ in items)
+            postings: Dict[str, list] = {}
+            lengths = []
+            for chunk_id, text in items:
+                terms = tokenize(text)
+                lengths.append((chunk_id, segment, len(terms)))
+                for term, tf in Counter(terms).items():
+                    postings.setdefault(term, []).append((chunk_id, tf, len(terms)))
+            
+            cursor.executemany("INSERT INTO chunks (chunk_id, segment, length) VALUES (?, ?, ?)", lengths)
+            cursor.executemany(
+                "INSERT INTO segments (term, segment, postings) VALUES (?, ?, ?)",
+                [(term, segment, np.array(rows, dtype=_POSTING).tobytes()) for term, rows in postings.items()]
+            )
+            cursor.execute(
+                "UPDATE stats SET chunks = chunks + ?, total_length = total_length + ? WHERE id = 0",
+                (len(lengths), sum(length for _, _, length in lengths))
+            )
+            self._conn.commit()
+    
+    def delete(self, chunk_ids: Iterable[int]):
+        """Remove chunks from the index."""
+        ids = sorted({int(i) for i in chunk_ids})
+        if not ids:
+            return
+        with self._lock:
+            cursor = self._conn.cursor()
+            rows = []
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                rows.extend(cursor.execute(
+                    f"SELECT chunk_id, segment, length FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                ))
+            if not rows:
+                return
+            
+            deleted = np.array([row[0] for row in rows], dtype='int64')
+            for segment in {row[1] for row in rows}:
+                remaining = cursor.execute(
+                    "SELECT COUNT(*) FROM chunks WHERE segment = ?", (segment,)
+                ).fetchone()[0] - sum(1 for row in rows if row[1] == segment)
+                if remaining == 0:
+                    # The usual case: a whole document is deleted
+                    cursor.execute("DELETE FROM segments WHERE segment = ?", (segment,))
+                    continue
+                for term, blob in cursor.execute(
+                    "SELECT term, postings FROM segments WHERE segment = ?", (segment,)
+                ).fetchall():
+                    postings = np.frombuffer(blob, dtype=_POSTING)
+                    postings = postings[~np.isin(postings['chunk'], deleted)]
+                    if len(postings):
+                        cursor.execute(
+                            "UPDATE segments SET postings = ? WHERE term = ? AND segment = ?",
+                            (postings.tobytes(), term, segment)
+                        )
+                    else:
+                        cursor.execute("DELETE FROM segments WHERE term = ? AND segment = ?", (term, segment))
+            
+            cursor.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(row[0],) for row in rows])
+            cursor.execute(
+                "UPDATE stats SET chunks = chunks - ?, total_length = total_length - ? WHERE id = 0",
+                (len(rows), sum(row[2] for row in rows))
+            )
+            self._conn.commit()
+    
+    def chunk_ids(self) -> np.ndarray:
+        """Ids of all indexed chunks."""
+        with self._lock:
+            rows = self._conn.execute("SELECT chunk_id FROM chunks").fetchall()
+        return np.fromiter((row[0] for row in rows), dtype='int64', count=len(rows))
+    
+    def search(self, query: str, k: int = 10, candidate_ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k chunks for a query by BM25.
+        
+        Args:
+            query: Query text
+            k: Number of results
+            candidate_ids: Optional ids to restrict the search to
+        
+        Returns:
+            (chunk ids, BM25 scores), best first
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        empty = (np.zeros(0, dtype='int64'), np.zeros(0, dtype='float32'))
+        if not terms or k <= 0:
+            return empty
+        
+        with self._lock:
+            n, total_length = self._conn.execute("SELECT chunks, total_length FROM stats WHERE id = 0").fetchone()
+            if n == 0:
+                return empty
+            blobs = [
+                [row[0] for row in self._conn.execute("SELECT postings FROM segments WHERE term = ?", (term,))]
+                for term in terms
+            ]
+        
+        avg_length = total_length / n
+        ids, scores = [], []
+        for term_blobs in blobs:
+            if not term_blobs:
+                continue
+            postings = np.frombuffer(b"".join(term_blobs), dtype=_POSTING)
+            df = len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            tf = postings['tf'].astype('float32')
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * postings['length'] / avg_length)
+            ids.append(postings['chunk'])
+            scores.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+        if not ids:
+            return empty
+        
+        # Sum per-term scores for each chunk
+        ids, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        if candidate_ids is not None:
+            keep = np.isin(ids, candidate_ids)
+            ids, totals = ids[keep], totals[keep]
+        k = min(k, len(ids))
+        if k == 0:
+            return empty
+        top = np.argpartition(-totals, k - 1)[:k]
+        top = top[np.argsort(-totals[top], kind="stable")]
+        return ids[top], totals[top].astype('float32')
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import random
+from typing import AsyncIterator, List, Optional
+from openai import AsyncOpenAI, RateLimitError
+
+class LLMClient:
+    """
+    Async chat completion client shared by the RAG endpoints.
+    
+    Caps the number of concurrent upstream calls with a semaphore, applies a
+    per-request timeout and retries 429 responses with jittered exponential
+    backoff, so a slow completion never blocks the event loop.
+    
+    Configuration (environment):
+        LLM_MAX_CONCURRENCY: max in-flight completions per worker (default 8)
+        LLM_TIMEOUT_SECONDS: per-request timeout (default 60)
+        LLM_MAX_RETRIES: retries on rate limiting (default 3)
+        LLM_BACKOFF_BASE_SECONDS / LLM_BACKOFF_MAX_SECONDS: backoff window (default 1 / 20)
+    """
+    
+    def __init__(self):
+        # Support both Azure OpenAI and regular OpenAI
+        azure_api_key = os.getenv("AZURE_OPENAI_API_KEY")
+        azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+        azure_api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+        
+        # Retries are handled here so they can share the concurrency limit
+        if azure_api_key and azure_endpoint:
+            # Use Azure OpenAI
+            from openai import AsyncAzureOpenAI
+            self.client = AsyncAzureOpenAI(
+                api_key=azure_api_key,
+                api_version=azure_api_version,
+                azure_endpoint=azure_endpoint,
+                max_retries=0
+            )
+            self.model_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o-mini")
+            self.use_azure = True
+        elif openai_api_key:
+            # Use regular OpenAI
+            self.client = AsyncOpenAI(api_key=openai_api_key, max_retries=0)
+            self.model_name = "gpt-4o-mini"
+            self.use_azure = False
+        else:
+            raise ValueError("Either OPENAI_API_KEY or (AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT) must be set")
+        
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self.timeout = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.backoff_base = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+        self.backoff_max = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "20"))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+    
+    def _backoff_delay(self, attempt: int, error: RateLimitError) -> float:
+        """Seconds to wait before retrying, honouring Retry-After when present."""
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = None
+        
+        # Full jitter keeps many waiting workers from retrying in lockstep
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+    
+    async def _acquire_and_create(self, messages: List[dict], timeout: Optional[float], **kwargs):
+        """
+        Take a concurrency slot and create the completion, retrying 429s.
+        
+        The slot is released while backing off so other requests can proceed.
+        On success the slot is still held and the caller must release it.
+        """
+        attempt = 0
+        while True:
+            await self._semaphore.acquire()
+            try:
+                return await self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    timeout=timeout or self.timeout,
+                    **kwargs
+                )
+            except RateLimitError as e:
+                self._semaphore.release()
+                # An exhausted quota is also a 429, but retrying cannot help
+                if attempt >= self.max_retries or getattr(e, "code", None) == "insufficient_quota":
+                    raise
+                await asyncio.sleep(self._backoff_delay(attempt, e))
+                attempt += 1
+            except BaseException:
+                self._semaphore.release()
+                raise
+    
+    async def chat(self, messages: List[dict], timeout: Optional[float] = None, **kwargs):
+        """
+        Create a chat completion.
+        
+        Args:
+            messages: Chat messages
+            timeout: Override of the per-request timeout in seconds
+            **kwargs: Passed through to chat.completions.create
+        """
+        response = await self._acquire_and_create(messages, timeout, **kwargs)
+        self._semaphore.release()
+        return response
+    
+    async def chat_stream(
+        self,
+        messages: List[dict],
+        timeout: Optional[float] = None,
+        usage: Optional[dict] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Stream a chat completion, yielding content deltas as they arrive.
+        
+        Rate-limit retries happen before the first token, so callers never
+        see a partial answer repeated. The concurrency slot is held until the
+        stream is exhausted or closed.
+        
+        Args:
+            usage: If given, filled with prompt_tokens and completion_tokens
+                once the stream ends (OpenAI only; Azure API versions before
+                2024-09 do not report usage when streaming)
+        """
+        if usage is not None and not self.use_azure:
+            kwargs["stream_options"] = {"include_usage": True}
+        stream = await self._acquire_and_create(messages, timeout, stream=True, **kwargs)
+        try:
+            async for chunk in stream:
+                if usage is not None and getattr(chunk, "usage", None):
+                    usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                    usage["completion_tokens"] = chunk.usage.completion_tokens
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            self._semaphore.release()
+            await stream.close()
@@ -0,0 +1,133 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Set, Tuple
+import numpy as np
+from app.services.embeddings import EmbeddingService
+from app.services.vector_store import VectorStore
+
+# Search arguments of a query: (k, document_ids, min_score, lexical_query)
+_Search = Tuple[int, Optional[List[str]], Optional[float], Optional[str]]
+# A waiting query: (text, search arguments if it also wants results, future)
+_Pending = Tuple[str, Optional[_Search], asyncio.Future]
+
+class QueryBatcher:
+    """
+    Async micro-batcher for query embeddings.
+    
+    Concurrent requests each await embed(); their texts are collected for
+    up to QUERY_BATCH_WAIT_MS after the first arrives, or until
+    QUERY_BATCH_SIZE are waiting, and encoded in one model call on a
+    dedicated thread, so queries never queue behind ingestion batches and
+    the event loop is never blocked by the model. Texts arriving while a
+    batch is encoding form the next batch.
+    
+    Callers of search() also get their vector search batched: once the
+    batch is encoded, all its queries go to VectorStore.search_batch at
+    once. Searches run on the event loop, like index writes, so the two
+    never overlap.
+    
+    Configuration (environment):
+        QUERY_BATCH_SIZE: max queries per model call (default 32)
+        QUERY_BATCH_WAIT_MS: max time a query waits for others (default 5)
+    """
+    
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        vector_store: Optional[VectorStore] = None,
+        max_batch: Optional[int] = None,
+        max_wait_ms: Optional[float] = None
+    ):
+        self.embedding_service = embedding_service
+        self.vector_store = vector_store
+        self.max_batch = max_batch or int(os.getenv("QUERY_BATCH_SIZE", "32"))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv("QUERY_BATCH_WAIT_MS", "5"))
+        self.max_wait = max_wait_ms / 1000
+        
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-embed")
+        self._pending: List[_Pending] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Running batches, referenced so they are not garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+    
+    def _submit(self, text: str, search: Optional[_Search]) -> asyncio.Future:
+        """Queue a query and return the future it will be resolved through."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, search, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return future
+    
+    async def embed(self, text: str) -> np.ndarray:
+        """Embedding of one query, encoded together with concurrent ones."""
+        embedding, _ = await self._submit(text, None)
+        return embedding
+    
+    async def search(
+        self,
+        text: str,
+        k: int = 5,
+        document_ids: Optional[List[str]] = None,
+        min_score: Optional[float] = None,
+        lexical_query: Optional[str] = None
+    ) -> Tuple[List[dict], np.ndarray]:
+        """
+        Embed a query and search the vector store, batched with concurrent
+        queries.
+        
+        Returns:
+            (results as from VectorStore.search, query embedding)
+        """
+        embedding, results = await self._submit(text, (k, document_ids, min_score, lexical_query))
+        return results, embedding
+    
+    def _flush(self):
+        """Send the waiting queries to the model as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        # Callers that gave up (e.g. client disconnected) need no embedding
+        batch = [item for item in batch if not item[2].done()]
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, batch: List[_Pending]):
+        loop = asyncio.get_running_loop()
+        try:
+            embeddings = await loop.run_in_executor(
+                self._pool, self.embedding_service.embed_batch, [text for text, _, _ in batch]
+            )
+            
+            results = [None] * len(batch)
+            searches = [i for i, (_, search, _) in enumerate(batch) if search is not None]
+            if searches:
+                # Each query is ranked at its own k, so batching never changes its results
+                found = self.vector_store.search_batch(
+                    embeddings[searches],
+                    [batch[i][1][0] for i in searches],
+                    [batch[i][1][1] for i in searches],
+                    [batch[i][1][2] for i in searches],
+                    [batch[i][1][3] for i in searches]
+                )
+                for i, hits in zip(searches, found):
+                    results[i] = hits
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), embedding, hits in zip(batch, embeddings, results):
+            if not future.done():
+                future.set_result((embedding, hits))
+    
+    def shutdown(self):
+        """Stop the encoding thread, waiting for a running batch to finish."""
+        self._pool.shutdown(wait=True)
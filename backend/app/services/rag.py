@@ -1,77 +1,109 @@
-from typing import List, Optional
+import asyncio
 import os
-from openai import OpenAI
+import numpy as np
+from typing import AsyncIterator, Callable, List, Optional, Tuple
 from app.services.vector_store import VectorStore
 from app.services.embeddings import EmbeddingService
+from app.services.llm import LLMClient
+from app.services.answer_cache import AnswerCache
+from app.services.query_batcher import QueryBatcher
+from app.services.context_builder import Context, ContextBuilder
+from app.services.fan_out import FanOut
+from app.services.generation_bank import BANK_QUESTION_TYPE, CARD, GenerationBank
+
+# Chunks less similar to the question than this (cosine) are not sent to the
+# LLM; with none left, the question is answered from general knowledge
+MIN_RELEVANCE = float(os.getenv("RAG_MIN_RELEVANCE", "0.3"))
+
+# Also rank chunks by BM25 keyword match and fuse it with vector similarity,
+# so exact terms (course codes, formulas, names) are found
+HYBRID_SEARCH = os.getenv("RAG_HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+
+# Cosine similarity needed for a source to be labelled High or Medium relevance
+HIGH_RELEVANCE = float(os.getenv("RAG_HIGH_RELEVANCE", "0.6"))
+MEDIUM_RELEVANCE = float(os.getenv("RAG_MEDIUM_RELEVANCE", "0.45"))
 
 class RAGService:
-    def __init__(self, vector_store: VectorStore, embedding_service: EmbeddingService):
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        embedding_service: EmbeddingService,
+        answer_cache: Optional[AnswerCache] = None,
+        query_batcher: Optional[QueryBatcher] = None,
+        generation_bank: Optional[GenerationBank] = None
+    ):
         self.vector_store = vector_store
         self.embedding_service = embedding_service
+        # Concurrent queries are embedded together in one model call
+        self.query_batcher = query_batcher if query_batcher is not None else QueryBatcher(embedding_service, vector_store)
+        # Reuses answers to near-identical questions over the same chunks
+        self.answer_cache = answer_cache if answer_cache is not None else AnswerCache()
+        # Quiz questions and flashcards pre-generated at ingest time
+        self.generation_bank = generation_bank if generation_bank is not None else GenerationBank()
         
-        # Support both Azure OpenAI and regular OpenAI
-        azure_api_key = os.getenv("AZURE_OPENAI_API_KEY")
-        azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-        azure_api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        
-        if azure_api_key and azure_endpoint:
-            # Use Azure OpenAI
-            from openai import AzureOpenAI
-            self.client = AzureOpenAI(
-                api_key=azure_api_key,
-                api_version=azure_api_version,
-                azure_endpoint=azure_endpoint
-            )
-            self.model_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o-mini")
-            self.use_azure = True
-        elif openai_api_key:
-            # Use regular OpenAI
-            self.client = OpenAI(api_key=openai_api_key)
-            self.model_name = "gpt-4o-mini"
-            self.use_azure = False
-        else:
-            raise ValueError("Either OPENAI_API_KEY or (AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT) must be set")
+        # Async client with concurrency limit, timeout and 429 backoff
+        self.llm = LLMClient()
+        self.model_name = self.llm.model_name
+        self.use_azure = self.llm.use_azure
+        # Packs retrieved chunks and pasted text into a token budget
+        self.context_builder = ContextBuilder(self.model_name)
+        # Large quiz and flashcard requests are generated in concurrent sections
+        self.fan_out = FanOut()
     
-    def answer_question(
-        self, 
-        question: str, 
-        document_ids: Optional[List[str]] = None,
-        top_k: int = 5,
-        user_major: Optional[str] = None,
-        user_year: Optional[str] = None
-    ) -> dict:
-        """
-        Answer a question using RAG.
-        
-        Args:
-            question: User's question
-            document_ids: Optional list of document IDs to search in
-            top_k: Number of chunks to retrieve
-        
-        Returns:
-            dict with answer, sources, and confidence
-        """
-        # Embed the question
-        query_embedding = self.embedding_service.embed_text(question)
-        
-        # Search for relevant chunks
-        results = self.vector_store.search(query_embedding, k=top_k)
-        
-        # Filter by document_ids if provided
-        if document_ids:
-            results = [r for r in results if r['document_id'] in document_ids]
-        
-        # Check if vector store has any data or if we have results
-        has_documents = self.vector_store.index is not None and self.vector_store.index.ntotal > 0
-        has_results = len(results) > 0
-        
-        # Build context from retrieved chunks if available
-        context = ""
-        if has_results:
-            context = "\n\n".join([f"[Source {i+1}]: {r['text']}" for i, r in enumerate(results)])
+    async def _retrieve_for_question(
+        self,
+        question: str,
+        document_ids: Optional[List[str]],
+        top_k: int
+    ) -> Tuple[List[dict], bool, np.ndarray]:
+        """Retrieve chunks for a question. Returns (results, has_documents, question embedding)."""
+        # Embed the question and search for relevant chunks, within document_ids if provided
+        results, query_embedding = await self.query_batcher.search(
+            question,
+            k=top_k,
+            document_ids=document_ids,
+            min_score=MIN_RELEVANCE,
+            lexical_query=question if HYBRID_SEARCH else None
+        )
         
-        # Build user context for personalization
+        # Check if vector store has any data
+        has_documents = self.vector_store.count() > 0
+        return results, has_documents, query_embedding
+    
+    @staticmethod
+    def _usage(prompt_tokens: int, completion_tokens: int, context_tokens: int) -> dict:
+        """Token usage of a request, including the tokens of context (chunks or pasted text) sent."""
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "context_tokens": context_tokens
+        }
+    
+    @classmethod
+    def _response_usage(cls, response, context_tokens: int) -> dict:
+        """Token usage reported with a chat completion."""
+        usage = response.usage
+        if usage is None:
+            return cls._usage(0, 0, context_tokens)
+        return cls._usage(usage.prompt_tokens, usage.completion_tokens, context_tokens)
+    
+    def _answer_cache_key(
+        self,
+        results: List[dict],
+        has_documents: bool,
+        document_ids: Optional[List[str]],
+        user_major: Optional[str],
+        user_year: Optional[str]
+    ) -> tuple:
+        """Answer cache key for a question's retrieval and context."""
+        return AnswerCache.make_key(
+            [r['chunk_id'] for r in results], document_ids, user_major, user_year, self.model_name, has_documents
+        )
+    
+    @staticmethod
+    def _build_user_context(user_major: Optional[str], user_year: Optional[str]) -> str:
+        """Build user context for personalization."""
         user_context = ""
         if user_major:
             # Handle multiple majors (comma-separated)
@@ -87,9 +119,24 @@ class RAGService:
                 user_context += f" in their {user_year} year"
             user_context += ". "
             user_context += "Tailor your answer to be relevant to their field(s) of study. Use examples and terminology appropriate for their major(s) when helpful. "
+        return user_context
+    
+    def _build_answer_messages(
+        self,
+        question: str,
+        chunks: Context,
+        has_documents: bool,
+        user_major: Optional[str],
+        user_year: Optional[str]
+    ) -> List[dict]:
+        """Build the chat messages for answering a question."""
+        user_context = self._build_user_context(user_major, user_year)
         
         # Generate answer using LLM - support both document-based and general questions
-        if has_results:
+        if chunks.results:
+            # Build context from the chunks that fit the token budget
+            context = "\n\n".join([f"[Source {i+1}]: {text}" for i, text in enumerate(chunks.texts)])
+            
             # Document-based answer
             prompt = f"""You are an expert study assistant for UNC Wilmington students. {user_context}Answer the following question based on the provided context from the user's study materials. Provide a comprehensive, detailed answer that demonstrates deep understanding.
 
@@ -138,57 +185,102 @@ Instructions:
 - You can mention that they can upload documents for more specific answers related to their study materials
 
 Answer:"""
+
+        return [
+            {"role": "system", "content": "You are an expert study assistant for UNC Wilmington students. Provide comprehensive, detailed answers that demonstrate deep understanding of topics. Break down complex concepts clearly."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    @staticmethod
+    def _answer_confidence(results: List[dict]) -> float:
+        """Calculate confidence based on results."""
+        if results:
+            # Average cosine similarity of the chunks sent; vector and keyword
+            # hits alike passed the relevance cutoff, so no floor is needed
+            avg_confidence = sum(r['score'] for r in results) / len(results)
+            avg_confidence = min(1.0, max(0.0, avg_confidence))
+        else:
+            # For general questions without documents, use a base confidence
+            # This represents confidence in the AI's general knowledge
+            avg_confidence = 0.75  # 75% confidence for general knowledge answers
+        return round(avg_confidence, 3)
+    
+    @staticmethod
+    def _format_sources(results: List[dict]) -> List[dict]:
+        """Format retrieved chunks as sources for the response."""
+        return [
+            {
+                "text": r['text'][:300] + "..." if len(r['text']) > 300 else r['text'],
+                "document_id": r.get('document_id', 'unknown'),
+                "page": r.get('page'),
+                "score": round(r['score'], 3),
+                "relevance": "High" if r['score'] >= HIGH_RELEVANCE else "Medium" if r['score'] >= MEDIUM_RELEVANCE else "Low"
+            }
+            for r in results
+        ]
+    
+    @staticmethod
+    def _friendly_error(e: Exception) -> str:
+        """Map common OpenAI API errors to user-facing messages."""
+        error_msg = str(e)
+        if "api_key" in error_msg.lower() or "authentication" in error_msg.lower():
+            error_msg = "Invalid OpenAI API key. Please check your .env file."
+        elif "rate limit" in error_msg.lower():
+            error_msg = "OpenAI API rate limit exceeded. Please try again later."
+        elif "insufficient_quota" in error_msg.lower():
+            error_msg = "OpenAI API quota exceeded. Please check your account billing."
+        return error_msg
+    
+    async def answer_question(
+        self, 
+        question: str, 
+        document_ids: Optional[List[str]] = None,
+        top_k: int = 5,
+        user_major: Optional[str] = None,
+        user_year: Optional[str] = None
+    ) -> dict:
+        """
+        Answer a question using RAG.
+        
+        Args:
+            question: User's question
+            document_ids: Optional list of document IDs to search in
+            top_k: Number of chunks to retrieve
+        
+        Returns:
+            dict with answer, sources, confidence and token usage
+        """
+        results, has_documents, query_embedding = await self._retrieve_for_question(question, document_ids, top_k)
+        chunks = self.context_builder.build(results)
+        results = chunks.results
+        cache_key = self._answer_cache_key(results, has_documents, document_ids, user_major, user_year)
+        cached = self.answer_cache.get(query_embedding, cache_key)
+        if cached is not None:
+            # Served without calling the model
+            return {**cached, "usage": self._usage(0, 0, 0)}
+        
+        messages = self._build_answer_messages(question, chunks, has_documents, user_major, user_year)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "You are an expert study assistant for UNC Wilmington students. Provide comprehensive, detailed answers that demonstrate deep understanding of topics. Break down complex concepts clearly."},
-                    {"role": "user", "content": prompt}
-                ],
+            response = await self.llm.chat(
+                messages=messages,
                 temperature=0.7,
                 max_tokens=1500  # Increased for deeper answers
             )
             
             answer = response.choices[0].message.content
             
-            # Calculate confidence based on results
-            if results:
-                # Average confidence from retrieved chunks (scores are similarity scores 0-1)
-                avg_confidence = sum(r['score'] for r in results) / len(results)
-                # Normalize to 0-1 range and ensure reasonable confidence
-                avg_confidence = min(1.0, max(0.3, avg_confidence))
-            else:
-                # For general questions without documents, use a base confidence
-                # This represents confidence in the AI's general knowledge
-                avg_confidence = 0.75  # 75% confidence for general knowledge answers
-            
             # Always include sources, even if empty
-            sources_list = [
-                {
-                    "text": r['text'][:300] + "..." if len(r['text']) > 300 else r['text'],
-                    "document_id": r.get('document_id', 'unknown'),
-                    "score": round(r['score'], 3),
-                    "relevance": "High" if r['score'] > 0.7 else "Medium" if r['score'] > 0.5 else "Low"
-                }
-                for r in results
-            ] if results else []
-            
-            return {
+            result = {
                 "answer": answer,
-                "sources": sources_list,
-                "confidence": round(avg_confidence, 3)
+                "sources": self._format_sources(results),
+                "confidence": self._answer_confidence(results)
             }
+            self.answer_cache.put(query_embedding, cache_key, result, {r['document_id'] for r in results})
+            return {**result, "usage": self._response_usage(response, chunks.tokens)}
         except Exception as e:
             import traceback
-            error_msg = str(e)
-            # Check for common OpenAI API errors
-            if "api_key" in error_msg.lower() or "authentication" in error_msg.lower():
-                error_msg = "Invalid OpenAI API key. Please check your .env file."
-            elif "rate limit" in error_msg.lower():
-                error_msg = "OpenAI API rate limit exceeded. Please try again later."
-            elif "insufficient_quota" in error_msg.lower():
-                error_msg = "OpenAI API quota exceeded. Please check your account billing."
+            error_msg = self._friendly_error(e)
             
             print(f"Error in answer_question: {error_msg}")
             print(traceback.format_exc())
@@ -196,10 +288,238 @@ Answer:"""
             return {
                 "answer": f"Error: {error_msg}",
                 "sources": [],
-                "confidence": 0.0
+                "confidence": 0.0,
+                "usage": self._usage(0, 0, 0)
             }
     
-    def generate_quiz(
+    async def answer_question_stream(
+        self,
+        question: str,
+        document_ids: Optional[List[str]] = None,
+        top_k: int = 5,
+        user_major: Optional[str] = None,
+        user_year: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Answer a question using RAG, streaming the answer as it is generated.
+        
+        Yields (event, data) pairs in order:
+            ("sources", {"sources": [...]}) once retrieval is done
+            ("delta", {"text": "..."}) for each token delta from the model
+            ("done", {"confidence": 0.0-1.0, "usage": {...}}) when the answer is complete
+            ("error", {"message": "..."}) instead of "done" if generation fails
+        """
+        results, has_documents, query_embedding = await self._retrieve_for_question(question, document_ids, top_k)
+        chunks = self.context_builder.build(results)
+        results = chunks.results
+        cache_key = self._answer_cache_key(results, has_documents, document_ids, user_major, user_year)
+        cached = self.answer_cache.get(query_embedding, cache_key)
+        if cached is not None:
+            yield "sources", {"sources": cached["sources"]}
+            yield "delta", {"text": cached["answer"]}
+            yield "done", {"confidence": cached["confidence"], "usage": self._usage(0, 0, 0)}
+            return
+        
+        sources = self._format_sources(results)
+        yield "sources", {"sources": sources}
+        
+        messages = self._build_answer_messages(question, chunks, has_documents, user_major, user_year)
+        answer_parts = []
+        stream_usage = {}
+        try:
+            async for delta in self.llm.chat_stream(
+                messages=messages,
+                usage=stream_usage,
+                temperature=0.7,
+                max_tokens=1500
+            ):
+                answer_parts.append(delta)
+                yield "delta", {"text": delta}
+        except Exception as e:
+            import traceback
+            error_msg = self._friendly_error(e)
+            
+            print(f"Error in answer_question_stream: {error_msg}")
+            print(traceback.format_exc())
+            
+            yield "error", {"message": error_msg}
+            return
+        
+        confidence = self._answer_confidence(results)
+        answer = "".join(answer_parts)
+        self.answer_cache.put(
+            query_embedding,
+            cache_key,
+            {"answer": answer, "sources": sources, "confidence": confidence},
+            {r['document_id'] for r in results}
+        )
+        if not stream_usage:
+            # The API did not report usage (Azure streams); count locally
+            counter = self.context_builder.counter
+            stream_usage = {"prompt_tokens": counter.count_messages(messages), "completion_tokens": counter.count(answer)}
+        usage = self._usage(stream_usage["prompt_tokens"], stream_usage["completion_tokens"], chunks.tokens)
+        yield "done", {"confidence": confidence, "usage": usage}
+    
+    @staticmethod
+    def _quiz_prompt(context: str, num_questions: int, question_type: str, topic: Optional[str]) -> str:
+        topic_specific = f" focused specifically on {topic}" if topic else ""
+        return f"""Generate {num_questions} {question_type} questions{topic_specific} based EXCLUSIVELY on the following study material.
+
+Study Material:
+{context}
+
+Generate questions that test understanding, not just memorization. For multiple choice questions, provide 4 options and indicate the correct answer.
+
+Format your response as JSON with this structure:
+{{
+  "questions": [
+    {{
+      "question": "Question text",
+      "options": ["Option A", "Option B", "Option C", "Option D"],
+      "correct_answer": 0,
+      "explanation": "Why this answer is correct"
+    }}
+  ]
+}}"""
+
+    @staticmethod
+    def _flashcard_prompt(context: str, num_cards: int) -> str:
+        return f"""Create {num_cards} flashcards from the following study material. Each flashcard should have:
+- A clear question on the front
+- A concise answer on the back
+- A difficulty level (easy, medium, hard)
+- An importance score (0.0 to 1.0)
+
+Study Material:
+{context}
+
+Format as JSON:
+{{
+  "cards": [
+    {{
+      "front": "Question",
+      "back": "Answer",
+      "difficulty": "medium",
+      "importance": 0.8
+    }}
+  ]
+}}"""
+
+    def _chunk_sections(self, chunks: Context, num_items: int) -> List[Tuple[str, int]]:
+        """Packed chunks grouped into generation sections, in document order."""
+        order = sorted(
+            range(len(chunks.results)),
+            key=lambda i: (str(chunks.results[i].get('document_id')), chunks.results[i].get('chunk_index') or 0)
+        )
+        return self.fan_out.plan([chunks.texts[i] for i in order], [chunks.counts[i] for i in order], num_items)
+    
+    def _quiz_generation(self, question_type: str, topic: Optional[str]) -> dict:
+        """How quiz questions are generated, for _generate_items."""
+        return {
+            "field": "questions",
+            "key": lambda q: str(q.get("question", "")),
+            "system": "You are a quiz generator for study materials.",
+            "prompt": lambda section, count: self._quiz_prompt(section, count, question_type, topic),
+            "temperature": 0.8
+        }
+    
+    def _flashcard_generation(self) -> dict:
+        """How flashcards are generated, for _generate_items."""
+        return {
+            "field": "cards",
+            "key": lambda card: str(card.get("front", "")),
+            "system": "You are a flashcard generator.",
+            "prompt": self._flashcard_prompt,
+            "temperature": 0.7
+        }
+    
+    async def _generate_items(
+        self,
+        sections: List[Tuple[str, int]],
+        num_items: int,
+        field: str,
+        key: Callable[[dict], str],
+        system: str,
+        prompt: Callable[[str, int], str],
+        temperature: float,
+        concurrency: Optional[int] = None
+    ) -> Tuple[List[dict], int, int]:
+        """
+        Generate JSON items (quiz questions, flashcards) for each section
+        concurrently and merge them without near-duplicates.
+        
+        Returns:
+            (items, prompt tokens, completion tokens)
+        """
+        import json
+        
+        async def generate(section: str, count: int):
+            response = await self.llm.chat(
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt(section, count)}
+                ],
+                temperature=temperature,
+                response_format={"type": "json_object"}
+            )
+            items = json.loads(response.choices[0].message.content).get(field, [])
+            usage = response.usage
+            return (
+                items if isinstance(items, list) else [],
+                usage.prompt_tokens if usage else 0,
+                usage.completion_tokens if usage else 0
+            )
+        
+        outcomes = await self.fan_out.generate(sections, generate, concurrency)
+        items = await self.fan_out.merge([outcome[0] for outcome in outcomes], key, self.query_batcher.embed, num_items)
+        return items, sum(outcome[1] for outcome in outcomes), sum(outcome[2] for outcome in outcomes)
+    
+    async def build_bank(self, document_id: str, texts: List[str]):
+        """
+        Pre-generate the bank of quiz questions and flashcards for a
+        document's chunks (in order), replacing any bank it already has.
+        
+        Generation takes a while; if the document is deleted meanwhile, its
+        items are dropped rather than served for a document that is gone.
+        """
+        sections = self.fan_out.pack(texts, self.context_builder.counter.count_many(texts))
+        self.generation_bank.delete_document(document_id)
+        for kind, per_section, generation in (
+            (BANK_QUESTION_TYPE, self.generation_bank.questions_per_section, self._quiz_generation(BANK_QUESTION_TYPE, None)),
+            (CARD, self.generation_bank.cards_per_section, self._flashcard_generation())
+        ):
+            items, _, _ = await self._generate_items(
+                [(section, per_section) for section in sections],
+                per_section * len(sections),
+                concurrency=self.generation_bank.concurrency,
+                **generation
+            )
+            if items:
+                # Stored with the embedding of the question or card front, for topic matching
+                embeddings = await asyncio.gather(*(self.query_batcher.embed(generation["key"](item)) for item in items))
+                self.generation_bank.add(document_id, kind, items, np.vstack(embeddings))
+            # Deleting a document removes its chunks before its bank items, so
+            # this also catches a delete that ran before the add
+            if not self.vector_store.chunk_store.has_document(document_id):
+                self.generation_bank.delete_document(document_id)
+                print(f"Document {document_id} deleted while its generation bank was built")
+                return
+        print(f"Generation bank built for document {document_id} ({len(sections)} sections)")
+    
+    async def _from_bank(
+        self,
+        kind: str,
+        num_items: int,
+        document_ids: Optional[List[str]],
+        topic: Optional[str]
+    ) -> List[dict]:
+        """Banked items for a request, or none when the bank is disabled."""
+        if not self.generation_bank.enabled:
+            return []
+        topic_embedding = await self.query_batcher.embed(topic) if topic else None
+        return self.generation_bank.select(kind, num_items, document_ids, topic_embedding)
+    
+    async def generate_quiz(
         self,
         topic: Optional[str],
         num_questions: int,
@@ -209,180 +529,133 @@ Answer:"""
     ) -> dict:
         """Generate quiz questions from documents."""
         # Check if vector store has any data
-        if self.vector_store.index is None or self.vector_store.index.ntotal == 0:
+        if self.vector_store.count() == 0:
             return {
                 "questions": [], 
                 "topic": topic or "general",
                 "error": "No documents uploaded yet. Please upload documents first."
             }
         
+        # Served from the bank when it holds enough questions on the topic;
+        # otherwise only the rest is generated live
+        banked = await self._from_bank(question_type, num_questions, document_ids, topic) if question_type == BANK_QUESTION_TYPE else []
+        if len(banked) >= num_questions:
+            return {"questions": banked, "topic": topic or "general", "usage": self._usage(0, 0, 0)}
+        num_live = num_questions - len(banked)
+        
         if topic:
-            # Search for relevant chunks about the topic - use more specific query
+            # Search for relevant chunks about the topic - use more specific query,
+            # fused with a keyword search for the topic itself
             topic_query = f"about {topic} concepts definitions examples"
-            query_embedding = self.embedding_service.embed_text(topic_query)
-            results = self.vector_store.search(query_embedding, k=top_k * 2)  # Get more results to filter better
-            
-            # Filter results to only include those with high relevance to the topic
-            # Re-rank by checking if topic keywords appear in the text
-            topic_lower = topic.lower()
-            filtered_results = []
-            for r in results:
-                text_lower = r['text'].lower()
-                # Boost score if topic appears in text
-                if topic_lower in text_lower:
-                    r['score'] = min(1.0, r['score'] * 1.5)
-                filtered_results.append(r)
-            
-            # Sort by score and take top_k
-            results = sorted(filtered_results, key=lambda x: x['score'], reverse=True)[:top_k]
+            results, _ = await self.query_batcher.search(
+                topic_query,
+                k=self.fan_out.chunks_for(num_live, top_k),
+                document_ids=document_ids,
+                lexical_query=topic if HYBRID_SEARCH else None
+            )
         else:
             # Get random chunks
-            results = self.vector_store.search(
-                self.embedding_service.embed_text("study material"),
-                k=top_k
+            results, _ = await self.query_batcher.search(
+                "study material",
+                k=self.fan_out.chunks_for(num_live, top_k),
+                document_ids=document_ids
             )
         
-        if document_ids:
-            results = [r for r in results if r['document_id'] in document_ids]
-        
         if not results:
+            if banked:
+                return {"questions": banked, "topic": topic or "general", "usage": self._usage(0, 0, 0)}
             return {
                 "questions": [], 
                 "topic": topic or "general",
                 "error": "No relevant content found. Try uploading more documents or using a different topic."
             }
         
-        context = "\n\n".join([r['text'] for r in results[:10]])  # Use more context
-        
-        topic_specific = f" focused specifically on {topic}" if topic else ""
-        prompt = f"""Generate {num_questions} {question_type} questions{topic_specific} based EXCLUSIVELY on the following study material.
-
-Study Material:
-{context}
-
-Generate questions that test understanding, not just memorization. For multiple choice questions, provide 4 options and indicate the correct answer.
-
-Format your response as JSON with this structure:
-{{
-  "questions": [
-    {{
-      "question": "Question text",
-      "options": ["Option A", "Option B", "Option C", "Option D"],
-      "correct_answer": 0,
-      "explanation": "Why this answer is correct"
-    }}
-  ]
-}}"""
+        # As many of the best chunks as fit the budget, in sections generated concurrently
+        chunks = self.context_builder.build(results, max_tokens=self.fan_out.material_tokens)
+        sections = self._chunk_sections(chunks, num_live)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "You are a quiz generator for study materials."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.8,
-                response_format={"type": "json_object"}
-            )
-            
-            import json
-            quiz_data = json.loads(response.choices[0].message.content)
-            quiz_data["topic"] = topic or "general"
-            return quiz_data
+            generation = self._quiz_generation(question_type, topic)
+            questions, prompt_tokens, completion_tokens = await self._generate_items(sections, num_live, **generation)
+            if banked:
+                questions = await self.fan_out.merge([banked, questions], generation["key"], self.query_batcher.embed, num_questions)
+            return {
+                "questions": questions,
+                "topic": topic or "general",
+                "usage": self._usage(prompt_tokens, completion_tokens, chunks.tokens)
+            }
         except Exception as e:
             import traceback
-            error_msg = str(e)
-            if "api_key" in error_msg.lower() or "authentication" in error_msg.lower():
-                error_msg = "Invalid OpenAI API key. Please check your .env file."
-            elif "rate limit" in error_msg.lower():
-                error_msg = "OpenAI API rate limit exceeded. Please try again later."
-            elif "insufficient_quota" in error_msg.lower():
-                error_msg = "OpenAI API quota exceeded. Please check your account billing."
+            error_msg = self._friendly_error(e)
             
             print(f"Error in generate_quiz: {error_msg}")
             print(traceback.format_exc())
             
-            return {"questions": [], "topic": topic or "general", "error": error_msg}
+            # Banked questions already picked are still good
+            return {"questions": banked, "topic": topic or "general", "error": error_msg, "usage": self._usage(0, 0, 0)}
     
-    def generate_flashcards(
+    async def generate_flashcards(
         self,
         text: Optional[str],
         num_cards: int,
         document_ids: Optional[List[str]] = None
     ) -> dict:
         """Generate flashcards from text or documents."""
+        banked = []
         if text:
-            context = text
+            # Pasted text is cut to the same budget as retrieved chunks
+            text = self.context_builder.truncate(text, self.fan_out.material_tokens)
+            pieces = self.fan_out.split_text(text)
+            counts = self.context_builder.counter.count_many(pieces)
+            sections = self.fan_out.plan(pieces, counts, num_cards)
+            context_tokens = sum(counts)
+            num_live = num_cards
         else:
             # Check if vector store has any data
-            if self.vector_store.index is None or self.vector_store.index.ntotal == 0:
+            if self.vector_store.count() == 0:
                 return {
                     "cards": [],
                     "error": "No documents uploaded yet. Please upload documents first or provide custom text."
                 }
             
+            # Served from the bank when it holds enough cards; otherwise
+            # only the rest is generated live
+            banked = await self._from_bank(CARD, num_cards, document_ids, None)
+            if len(banked) >= num_cards:
+                return {"cards": banked, "usage": self._usage(0, 0, 0)}
+            num_live = num_cards - len(banked)
+            
             # Get chunks from documents
-            results = self.vector_store.search(
-                self.embedding_service.embed_text("key concepts"),
-                k=10
+            results, _ = await self.query_batcher.search(
+                "key concepts",
+                k=self.fan_out.chunks_for(num_live, 10),
+                document_ids=document_ids
             )
-            if document_ids:
-                results = [r for r in results if r['document_id'] in document_ids]
             
             if not results:
+                if banked:
+                    return {"cards": banked, "usage": self._usage(0, 0, 0)}
                 return {
                     "cards": [],
                     "error": "No content found. Please upload documents first or provide custom text."
                 }
             
-            context = "\n\n".join([r['text'] for r in results])
-        
-        prompt = f"""Create {num_cards} flashcards from the following study material. Each flashcard should have:
-- A clear question on the front
-- A concise answer on the back
-- A difficulty level (easy, medium, hard)
-- An importance score (0.0 to 1.0)
-
-Study Material:
-{context}
-
-Format as JSON:
-{{
-  "cards": [
-    {{
-      "front": "Question",
-      "back": "Answer",
-      "difficulty": "medium",
-      "importance": 0.8
-    }}
-  ]
-}}"""
+            chunks = self.context_builder.build(results, max_tokens=self.fan_out.material_tokens)
+            sections = self._chunk_sections(chunks, num_live)
+            context_tokens = chunks.tokens
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "You are a flashcard generator."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                response_format={"type": "json_object"}
-            )
-            
-            import json
-            return json.loads(response.choices[0].message.content)
+            generation = self._flashcard_generation()
+            cards, prompt_tokens, completion_tokens = await self._generate_items(sections, num_live, **generation)
+            if banked:
+                cards = await self.fan_out.merge([banked, cards], generation["key"], self.query_batcher.embed, num_cards)
+            return {"cards": cards, "usage": self._usage(prompt_tokens, completion_tokens, context_tokens)}
         except Exception as e:
             import traceback
-            error_msg = str(e)
-            if "api_key" in error_msg.lower() or "authentication" in error_msg.lower():
-                error_msg = "Invalid OpenAI API key. Please check your .env file."
-            elif "rate limit" in error_msg.lower():
-                error_msg = "OpenAI API rate limit exceeded. Please try again later."
-            elif "insufficient_quota" in error_msg.lower():
-                error_msg = "OpenAI API quota exceeded. Please check your account billing."
+            error_msg = self._friendly_error(e)
             
             print(f"Error in generate_flashcards: {error_msg}")
             print(traceback.format_exc())
             
-            return {"cards": [], "error": error_msg}
-
+            # Banked cards already picked are still good
+            return {"cards": banked, "error": error_msg, "usage": self._usage(0, 0, 0)}
@@ -2,8 +2,69 @@ import faiss
 import numpy as np
 import pickle
 import os
-from typing import List, Tuple
+import threading
+from typing import List, Optional, Sequence, Set, Tuple, Union
 from pathlib import Path
+from app.services.chunk_store import ChunkStore
+from app.services.index_factory import (
+    build_id_index, configured_index_type, inner_index, is_inner_product, normalized, prepare_index, search_parameters
+)
+from app.services.index_log import IndexLog, Manifest, OP_ADD, OP_DELETE
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+
+# Document-scoped searches over at most this many vectors are scored exactly
+# over just those vectors; larger scopes use a FAISS IDSelector instead
+SUBSET_SCAN_MAX = int(os.getenv("VECTOR_SUBSET_SCAN_MAX", "50000"))
+
+# Rebuild the index once this fraction of its vectors belongs to deleted chunks
+COMPACT_TOMBSTONE_RATIO = float(os.getenv("VECTOR_COMPACT_TOMBSTONE_RATIO", "0.2"))
+
+# Write a new snapshot once the append log since the last one is this large
+SNAPSHOT_WAL_BYTES = int(float(os.getenv("VECTOR_SNAPSHOT_WAL_MB", "64")) * 1024 * 1024)
+
+class _IndexState:
+    """
+    One consistent version of the FAISS index.
+    
+    A state is swapped in as a unit on reload or compaction, so searches
+    never see a half-loaded index. Chunk metadata lives in the ChunkStore.
+    """
+    
+    def __init__(self, index: Optional[faiss.Index] = None, tombstones: Optional[Set[int]] = None, lsn: int = 0):
+        self.index = index
+        # chunk ids of deleted chunks still present in the FAISS index
+        self.tombstones = tombstones if tombstones is not None else set()
+        # Position in the append log up to which changes are applied
+        self.lsn = lsn
+        self._tombstone_selector = None
+    
+    def add_tombstones(self, chunk_ids: List[int]):
+        """Mark chunks as deleted."""
+        self.tombstones.update(chunk_ids)
+        self._tombstone_selector = None
+    
+    def tombstone_selector(self) -> Optional[faiss.IDSelector]:
+        """Selector that excludes deleted chunks, or None if there are none."""
+        if not self.tombstones:
+            return None
+        if self._tombstone_selector is None:
+            deleted = faiss.IDSelectorBatch(np.fromiter(self.tombstones, dtype='int64'))
+            selector = faiss.IDSelectorNot(deleted)
+            # Keep the wrapped selector alive as long as the outer one
+            selector.referenced_objects = [deleted]
+            self._tombstone_selector = selector
+        return self._tombstone_selector
+
+class _LoggedAdd:
+    """Chunks stored and logged by VectorStore.log_add, not yet in the in-memory index."""
+    
+    def __init__(self, ids: np.ndarray, embeddings: np.ndarray, texts: List[str], start: int, lsn: int):
+        self.ids = ids
+        self.embeddings = embeddings
+        self.texts = texts
+        # Log positions of the start of the record and just past it
+        self.start = start
+        self.lsn = lsn
 
 class VectorStore:
     def __init__(self, store_path: str = None):
@@ -12,10 +73,29 @@ class VectorStore:
             project_root = Path(__file__).parent.parent.parent.parent
             store_path = str(project_root / "vector_store" / "faiss_index")
         self.store_path = store_path
-        self.index = None
-        self.metadata = []  # Store (document_id, chunk_index, text) tuples
-        self.dimension = None
         self._ensure_directory()
+        self.chunk_store = ChunkStore(f"{store_path}.chunks.db")
+        # BM25 postings of the same chunks, for hybrid search
+        self.lexical = LexicalIndex(f"{store_path}.bm25.db")
+        # Snapshots and append log; its lock serializes changes to the index
+        # (adds, deletes, snapshots, compaction swaps) across workers
+        self.log = IndexLog(store_path)
+        self._state = _IndexState()
+        self.dimension = None
+        self.index_type = configured_index_type()
+        # Log signature this state was last brought up to date with
+        self._signature = None
+        self._reload_lock = threading.Lock()
+        # Held while the in-memory index is searched or changed. Changes run
+        # in threads under the log lock too; searches take only this one, so
+        # they never wait on the log's file I/O.
+        self._state_lock = threading.RLock()
+        self._compacting = False
+        self._snapshotting = False
+    
+    @property
+    def index(self):
+        return self._state.index
     
     def _ensure_directory(self):
         """Ensure the vector store directory exists."""
@@ -24,72 +104,726 @@ class VectorStore:
     def initialize(self, dimension: int):
         """Initialize FAISS index with given dimension."""
         self.dimension = dimension
-        # Use L2 distance (Euclidean)
-        self.index = faiss.IndexFlatL2(dimension)
+        # Inner product over normalized vectors (cosine). Types that need
+        # training start out flat until the index is rebuilt (see
+        # migrate_vector_index.py).
+        with self.log.lock():
+            self._state = _IndexState(build_id_index(dimension, self.index_type), lsn=self._state.lsn)
+    
+    @staticmethod
+    def _all_vectors(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+        """(chunk ids, vectors) of everything in an id-mapped index."""
+        if index is None or index.ntotal == 0:
+            return np.zeros(0, dtype='int64'), np.zeros((0, index.d if index else 0), dtype='float32')
+        ids = faiss.vector_to_array(index.id_map).astype('int64')
+        vectors = inner_index(index).reconstruct_n(0, index.ntotal)
+        return ids, vectors
+    
+    def get_all_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(chunk ids, vectors) of all live chunks (vectors approximate for ivf_pq)."""
+        state = self._state
+        ids, vectors = self._all_vectors(state.index)
+        if state.tombstones:
+            live = ~np.isin(ids, np.fromiter(state.tombstones, dtype='int64'))
+            ids, vectors = ids[live], vectors[live]
+        return ids, vectors
     
-    def add_embeddings(self, embeddings: np.ndarray, metadata: List[Tuple[str, int, str]]):
+    def _build_from(self, ids: np.ndarray, vectors: np.ndarray, index_type: str) -> faiss.Index:
+        """Build a new id-mapped index holding the given vectors."""
+        dimension = self.dimension or vectors.shape[1]
+        # Also converts vectors from an L2 index built before cosine scoring
+        vectors = normalized(vectors)
+        index = build_id_index(dimension, index_type, training_vectors=vectors)
+        if len(ids):
+            index.add_with_ids(np.ascontiguousarray(vectors, dtype='float32'), ids)
+        return index
+    
+    def rebuild(self, index_type: Optional[str] = None):
+        """
+        Rebuild the index as another type, training it on the stored vectors,
+        and write it as a new snapshot.
+        
+        Deleted chunks are dropped. Chunk ids and metadata are unchanged.
+        An L2 index from before cosine scoring becomes an inner-product index
+        over normalized vectors.
+        Other workers' writes wait until the new index is swapped in, not
+        for the snapshot to be written.
+        """
+        index_type = index_type or self.index_type
+        with self.log.lock():
+            self._catch_up()
+            state = self._state
+            ids, vectors = self.get_all_vectors()
+            new_index = self._build_from(ids, vectors, index_type)
+            self._state = _IndexState(new_index, lsn=state.lsn)
+            self.index_type = index_type
+            snapshot = self._snapshot_data()
+        if snapshot is not None:
+            self.log.write_snapshot(*snapshot)
+        # Only once the snapshot no longer holds their vectors
+        self.chunk_store.purge(state.tombstones)
+    
+    def add_embeddings(self, embeddings: np.ndarray, metadata: List[tuple]):
         """
         Add embeddings to the index.
         
+        Runs log_add, apply_add and index_text in turn. Writes to disk and
+        waits for the log lock, so async callers should run it in a thread.
+        
         Args:
             embeddings: numpy array of shape (n, dimension)
-            metadata: List of (document_id, chunk_index, text) tuples
+            metadata: List of (document_id, chunk_index, text[, page]) tuples
+        """
+        add = self.log_add(embeddings, metadata)
+        self.apply_add(add)
+        self.index_text(add)
+    
+    def _log_end(self, manifest: Manifest) -> int:
+        """
+        End of the last complete record in the log, cutting off a record left
+        incomplete by a crash so the next append starts on a record boundary.
+        Call with the log lock held.
+        """
+        end = max(self._state.lsn, manifest.lsn)
+        for _, _, _, lsn in self.log.replay(manifest, end):
+            end = lsn
+        if end < self.log.wal_end(manifest):
+            print(f"Discarding incomplete vector log record at {end}")
+            self.log.truncate(manifest, end)
+        return end
+    
+    def log_add(self, embeddings: np.ndarray, metadata: List[tuple]) -> _LoggedAdd:
+        """
+        Store chunk rows and append their vectors to the log, making the add
+        durable. Touches no in-memory index state, so it can run in a thread.
+        """
+        # Rows first, so concurrent searches never see an id without metadata
+        ids = self.chunk_store.add(metadata)
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        with self.log.lock():
+            # Logged on top of everything other workers have written
+            manifest = self.log.read_manifest()
+            start = self._log_end(manifest)
+            lsn = self.log.append(manifest, OP_ADD, ids, embeddings)
+        return _LoggedAdd(ids, embeddings, [item[2] for item in metadata], start, lsn)
+    
+    def apply_add(self, add: _LoggedAdd):
+        """
+        Add logged vectors to the in-memory index, where searches see them.
+        Waits for the log lock, so async callers should run it in a thread.
         """
         if self.index is None:
-            self.initialize(embeddings.shape[1])
+            self.initialize(add.embeddings.shape[1])
+        with self.log.lock():
+            if self._state.lsn == add.start:
+                self._apply(self._state, OP_ADD, add.ids, add.embeddings)
+                self._state.lsn = add.lsn
+            else:
+                # Other changes were logged first (or already replayed this
+                # one); catching up applies each record once, in log order
+                self._catch_up()
+    
+    def index_text(self, add: _LoggedAdd):
+        """Add logged chunks to the BM25 index. Safe to run in a thread."""
+        # After the vectors, so every lexical hit can be scored against the index
+        self.lexical.add(add.ids, add.texts)
+    
+    def delete_document(self, document_id: str) -> int:
+        """
+        Delete a document's chunks.
         
-        self.index.add(embeddings.astype('float32'))
-        self.metadata.extend(metadata)
+        The chunks are tombstoned: they disappear from search results at once
+        and are physically removed by the next compaction. Writes to the log,
+        so async callers should run it in a thread.
+        
+        Returns:
+            Number of chunks deleted
+        """
+        chunk_ids = self.chunk_store.delete_document(document_id)
+        if chunk_ids:
+            with self.log.lock():
+                manifest = self._catch_up()
+                lsn = self.log.append(manifest, OP_DELETE, np.asarray(chunk_ids, dtype='int64'))
+                with self._state_lock:
+                    self._state.add_tombstones(chunk_ids)
+                self._state.lsn = lsn
+            self.lexical.delete(chunk_ids)
+        return len(chunk_ids)
+    
+    def tombstone_ratio(self) -> float:
+        """Fraction of indexed vectors that belong to deleted chunks."""
+        state = self._state
+        if state.index is None or state.index.ntotal == 0:
+            return 0.0
+        return len(state.tombstones) / state.index.ntotal
     
-    def search(self, query_embedding: np.ndarray, k: int = 5) -> List[dict]:
+    def compact(self):
         """
-        Search for similar chunks.
+        Rebuild the index without deleted chunks and write it as a snapshot.
+        
+        The new index is built from a copy of the live vectors while searches
+        and adds continue on the current one. Changes logged in the meantime
+        are replayed onto it before it is swapped in.
+        """
+        # Runs off the request thread, so the live index is only read here;
+        # whatever it has not applied yet is replayed onto the new one below
+        with self.log.lock():
+            state = self._state
+            if state.index is None or not state.tombstones:
+                return
+            captured_ids, vectors = self._all_vectors(state.index)
+            dropped = set(state.tombstones)
+            lsn = state.lsn
+        
+        live = ~np.isin(captured_ids, np.fromiter(dropped, dtype='int64'))
+        new_state = _IndexState(self._build_from(captured_ids[live], vectors[live], self.index_type), lsn=lsn)
+        
+        with self.log.lock():
+            manifest = self.log.read_manifest()
+            if lsn < manifest.lsn:
+                # Another worker wrote a snapshot meanwhile; the log no longer
+                # reaches back to the copy, so leave compaction to the next run
+                return
+            self._replay(new_state, manifest)
+            self._state = new_state
+            snapshot = self._snapshot_data()
+        if snapshot is not None:
+            self.log.write_snapshot(*snapshot)
+        
+        # Only once the snapshot no longer holds their vectors
+        self.chunk_store.purge(dropped)
+    
+    def maybe_compact(self) -> bool:
+        """
+        Start a background compaction if enough of the index is deleted.
+        
+        Returns:
+            True if a compaction was started
+        """
+        if self._compacting or self.tombstone_ratio() < COMPACT_TOMBSTONE_RATIO:
+            return False
+        self._compacting = True
+        
+        def run():
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Error compacting vector store: {e}")
+            finally:
+                self._compacting = False
+        
+        threading.Thread(target=run, name="vector-compaction", daemon=True).start()
+        return True
+    
+    def maybe_snapshot(self) -> bool:
+        """
+        Start a background snapshot if the append log has grown large.
+        
+        Returns:
+            True if a snapshot was started
+        """
+        manifest = self.log.read_manifest()
+        if self._snapshotting or manifest is None or self.log.wal_bytes(manifest) < SNAPSHOT_WAL_BYTES:
+            return False
+        self._snapshotting = True
+        
+        def run():
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Error writing vector store snapshot: {e}")
+            finally:
+                self._snapshotting = False
+        
+        threading.Thread(target=run, name="vector-snapshot", daemon=True).start()
+        return True
+    
+    def count(self) -> int:
+        """Number of live (not deleted) chunks in the index."""
+        state = self._state
+        if state.index is None:
+            return 0
+        return state.index.ntotal - len(state.tombstones)
+    
+    def has_document(self, document_id: str) -> bool:
+        """Whether the document has live chunks whose vectors are in the index."""
+        ids = self.chunk_store.document_chunk_ids([document_id])
+        index = self.index
+        if len(ids) == 0 or index is None:
+            return False
+        with self._state_lock:
+            indexed = faiss.vector_to_array(index.id_map)
+        return bool(np.isin(ids, indexed).all())
+    
+    def _search_subset(self, index, queries: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact top-k restricted to the given chunk ids, for a matrix of queries.
+        Returns (scores, ids) ordered as FAISS would for the index's metric.
+        
+        Small scopes are scored directly over just their vectors, so the cost
+        follows the size of the scope rather than the corpus. Larger scopes
+        let FAISS skip everything outside the scope with an IDSelector.
+        """
+        if len(ids) <= SUBSET_SCAN_MAX:
+            try:
+                vectors = index.reconstruct_batch(ids)
+            except RuntimeError:
+                vectors = None
+            if vectors is not None:
+                # Scores for every (query, vector) pair at once, lower is closer
+                if is_inner_product(index):
+                    distances = -(queries @ vectors.T)
+                else:
+                    distances = (
+                        (queries ** 2).sum(axis=1, keepdims=True)
+                        - 2 * queries @ vectors.T
+                        + (vectors ** 2).sum(axis=1)
+                    )
+                    np.maximum(distances, 0, out=distances)
+                k = min(k, len(ids))
+                top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                top_distances = np.take_along_axis(distances, top, axis=1)
+                order = np.argsort(top_distances, axis=1)
+                top = np.take_along_axis(top, order, axis=1)
+                top_distances = np.take_along_axis(top_distances, order, axis=1)
+                if is_inner_product(index):
+                    top_distances = -top_distances
+                return top_distances, ids[top]
+        
+        selector = faiss.IDSelectorBatch(ids)
+        return index.search(queries, k, params=search_parameters(index, selector))
+    
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 5,
+        document_ids: Optional[List[str]] = None,
+        min_score: Optional[float] = None,
+        lexical_query: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Search for similar chunks. Deleted chunks are never returned.
+        
+        Args:
+            query_embedding: Query vector
+            k: Number of results
+            document_ids: Optional list of document IDs to restrict the search to.
+                The top-k is exact within these documents.
+            min_score: Optional cosine similarity below which results are
+                dropped (ignored by L2 indexes that predate cosine scoring)
+            lexical_query: Optional text to also rank chunks by with BM25. The
+                two rankings are combined by reciprocal-rank fusion; keyword
+                hits are held to min_score like vector hits.
+        
+        Returns:
+            List of dicts with 'chunk_id', 'text', 'document_id', 'chunk_index',
+            'page', 'distance' and 'score' (cosine similarity, -1 to 1), plus
+            'rrf_score' if lexical_query was given, in ranked order
+        """
+        return self.search_batch(query_embedding.reshape(1, -1), k, [document_ids], [min_score], [lexical_query])[0]
+    
+    def search_batch(
+        self,
+        queries: np.ndarray,
+        k: Union[int, Sequence[int]] = 5,
+        filters: Optional[Sequence[Optional[List[str]]]] = None,
+        min_scores: Optional[Sequence[Optional[float]]] = None,
+        lexical_queries: Optional[Sequence[Optional[str]]] = None
+    ) -> List[List[dict]]:
+        """
+        Search for several queries at once.
+        
+        Queries sharing a filter are answered by a single FAISS call on the
+        query matrix, and the metadata of all hits is fetched in one lookup.
+        
+        Args:
+            queries: Query vectors of shape (n, dimension)
+            k: Number of results, for all queries or per query. Each query is
+                ranked and fused at its own k, so its results do not depend
+                on the other queries in the batch.
+            filters: Optional document IDs to restrict each query to (None
+                or an empty list searches everything)
+            min_scores: Optional relevance cutoff for each query, as in search()
+            lexical_queries: Optional BM25 query text for each query, as in search()
         
         Returns:
-            List of dicts with 'text', 'document_id', 'chunk_index', 'distance'
-        """
-        if self.index is None or self.index.ntotal == 0:
-            return []
-        
-        query_embedding = query_embedding.reshape(1, -1).astype('float32')
-        distances, indices = self.index.search(query_embedding, k)
-        
-        results = []
-        for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-            if idx < len(self.metadata):
-                doc_id, chunk_idx, text = self.metadata[idx]
-                results.append({
-                    'text': text,
-                    'document_id': doc_id,
-                    'chunk_index': chunk_idx,
-                    'distance': float(distance),
-                    'score': 1 / (1 + distance)  # Convert distance to similarity
-                })
+            One list of results per query, as returned by search()
+        """
+        with self._state_lock:
+            return self._search_batch(queries, k, filters, min_scores, lexical_queries)
+    
+    def _search_batch(
+        self,
+        queries: np.ndarray,
+        k: Union[int, Sequence[int]],
+        filters: Optional[Sequence[Optional[List[str]]]],
+        min_scores: Optional[Sequence[Optional[float]]],
+        lexical_queries: Optional[Sequence[Optional[str]]]
+    ) -> List[List[dict]]:
+        """search_batch() with the state lock held."""
+        queries = np.ascontiguousarray(queries, dtype='float32').reshape(len(queries), -1)
+        n = len(queries)
+        state = self._state
+        index = state.index
+        if n == 0 or index is None or index.ntotal == 0:
+            return [[] for _ in range(n)]
+        
+        ks = [k] * n if isinstance(k, int) else [int(value) for value in k]
+        # FAISS is asked for the largest k; each query is then cut to its own
+        k = max(ks)
+        cosine = is_inner_product(index)
+        if cosine:
+            queries = normalized(queries)
+        cutoffs = None
+        if cosine and min_scores is not None:
+            cutoffs = np.array([-np.inf if m is None else m for m in min_scores], dtype='float32')
+        
+        # Group queries by filter, so each group is one FAISS call
+        groups = {}
+        keys = []
+        for i, document_ids in enumerate(filters if filters is not None else [None] * n):
+            key = tuple(sorted(set(document_ids))) if document_ids else None
+            groups.setdefault(key, []).append(i)
+            keys.append(key)
+        
+        distances = np.full((n, k), -np.inf if cosine else np.inf, dtype='float32')
+        indices = np.full((n, k), -1, dtype='int64')
+        scopes = {None: None}
+        for key, rows in groups.items():
+            group = queries[rows]
+            if key is not None:
+                # Only live chunks are returned by the chunk store
+                ids = self.chunk_store.document_chunk_ids(list(key))
+                scopes[key] = ids
+                if len(ids) == 0:
+                    continue
+                group_distances, group_indices = self._search_subset(index, group, ids, k)
+            else:
+                selector = state.tombstone_selector()
+                if selector is None:
+                    group_distances, group_indices = index.search(group, k)
+                else:
+                    group_distances, group_indices = index.search(group, k, params=search_parameters(index, selector))
+            width = group_indices.shape[1]
+            distances[rows, :width] = group_distances
+            indices[rows, :width] = group_indices
+        
+        if cosine:
+            scores = distances
+            distances = 1 - scores
+        else:
+            scores = 1 / (1 + distances)  # Convert distance to similarity
+        
+        # Fetch only the rows being returned; rows deleted by another worker are skipped
+        hit_ids = np.unique(indices[indices >= 0])
+        metadata = self.chunk_store.get(hit_ids.tolist())
+        live = np.isin(indices, np.fromiter(metadata.keys(), dtype='int64', count=len(metadata)))
+        if cutoffs is not None:
+            live &= scores >= cutoffs[:, None]
+        
+        results = [[] for _ in range(n)]
+        rows, cols = np.nonzero(live)
+        for row, idx, distance, score in zip(
+            rows.tolist(), indices[rows, cols].tolist(), distances[rows, cols].tolist(), scores[rows, cols].tolist()
+        ):
+            doc_id, chunk_idx, text, page = metadata[idx]
+            results[row].append({
+                'chunk_id': idx,
+                'text': text,
+                'document_id': doc_id,
+                'chunk_index': chunk_idx,
+                'page': page,
+                'distance': distance,
+                'score': score
+            })
+        
+        for i in range(n):
+            results[i] = results[i][:ks[i]]
+            if lexical_queries is not None and lexical_queries[i]:
+                cutoff = None if cutoffs is None else float(cutoffs[i])
+                results[i] = self._fuse(index, queries[i], results[i], lexical_queries[i], ks[i], scopes[keys[i]], cutoff)
+        return results
+    
+    def _fuse(
+        self,
+        index: faiss.Index,
+        query: np.ndarray,
+        vector_results: List[dict],
+        text: str,
+        k: int,
+        scope: Optional[np.ndarray],
+        min_score: Optional[float] = None
+    ) -> List[dict]:
+        """
+        Combine vector results with the BM25 top-k for text by reciprocal-rank
+        fusion. Keyword hits scoring below min_score against the query vector
+        are left out before fusing, as vector hits are.
+        """
+        if scope is not None and len(scope) == 0:
+            return vector_results
+        lexical_ids, _ = self.lexical.search(text, k, scope)
+        
+        by_id = {r['chunk_id']: r for r in vector_results}
+        missing = [chunk_id for chunk_id in lexical_ids.tolist() if chunk_id not in by_id]
+        if missing:
+            by_id.update(self._score_chunks(index, query, np.asarray(missing, dtype='int64')))
+        lexical_ranking = [
+            chunk_id for chunk_id in lexical_ids.tolist()
+            if chunk_id in by_id and (min_score is None or by_id[chunk_id]['score'] >= min_score)
+        ]
+        fused = reciprocal_rank_fusion([[r['chunk_id'] for r in vector_results], lexical_ranking])[:k]
+        return [dict(by_id[chunk_id], rrf_score=score) for chunk_id, score in fused]
+    
+    def _score_chunks(self, index: faiss.Index, query: np.ndarray, ids: np.ndarray) -> dict:
+        """Results for specific chunks, scored against query as search() would."""
+        metadata = self.chunk_store.get(ids.tolist())
+        ids = np.array([i for i in ids.tolist() if i in metadata], dtype='int64')
+        if len(ids) == 0:
+            return {}
+        try:
+            vectors = index.reconstruct_batch(ids)
+        except RuntimeError:
+            # Chunks another worker indexed after this process last caught up
+            ids = ids[np.isin(ids, faiss.vector_to_array(index.id_map))]
+            if len(ids) == 0:
+                return {}
+            vectors = index.reconstruct_batch(ids)
+        if is_inner_product(index):
+            scores = vectors @ query
+            distances = 1 - scores
+        else:
+            distances = ((vectors - query) ** 2).sum(axis=1)
+            scores = 1 / (1 + distances)
         
+        results = {}
+        for idx, distance, score in zip(ids.tolist(), distances.tolist(), scores.tolist()):
+            doc_id, chunk_idx, text, page = metadata[idx]
+            results[idx] = {
+                'chunk_id': idx,
+                'text': text,
+                'document_id': doc_id,
+                'chunk_index': chunk_idx,
+                'page': page,
+                'distance': distance,
+                'score': score
+            }
         return results
     
     def save(self):
-        """Save index and metadata to disk."""
-        if self.index is None:
-            return
+        """
+        Write the index as a new snapshot and start a fresh append log.
+        
+        Adds and deletes are already durable once logged, so this only bounds
+        the log replayed on startup. The index is serialized under the lock
+        and written to disk outside it.
+        """
+        with self.log.lock():
+            snapshot = self._snapshot_data()
+        if snapshot is not None:
+            self.log.write_snapshot(*snapshot)
+    
+    def _snapshot_data(self) -> Optional[Tuple[np.ndarray, int]]:
+        """
+        The serialized index and the log position it covers, or None if there
+        is nothing newer than the current snapshot. Call with the log lock held.
+        """
+        state = self._state
+        manifest = self.log.read_manifest()
+        # Behind a snapshot another worker wrote: nothing newer to save
+        if state.index is None or manifest is None or state.lsn < manifest.lsn:
+            return None
+        return faiss.serialize_index(state.index), state.lsn
+    
+    def _apply(self, state: _IndexState, op: int, ids: np.ndarray, vectors: Optional[np.ndarray]):
+        """Apply one log record to a state."""
+        if op == OP_ADD:
+            # The log holds vectors as embedded; cosine indexes store them normalized
+            if is_inner_product(state.index):
+                vectors = normalized(vectors)
+            with self._state_lock:
+                state.index.add_with_ids(vectors, ids)
+        elif op == OP_DELETE:
+            with self._state_lock:
+                state.add_tombstones(ids.tolist())
+    
+    def _replay(self, state: _IndexState, manifest: Manifest):
+        """
+        Apply log records after state.lsn to state. Call with the log lock held.
         
-        # Save FAISS index
-        faiss.write_index(self.index, f"{self.store_path}.index")
+        A partial record at the end of the log is left by a write that crashed
+        and is cut off, so the next append starts on a record boundary.
+        """
+        for op, ids, vectors, lsn in self.log.replay(manifest, state.lsn):
+            self._apply(state, op, ids, vectors)
+            state.lsn = lsn
+        if state.lsn < self.log.wal_end(manifest):
+            print(f"Discarding incomplete vector log record at {state.lsn}")
+            self.log.truncate(manifest, state.lsn)
+    
+    def _read_state(self, manifest: Manifest) -> _IndexState:
+        """State of the manifest's snapshot, before its log is replayed."""
+        data = self.log.read_snapshot(manifest)
+        if data is None:
+            index = build_id_index(self.dimension, self.index_type)
+        else:
+            index = faiss.deserialize_index(data)
+            prepare_index(index)
+        # Deletes are committed to the chunk store before they are logged
+        return _IndexState(index, set(self.chunk_store.deleted_ids()), lsn=manifest.lsn)
+    
+    def _read_state_unlocked(self, manifest: Manifest) -> _IndexState:
+        """
+        _read_state without holding the log lock, so other workers can keep
+        writing while a large snapshot is read.
         
-        # Save metadata
-        with open(f"{self.store_path}.meta", 'wb') as f:
-            pickle.dump(self.metadata, f)
+        A snapshot another worker writes meanwhile removes the files this
+        manifest names; the newer one is then read under the lock, where the
+        manifest's files cannot be replaced.
+        """
+        try:
+            return self._read_state(manifest)
+        except FileNotFoundError:
+            with self.log.lock():
+                return self._read_state(self.log.read_manifest())
     
-    def load(self, dimension: int):
-        """Load index and metadata from disk."""
+    def _catch_up(self, state: Optional[_IndexState] = None) -> Manifest:
+        """
+        Bring the in-memory index up to the end of the log and swap it in.
+        Call with the log lock held.
+        
+        Only the log tail this process has not seen is replayed. If another
+        worker has written a snapshot past that point, it is loaded instead.
+        
+        Args:
+            state: A freshly read state to use if it is newer than the current one
+        """
+        manifest = self.log.read_manifest()
+        current = self._state
+        if state is None or (current.index is not None and state.lsn <= current.lsn):
+            state = current
+        if state.index is None or state.lsn < manifest.lsn:
+            state = self._read_state(manifest)
+        self._replay(state, manifest)
+        self._state = state
+        return manifest
+    
+    def _import_pickled_metadata(self, index: faiss.Index, meta_path: str) -> faiss.Index:
+        """
+        Move metadata from a pickled .meta file into the chunk store.
+        
+        Lists (the original format) are addressed by position, so positions
+        become the chunk ids and the index is rebuilt with an id map. Dicts
+        are already keyed by chunk id. The .meta file is kept as .meta.migrated.
+        """
+        with open(meta_path, 'rb') as f:
+            saved = pickle.load(f)
+        
+        if isinstance(saved, list):
+            vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), dtype='float32')
+            ids = np.arange(len(vectors), dtype='int64')
+            index = self._build_from(ids, vectors, self.index_type)
+            self.chunk_store.add(saved, ids=ids.tolist())
+        else:
+            self.chunk_store.add(list(saved["metadata"].values()), ids=list(saved["metadata"].keys()))
+            self.chunk_store.add_deleted(saved["tombstones"])
+        
+        os.replace(meta_path, f"{meta_path}.migrated")
+        return index
+    
+    def _create_log(self) -> Manifest:
+        """
+        Start the log for a store that has none. Call with the log lock held.
+        
+        A single .index file from before the append log becomes the first
+        snapshot and is kept as .index.migrated.
+        """
         index_path = f"{self.store_path}.index"
         meta_path = f"{self.store_path}.meta"
+        if not os.path.exists(index_path):
+            return self.log.create()
         
-        if os.path.exists(index_path) and os.path.exists(meta_path):
-            self.index = faiss.read_index(index_path)
-            with open(meta_path, 'rb') as f:
-                self.metadata = pickle.load(f)
-            self.dimension = dimension
-        else:
-            self.initialize(dimension)
-
+        index = faiss.read_index(index_path)
+        # Stores saved before the chunk store kept metadata in a pickle
+        if os.path.exists(meta_path) and self.chunk_store.is_empty():
+            index = self._import_pickled_metadata(index, meta_path)
+        manifest = self.log.write_snapshot(faiss.serialize_index(index), 0)
+        os.replace(index_path, f"{index_path}.migrated")
+        return manifest
+    
+    def load(self, dimension: int):
+        """Load the latest snapshot from disk and replay the log after it."""
+        self.dimension = dimension
+        with self.log.lock():
+            if self.log.read_manifest() is None:
+                self._create_log()
+        
+        signature = self.log.signature()
+        # Read the snapshot outside the lock; only the replay holds it
+        state = self._read_state_unlocked(self.log.read_manifest())
+        with self.log.lock():
+            self._catch_up(state)
+            self._sync_lexical()
+        self._signature = signature
+    
+    def _sync_lexical(self):
+        """
+        Bring the BM25 index in line with the vector index. Call with the log
+        lock held.
+        
+        Indexes chunks it is missing (stores from before it existed, or a
+        crash between the two writes) and drops deleted ones.
+        """
+        state = self._state
+        if state.index is None:
+            return
+        indexed = faiss.vector_to_array(state.index.id_map).astype('int64')
+        if state.tombstones:
+            indexed = indexed[~np.isin(indexed, np.fromiter(state.tombstones, dtype='int64'))]
+        lexical_ids = self.lexical.chunk_ids()
+        self.lexical.delete(np.setdiff1d(lexical_ids, indexed).tolist())
+        
+        missing = np.setdiff1d(indexed, lexical_ids)
+        if len(missing):
+            print(f"Indexing {len(missing)} chunks for keyword search...")
+        for start in range(0, len(missing), 500):
+            rows = self.chunk_store.get(missing[start:start + 500].tolist())
+            self.lexical.add(rows.keys(), [row[2] for row in rows.values()])
+    
+    def reload_if_changed(self, dimension: int) -> bool:
+        """
+        Catch up with changes other processes have logged.
+        
+        A stat of the manifest and log tells whether anything changed. New log
+        records are replayed onto the current index; only a snapshot written
+        past this process's position is read in full, outside the lock, and
+        swapped in so in-flight searches keep using the previous state.
+        
+        Reads from disk and waits for the log lock, so async callers should
+        run it in a thread; searches on the event loop only wait while
+        records are added to the in-memory index.
+        
+        Returns:
+            True if newer changes were applied
+        """
+        signature = self.log.signature()
+        if signature is None or signature == self._signature:
+            return False
+        
+        # Another request is already reloading this version
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self.dimension = self.dimension or dimension
+            manifest = self.log.read_manifest()
+            state = None
+            if self._state.index is None or self._state.lsn < manifest.lsn:
+                state = self._read_state_unlocked(manifest)
+            with self.log.lock():
+                self._catch_up(state)
+            self._signature = signature
+            return True
+        except Exception as e:
+            print(f"Error reloading vector store: {e}")
+            return False
+        finally:
+            self._reload_lock.release()
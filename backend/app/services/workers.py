@@ -0,0 +1,136 @@
+import asyncio
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional, Tuple
+import numpy as np
+from app.services.chunking import Chunker
+from app.services.document_processor import DocumentProcessor
+
+if TYPE_CHECKING:
+    # Parse processes are spawned and import this module; importing the
+    # model stack there would load torch into every one of them
+    from app.services.embeddings import EmbeddingService
+
+def _extract_pages(file_path: str, file_type: str, start: int, stop: int) -> List[Tuple[Optional[int], str]]:
+    """Extract pages [start, stop) of a file (runs in a worker process)."""
+    if file_type == "application/pdf":
+        return list(DocumentProcessor.iter_pdf_pages(file_path, start, stop))
+    return list(DocumentProcessor.iter_pages(file_path, file_type))
+
+class IngestionWorkers:
+    """
+    Worker pools that keep CPU-bound ingestion off the event loop.
+    
+    Parsing runs in a process pool, since PDF extraction holds the GIL.
+    Embedding runs in a thread pool, since torch releases the GIL and the
+    model is already loaded in this process. Each stage admits a bounded
+    number of jobs at a time; further uploads wait for a free slot.
+    
+    Large PDFs are split into page ranges extracted by several processes
+    at once, and handed back in order as they finish.
+    
+    Configuration (environment):
+        INGEST_PARSE_WORKERS: processes for page extraction (default 2)
+        INGEST_PAGES_PER_TASK: PDF pages extracted per process task (default 16)
+        INGEST_EMBED_THREADS: threads for batch embedding (default 1)
+        INGEST_MAX_PENDING: max jobs admitted to each stage at once (default 4)
+    """
+    
+    def __init__(self):
+        self.parse_workers = int(os.getenv("INGEST_PARSE_WORKERS", "2"))
+        self.pages_per_task = int(os.getenv("INGEST_PAGES_PER_TASK", "16"))
+        self.embed_threads = int(os.getenv("INGEST_EMBED_THREADS", "1"))
+        self.max_pending = int(os.getenv("INGEST_MAX_PENDING", "4"))
+        
+        # Spawn rather than fork, so children do not inherit torch's thread state
+        self._parse_pool = ProcessPoolExecutor(
+            max_workers=self.parse_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        self._embed_pool = ThreadPoolExecutor(
+            max_workers=self.embed_threads,
+            thread_name_prefix="embed"
+        )
+        self._parse_slots = asyncio.Semaphore(self.max_pending)
+        self._embed_slots = asyncio.Semaphore(self.max_pending)
+    
+    async def count_pages(self, file_path: str, file_type: str) -> int:
+        """Number of pages in a file, read in the process pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._parse_pool, DocumentProcessor.count_pages, file_path, file_type)
+    
+    async def iter_pages(
+        self,
+        file_path: str,
+        file_type: str,
+        page_count: int
+    ) -> AsyncIterator[List[Tuple[Optional[int], str]]]:
+        """
+        Extract a file's pages in the process pool, yielding them in order,
+        one page range at a time.
+        
+        Up to INGEST_PARSE_WORKERS ranges are extracted ahead in parallel, so
+        later pages are parsed while the caller chunks and embeds earlier ones.
+        """
+        if file_type == "application/pdf":
+            ranges = [(start, min(start + self.pages_per_task, page_count)) for start in range(0, page_count, self.pages_per_task)]
+        else:
+            ranges = [(0, 1)]
+        
+        loop = asyncio.get_running_loop()
+        remaining = iter(ranges)
+        pending = deque()
+        
+        def submit_next():
+            page_range = next(remaining, None)
+            if page_range is not None:
+                pending.append(loop.run_in_executor(self._parse_pool, _extract_pages, file_path, file_type, *page_range))
+        
+        async with self._parse_slots:
+            for _ in range(self.parse_workers):
+                submit_next()
+            try:
+                while pending:
+                    pages = await pending.popleft()
+                    submit_next()
+                    yield pages
+            finally:
+                for future in pending:
+                    future.cancel()
+    
+    async def chunk_pages(
+        self,
+        chunker: Chunker,
+        pages: List[Tuple[Optional[int], str]],
+        final: bool = False
+    ) -> List[Tuple[Optional[int], str]]:
+        """
+        Feed pages to a chunker in the embedding thread pool, since token
+        counting is CPU-bound (the tokenizer releases the GIL).
+        
+        Returns:
+            (page, chunk) pairs completed, including the rest if final
+        """
+        def run():
+            chunks = []
+            for page, text in pages:
+                chunks.extend(chunker.add_page(page, text))
+            if final:
+                chunks.extend(chunker.finish())
+            return chunks
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._embed_pool, run)
+    
+    async def embed_batch(self, embedding_service: "EmbeddingService", texts: List[str]) -> np.ndarray:
+        """Embed texts in the embedding thread pool."""
+        async with self._embed_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._embed_pool, embedding_service.embed_batch, texts)
+    
+    def shutdown(self):
+        """Stop the pools, waiting for running jobs to finish."""
+        self._parse_pool.shutdown(wait=True, cancel_futures=True)
+        self._embed_pool.shutdown(wait=True, cancel_futures=True)
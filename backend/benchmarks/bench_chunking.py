@@ -0,0 +1,130 @@
+"""
+Benchmark chunking strategies: throughput, chunk sizes and retrieval quality.
+
+The default corpus is synthetic and fixed (seeded): study notes with
+headings and filler text, each planting facts that are then asked about.
+A question counts as answered when a top-k chunk contains the fact's value.
+The legacy 500-character sentence chunker is included as a baseline.
+
+Usage (from backend/):
+    python -m benchmarks.bench_chunking
+    python -m benchmarks.bench_chunking --max-tokens 96 --overlap 16 --k 5
+    python -m benchmarks.bench_chunking --docs 200
+"""
+import argparse
+import random
+import re
+import time
+from typing import List, Tuple
+from dotenv import load_dotenv
+load_dotenv()
+
+import numpy as np
+from app.services.chunking import STRATEGIES, Chunker, tokenizer_counter
+from app.services.embeddings import EmbeddingService
+
+_SUBJECTS = ["cell", "enzyme", "protein", "reactor", "circuit", "market", "treaty", "glacier", "neuron", "alloy"]
+_ATTRIBUTES = ["melting point", "half-life", "diameter", "founding year", "error rate", "peak output", "mass", "frequency"]
+_FILLER = [
+    "This topic is often covered in introductory courses.",
+    "Students should review the lecture slides before the exam.",
+    "Several textbooks describe the process in more detail.",
+    "The following section summarizes the main ideas.",
+    "Researchers continue to debate the best interpretation.",
+    "Practice problems at the end of the chapter reinforce these concepts.",
+    "Historical context helps explain why the theory developed this way.",
+    "A common misconception is addressed in the next paragraph.",
+]
+
+def build_corpus(num_docs: int, seed: int = 7) -> Tuple[List[List[str]], List[Tuple[str, str]]]:
+    """Synthetic documents (lists of pages) and (question, expected value) pairs."""
+    rng = random.Random(seed)
+    documents, questions = [], []
+    for d in range(num_docs):
+        pages = []
+        for p in range(rng.randint(1, 4)):
+            paragraphs = []
+            for s in range(rng.randint(2, 4)):
+                paragraphs.append(f"{d}.{p}.{s} {rng.choice(_SUBJECTS).title()} Notes")
+                sentences = rng.sample(_FILLER, rng.randint(2, 6))
+                for _ in range(rng.randint(1, 2)):
+                    entity = f"{rng.choice(_SUBJECTS)} {d}-{p}-{s}-{len(questions)}"
+                    attribute = rng.choice(_ATTRIBUTES)
+                    value = f"{rng.randint(100, 99999)} units"
+                    sentences.insert(rng.randint(0, len(sentences)), f"The {attribute} of the {entity} is {value}.")
+                    questions.append((f"What is the {attribute} of the {entity}?", value))
+                paragraphs.append(" ".join(sentences))
+            pages.append("\n\n".join(paragraphs))
+        documents.append(pages)
+    return documents, questions
+
+def legacy_chunks(text: str, chunk_size: int = 500) -> List[str]:
+    """The original 500-character sentence chunker, as a baseline."""
+    sentences = re.split(r'(?<=[.!?])\s+', text)
+    chunks, current, length = [], [], 0
+    for sentence in sentences:
+        if length + len(sentence) > chunk_size and current:
+            chunks.append(' '.join(current))
+            overlap_text = ' '.join(current[-2:]) if len(current) >= 2 else current[-1]
+            current, length = [overlap_text, sentence], len(overlap_text) + len(sentence)
+        else:
+            current.append(sentence)
+            length += len(sentence)
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+def evaluate(name: str, chunks: List[str], seconds: float, embedding_service: EmbeddingService,
+             question_vectors: np.ndarray, questions: List[Tuple[str, str]], k: int):
+    """Print throughput, size stats and retrieval quality for one chunking."""
+    counts = tokenizer_counter(embedding_service.tokenizer)(chunks)
+    limit = embedding_service.max_seq_length - 2
+    vectors = embedding_service.embed_batch(chunks)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    scores = question_vectors @ vectors.T
+    top = np.argsort(-scores, axis=1)[:, :k]
+    hits, reciprocal_ranks = 0, []
+    for (_, value), ranked in zip(questions, top):
+        rank = next((r for r, i in enumerate(ranked) if value in chunks[i]), None)
+        hits += rank is not None
+        reciprocal_ranks.append(0.0 if rank is None else 1.0 / (rank + 1))
+
+    print(f"{name:<22}{len(chunks):>8}{len(chunks) / seconds:>12.0f}{counts.mean():>10.1f}"
+          f"{(counts > limit).mean() * 100:>10.1f}%{hits / len(questions):>10.3f}{np.mean(reciprocal_ranks):>8.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunking strategies.")
+    parser.add_argument("--docs", type=int, default=60, help="Synthetic documents in the corpus")
+    parser.add_argument("--max-tokens", type=int, default=128, help="Token budget per chunk")
+    parser.add_argument("--overlap", type=int, default=16, help="Overlap tokens between chunks")
+    parser.add_argument("--k", type=int, default=5, help="Chunks retrieved per question")
+    args = parser.parse_args()
+
+    embedding_service = EmbeddingService()
+    documents, questions = build_corpus(args.docs)
+    question_vectors = embedding_service.embed_batch([q for q, _ in questions])
+    question_vectors /= np.linalg.norm(question_vectors, axis=1, keepdims=True)
+    print(f"Corpus: {len(documents)} documents, {sum(len(d) for d in documents)} pages, {len(questions)} questions")
+    print(f"{'strategy':<22}{'chunks':>8}{'chunks/s':>12}{'tokens':>10}{'>limit':>11}{'recall@' + str(args.k):>10}{'MRR':>8}")
+
+    start = time.perf_counter()
+    chunks = [chunk for pages in documents for chunk in legacy_chunks("\n".join(pages))]
+    evaluate("legacy 500 chars", chunks, time.perf_counter() - start, embedding_service, question_vectors, questions, args.k)
+
+    for strategy in STRATEGIES:
+        start = time.perf_counter()
+        chunks = []
+        for pages in documents:
+            chunker = Chunker(
+                tokenizer=embedding_service.tokenizer,
+                strategy=strategy,
+                max_tokens=args.max_tokens,
+                overlap_tokens=args.overlap,
+                model_max_tokens=embedding_service.max_seq_length
+            )
+            chunks.extend(chunk for _, chunk in chunker.chunk_pages(list(enumerate(pages, start=1))))
+        evaluate(strategy, chunks, time.perf_counter() - start, embedding_service, question_vectors, questions, args.k)
+
+if __name__ == "__main__":
+    main()
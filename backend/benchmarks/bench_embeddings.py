@@ -0,0 +1,85 @@
+"""
+Micro-benchmark embedding throughput on CPU.
+
+Embeds the chunks of the synthetic corpus from bench_chunking with a few
+EmbeddingService configurations and reports chunks/sec, plus the mean
+cosine similarity to float32 vectors for reduced-precision runs. The
+embedding cache is disabled so every run really encodes.
+
+Usage (from backend/):
+    python -m benchmarks.bench_embeddings
+    python -m benchmarks.bench_embeddings --threads 1 2 4 --batch-sizes 16 64 128
+"""
+import argparse
+import os
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+import numpy as np
+from app.services.chunking import Chunker
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embeddings import EmbeddingService
+from benchmarks.bench_chunking import build_corpus
+
+def build_service(batch_size: int, threads: int, precision: str) -> EmbeddingService:
+    """An EmbeddingService configured through the environment, as in production."""
+    os.environ["EMBEDDING_BATCH_SIZE"] = str(batch_size)
+    os.environ["EMBEDDING_THREADS"] = str(threads)
+    os.environ["EMBEDDING_PRECISION"] = precision
+    return EmbeddingService(cache=EmbeddingCache())
+
+def timed(encode, texts, repeats: int):
+    """Best-of-repeats seconds and the vectors from the last run."""
+    best, vectors = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        vectors = encode(texts)
+        best = min(best, time.perf_counter() - start)
+    return best, vectors
+
+def cosine(a: np.ndarray, b: np.ndarray) -> float:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float(np.mean(np.sum(a * b, axis=1)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding throughput.")
+    parser.add_argument("--docs", type=int, default=60, help="Synthetic documents to chunk")
+    parser.add_argument("--threads", type=int, nargs="+", default=[os.cpu_count() or 1], help="torch thread counts")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 64], help="Batch sizes")
+    parser.add_argument("--precisions", nargs="+", default=["float32", "int8"], help="Precisions to compare")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per configuration (best is reported)")
+    args = parser.parse_args()
+    
+    # Measure encoding only
+    os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+    os.environ["EMBEDDING_CACHE_DISK"] = "false"
+    
+    documents, _ = build_corpus(args.docs)
+    texts = []
+    for pages in documents:
+        texts.extend(chunk for _, chunk in Chunker(strategy="paragraph").chunk_pages(list(enumerate(pages, start=1))))
+    print(f"{len(texts)} chunks, {os.cpu_count()} CPUs")
+    print(f"{'configuration':<40}{'chunks/s':>10}{'cosine':>10}")
+    
+    reference = None
+    for threads in args.threads:
+        service = build_service(32, threads, "float32")
+        # Warm up, then the old path: upload order, default batch size, one encode call
+        service.model.encode(texts[:32], show_progress_bar=False)
+        seconds, reference = timed(lambda t: service.model.encode(t, convert_to_numpy=True, show_progress_bar=False), texts, args.repeats)
+        print(f"{f'baseline encode() threads={threads}':<40}{len(texts) / seconds:>10.1f}{'':>10}")
+        
+        for precision in args.precisions:
+            for batch_size in args.batch_sizes:
+                service = build_service(batch_size, threads, precision)
+                if service.precision != precision:
+                    break
+                service.embed_batch(texts[:batch_size])
+                seconds, vectors = timed(service.embed_batch, texts, args.repeats)
+                name = f"{precision} batch={batch_size} threads={threads}"
+                print(f"{name:<40}{len(texts) / seconds:>10.1f}{cosine(vectors, reference):>10.4f}")
+
+if __name__ == "__main__":
+    main()
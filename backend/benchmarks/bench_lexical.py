@@ -0,0 +1,69 @@
+"""
+Benchmark the BM25 keyword index: build rate and query latency.
+
+Indexes a synthetic corpus of chunk-sized texts (Zipf-distributed words
+plus rare course-code-like terms) into a temporary LexicalIndex, then
+times queries of common words, rare terms and a mix.
+
+Usage (from backend/):
+    python -m benchmarks.bench_lexical
+    python -m benchmarks.bench_lexical --chunks 200000 --queries 500
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from app.services.lexical_index import LexicalIndex
+
+def synthetic_chunks(n: int, vocabulary: int = 50000, words: int = 90, seed: int = 0):
+    """Texts of Zipf-distributed words, each with one rare code term."""
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        ranks = np.minimum(rng.zipf(1.2, size=words), vocabulary)
+        yield " ".join(f"w{r}" for r in ranks) + f" csc-{i % 5000}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BM25 keyword index.")
+    parser.add_argument("--chunks", type=int, default=50000, help="Chunks to index")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per kind")
+    parser.add_argument("--k", type=int, default=10, help="Results per query")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        index = LexicalIndex(os.path.join(directory, "bench.bm25.db"))
+        start = time.perf_counter()
+        batch_ids, batch_texts = [], []
+        for i, text in enumerate(synthetic_chunks(args.chunks)):
+            batch_ids.append(i)
+            batch_texts.append(text)
+            if len(batch_ids) == 256:
+                index.add(batch_ids, batch_texts)
+                batch_ids, batch_texts = [], []
+        index.add(batch_ids, batch_texts)
+        seconds = time.perf_counter() - start
+        size_mb = os.path.getsize(index.db_path) / (1024 * 1024)
+        print(f"Indexed {args.chunks} chunks in {seconds:.1f}s ({args.chunks / seconds:.0f} chunks/s), {size_mb:.1f} MB")
+        
+        rng = np.random.default_rng(1)
+        kinds = {
+            "common words": [f"w{a} w{b}" for a, b in rng.integers(1, 20, size=(args.queries, 2))],
+            "rare code": [f"CSC {c}" for c in rng.integers(0, 5000, size=args.queries)],
+            "mixed": [f"w{a} w{b} csc-{c}" for a, b, c in zip(
+                rng.integers(1, 200, size=args.queries),
+                rng.integers(200, 5000, size=args.queries),
+                rng.integers(0, 5000, size=args.queries)
+            )],
+        }
+        print(f"{'query kind':<16}{'p50 ms':>10}{'p95 ms':>10}")
+        for kind, queries in kinds.items():
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query, args.k)
+                latencies.append((time.perf_counter() - start) * 1000)
+            print(f"{kind:<16}{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 95):>10.2f}")
+        index.close()
+
+if __name__ == "__main__":
+    main()
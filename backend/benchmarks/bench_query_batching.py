@@ -0,0 +1,74 @@
+"""
+Benchmark query embedding under concurrency: one model call per query
+versus the QueryBatcher.
+
+Each concurrency level runs that many simulated clients, each embedding
+queries back to back, and reports queries/sec and p50/p95 latency. The
+embedding cache is disabled and every query text is distinct.
+
+Usage (from backend/):
+    python -m benchmarks.bench_query_batching
+    python -m benchmarks.bench_query_batching --concurrency 1 8 64 --wait-ms 2 5
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+load_dotenv()
+
+import numpy as np
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embeddings import EmbeddingService
+from app.services.query_batcher import QueryBatcher
+
+async def run_clients(embed, concurrency: int, per_client: int):
+    """(queries/sec, latencies in ms) for concurrent clients calling embed."""
+    latencies = []
+    
+    async def client(c: int):
+        for i in range(per_client):
+            start = time.perf_counter()
+            await embed(f"what does lecture {c} say about topic number {i}?")
+            latencies.append((time.perf_counter() - start) * 1000)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(concurrency)))
+    return concurrency * per_client / (time.perf_counter() - start), np.array(latencies)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark query embedding micro-batching.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128], help="Concurrent clients")
+    parser.add_argument("--queries", type=int, default=512, help="Queries per concurrency level")
+    parser.add_argument("--wait-ms", type=float, nargs="+", default=[5], help="QUERY_BATCH_WAIT_MS values")
+    parser.add_argument("--batch-size", type=int, default=32, help="QUERY_BATCH_SIZE")
+    args = parser.parse_args()
+    
+    os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+    os.environ["EMBEDDING_CACHE_DISK"] = "false"
+    embedding_service = EmbeddingService(cache=EmbeddingCache())
+    embedding_service.embed_text("warm up")
+    
+    # The old path: one model call per query (off the event loop, to be fair)
+    pool = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+    
+    async def embed_single(text):
+        return await loop.run_in_executor(pool, embedding_service.embed_text, text)
+    
+    print(f"{'mode':<24}{'clients':>8}{'q/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for concurrency in args.concurrency:
+        per_client = max(1, args.queries // concurrency)
+        qps, latencies = await run_clients(embed_single, concurrency, per_client)
+        print(f"{'single':<24}{concurrency:>8}{qps:>10.1f}{np.percentile(latencies, 50):>10.1f}{np.percentile(latencies, 95):>10.1f}")
+        for wait_ms in args.wait_ms:
+            batcher = QueryBatcher(embedding_service, max_batch=args.batch_size, max_wait_ms=wait_ms)
+            qps, latencies = await run_clients(batcher.embed, concurrency, per_client)
+            batcher.shutdown()
+            name = f"batched wait={wait_ms:g}ms"
+            print(f"{name:<24}{concurrency:>8}{qps:>10.1f}{np.percentile(latencies, 50):>10.1f}{np.percentile(latencies, 95):>10.1f}")
+    pool.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
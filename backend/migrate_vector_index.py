@@ -0,0 +1,153 @@
+"""
+Migration script to rebuild the FAISS index as another index type.
+Run this after changing VECTOR_INDEX_TYPE, or to train an IVF index once
+enough documents have been uploaded.
+
+Any rebuild also converts an index from before cosine scoring (L2 distance
+over raw embeddings) to inner product over normalized embeddings. --cosine
+does only that, keeping the index type; it is a no-op on converted indexes.
+
+Usage:
+    python migrate_vector_index.py --cosine
+    python migrate_vector_index.py --type hnsw
+    python migrate_vector_index.py --type ivf_pq --report
+    python migrate_vector_index.py --report-only
+"""
+import argparse
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+import faiss
+import numpy as np
+from app.services.embeddings import EmbeddingService
+from app.services.vector_store import VectorStore
+from app.services.index_factory import (
+    INDEX_TYPES, index_type_of, inner_index, is_inner_product, normalized, search_parameters
+)
+
+def _timed_search(index, queries: np.ndarray, k: int, params=None):
+    """Search one query at a time, as the API does. Returns (ids, latencies in ms)."""
+    ids = np.empty((len(queries), k), dtype='int64')
+    latencies = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        if params is None:
+            _, found = index.search(query.reshape(1, -1), k)
+        else:
+            _, found = index.search(query.reshape(1, -1), k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids[i] = found[0]
+    return ids, np.array(latencies)
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    """Fraction of the true top-k found."""
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def report(ids: np.ndarray, vectors: np.ndarray, index, num_queries: int = 200, k: int = 10):
+    """Print recall@k and latency of index against a flat baseline."""
+    rng = np.random.default_rng(0)
+    if is_inner_product(index):
+        vectors = normalized(vectors)
+    sample = vectors[rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)]
+    # Perturb stored vectors so queries are near, not on, indexed points
+    noise = rng.normal(scale=vectors.std() * 0.3, size=sample.shape).astype('float32')
+    queries = np.ascontiguousarray(sample + noise, dtype='float32')
+    k = min(k, len(vectors))
+    
+    baseline = faiss.IndexFlatIP(vectors.shape[1]) if is_inner_product(index) else faiss.IndexFlatL2(vectors.shape[1])
+    baseline.add(vectors)
+    truth, flat_ms = _timed_search(baseline, queries, k)
+    # The baseline returns positions; the store returns chunk ids
+    truth = ids[truth]
+    
+    print(f"\nRecall@{k} vs flat baseline ({len(vectors)} vectors, {len(queries)} queries)")
+    print(f"{'index':<24}{'recall':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    print(f"{'flat':<24}{1.0:>8.3f}{np.percentile(flat_ms, 50):>10.3f}{np.percentile(flat_ms, 95):>10.3f}")
+    
+    index_type = index_type_of(index)
+    if index_type == "hnsw":
+        sweep = [("efSearch", v) for v in (16, 32, 64, 128, 256)]
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        sweep = [("nprobe", v) for v in (1, 4, 16, 64, 256) if v <= inner_index(index).nlist]
+    else:
+        sweep = [(None, None)]
+    
+    for name, value in sweep:
+        params = search_parameters(index, None) if name else None
+        if name:
+            setattr(params, name, value)
+        found, ms = _timed_search(index, queries, k, params)
+        label = f"{index_type} {name}={value}" if name else index_type
+        print(f"{label:<24}{_recall(found, truth):>8.3f}{np.percentile(ms, 50):>10.3f}{np.percentile(ms, 95):>10.3f}")
+
+def migrate(index_type: str, show_report: bool):
+    """Rebuild the stored index as index_type."""
+    embedding_service = EmbeddingService()
+    vector_store = VectorStore()
+    vector_store.load(embedding_service.get_dimension())
+    
+    if vector_store.index is None or vector_store.index.ntotal == 0:
+        print("Vector store is empty. New indexes will use VECTOR_INDEX_TYPE automatically.")
+        return
+    
+    current = index_type_of(vector_store.index)
+    # Ground truth for the report comes from the vectors before re-encoding
+    ids, vectors = vector_store.get_all_vectors() if show_report else (None, None)
+    print(f"Rebuilding {vector_store.index.ntotal} vectors: {current} -> {index_type}...")
+    start = time.perf_counter()
+    vector_store.rebuild(index_type)
+    print(f"Built and saved {index_type_of(vector_store.index)} index in {time.perf_counter() - start:.1f}s")
+    print("✅ Migration completed successfully!")
+    
+    if show_report:
+        report(ids, vectors, vector_store.index)
+
+def migrate_to_cosine():
+    """Convert an L2 index to inner product over normalized vectors, keeping its type."""
+    embedding_service = EmbeddingService()
+    vector_store = VectorStore()
+    vector_store.load(embedding_service.get_dimension())
+    
+    if vector_store.index is None or vector_store.index.ntotal == 0:
+        print("Vector store is empty. New indexes use cosine scoring automatically.")
+        return
+    if is_inner_product(vector_store.index):
+        print("Index already uses cosine scoring. Nothing to do.")
+        return
+    
+    index_type = index_type_of(vector_store.index)
+    print(f"Converting {vector_store.index.ntotal} vectors ({index_type}) from L2 distance to cosine similarity...")
+    start = time.perf_counter()
+    vector_store.rebuild(index_type)
+    print(f"Built and saved cosine {index_type} index in {time.perf_counter() - start:.1f}s")
+    print("✅ Migration completed successfully!")
+
+def report_only():
+    """Report the stored index against a flat baseline without changing it."""
+    embedding_service = EmbeddingService()
+    vector_store = VectorStore()
+    vector_store.load(embedding_service.get_dimension())
+    if vector_store.index is None or vector_store.index.ntotal == 0:
+        print("Vector store is empty.")
+        return
+    ids, vectors = vector_store.get_all_vectors()
+    report(ids, vectors, vector_store.index)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the FAISS index as another type.")
+    parser.add_argument("--type", choices=INDEX_TYPES, help="Target index type")
+    parser.add_argument("--cosine", action="store_true", help="Only convert an L2 index to cosine scoring")
+    parser.add_argument("--report", action="store_true", help="Print recall vs latency after migrating")
+    parser.add_argument("--report-only", action="store_true", help="Only report on the current index")
+    args = parser.parse_args()
+    
+    if args.report_only:
+        report_only()
+    elif args.type:
+        migrate(args.type, args.report)
+    elif args.cosine:
+        migrate_to_cosine()
+    else:
+        parser.error("--type, --cosine or --report-only is required")
@@ -0,0 +1,83 @@
+import numpy as np
+from app.services.index_log import IndexLog, OP_ADD, OP_DELETE
+
+def _log(tmp_path):
+    log = IndexLog(str(tmp_path / "faiss_index"))
+    with log.lock():
+        manifest = log.create()
+    return log, manifest
+
+def _vectors(n, dimension=4, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dimension)).astype('float32')
+
+def test_replay_returns_records_in_order(tmp_path):
+    log, manifest = _log(tmp_path)
+    with log.lock():
+        first = log.append(manifest, OP_ADD, np.arange(3), _vectors(3))
+        second = log.append(manifest, OP_DELETE, np.array([1]))
+    
+    records = list(log.replay(manifest, manifest.lsn))
+    assert [(op, ids.tolist(), lsn) for op, ids, _, lsn in records] == [
+        (OP_ADD, [0, 1, 2], first),
+        (OP_DELETE, [1], second),
+    ]
+    np.testing.assert_array_equal(records[0][2], _vectors(3))
+    assert records[1][2] is None
+    # Replay from a position only yields what comes after it
+    assert [lsn for *_, lsn in log.replay(manifest, first)] == [second]
+
+def test_replay_stops_at_torn_record(tmp_path):
+    log, manifest = _log(tmp_path)
+    with log.lock():
+        end = log.append(manifest, OP_ADD, np.arange(2), _vectors(2))
+        log.append(manifest, OP_ADD, np.arange(2, 4), _vectors(2, seed=1))
+    # A crash cut the second record short
+    with open(log._path(manifest.wal), "r+b") as f:
+        f.truncate(end - manifest.lsn + 10)
+    
+    assert [lsn for *_, lsn in log.replay(manifest, manifest.lsn)] == [end]
+    
+    with log.lock():
+        log.truncate(manifest, end)
+        after = log.append(manifest, OP_DELETE, np.array([0]))
+    assert [lsn for *_, lsn in log.replay(manifest, manifest.lsn)] == [end, after]
+
+def test_replay_stops_at_corrupt_record(tmp_path):
+    log, manifest = _log(tmp_path)
+    with log.lock():
+        end = log.append(manifest, OP_ADD, np.arange(2), _vectors(2))
+        log.append(manifest, OP_ADD, np.arange(2, 4), _vectors(2, seed=1))
+    with open(log._path(manifest.wal), "r+b") as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 0xFF]))
+    
+    assert [lsn for *_, lsn in log.replay(manifest, manifest.lsn)] == [end]
+
+def test_snapshot_carries_records_after_its_position(tmp_path):
+    log, manifest = _log(tmp_path)
+    with log.lock():
+        covered = log.append(manifest, OP_ADD, np.arange(2), _vectors(2))
+        tail = log.append(manifest, OP_DELETE, np.array([0]))
+    
+    snapshot = log.write_snapshot(np.frombuffer(b"index bytes", dtype='uint8'), covered)
+    assert snapshot is not None
+    assert snapshot.lsn == covered
+    assert log.read_manifest().to_dict() == snapshot.to_dict()
+    assert log.read_snapshot(snapshot).tobytes() == b"index bytes"
+    records = list(log.replay(snapshot, snapshot.lsn))
+    assert [(op, ids.tolist(), lsn) for op, ids, _, lsn in records] == [(OP_DELETE, [0], tail)]
+    # The previous generation's files are gone
+    assert not (tmp_path / manifest.wal).exists()
+
+def test_older_snapshot_is_superseded(tmp_path):
+    log, manifest = _log(tmp_path)
+    with log.lock():
+        first = log.append(manifest, OP_ADD, np.arange(2), _vectors(2))
+        second = log.append(manifest, OP_ADD, np.arange(2, 4), _vectors(2, seed=1))
+    
+    assert log.write_snapshot(np.zeros(4, dtype='uint8'), second) is not None
+    # A worker that serialized an older state loses the race
+    assert log.write_snapshot(np.zeros(4, dtype='uint8'), first) is None
+    assert log.read_manifest().lsn == second
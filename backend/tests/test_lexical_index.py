@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+TEXTS = {
+    1: "Lecture notes on sorting algorithms and their running time",
+    2: "CSC-231 covers data structures: stacks, queues and trees",
+    3: "Sorting with heaps: heapsort runs in n log n time",
+    4: "Office hours and the grading policy for the course",
+}
+
+@pytest.fixture
+def index(tmp_path):
+    index = LexicalIndex(str(tmp_path / "bm25.db"))
+    index.add(TEXTS.keys(), TEXTS.values())
+    yield index
+    index.close()
+
+def test_tokenize_drops_stopwords_and_splits_codes():
+    terms = tokenize("The CSC-231 exam")
+    assert "the" not in terms
+    assert {"csc-231", "csc", "231", "exam"} <= set(terms)
+
+def test_exact_term_ranks_its_chunk_first(index):
+    ids, scores = index.search("csc-231", k=3)
+    assert ids.tolist()[0] == 2
+    assert np.all(np.diff(scores) <= 0)
+    
+    ids, _ = index.search("sorting time", k=4)
+    assert set(ids.tolist()[:2]) == {1, 3}
+    assert 4 not in ids.tolist()
+
+def test_search_within_candidates(index):
+    ids, _ = index.search("sorting", k=5, candidate_ids=np.array([3, 4], dtype='int64'))
+    assert ids.tolist() == [3]
+
+def test_deleted_chunks_are_not_returned(index):
+    index.delete([3])
+    ids, _ = index.search("sorting heapsort", k=5)
+    assert ids.tolist() == [1]
+    assert sorted(index.chunk_ids().tolist()) == [1, 2, 4]
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+    assert [item for item, _ in fused][:2] == [1, 3]
+    assert dict(fused)[1] == pytest.approx(1 / 61 + 1 / 62)
+    assert dict(fused)[4] == pytest.approx(1 / 63)
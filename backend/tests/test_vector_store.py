@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from app.services.vector_store import VectorStore
+
+DIMENSION = 8
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "faiss_index")
+
+def _open(store_path):
+    store = VectorStore(store_path)
+    store.load(DIMENSION)
+    return store
+
+def _add(store, document_id, n, seed):
+    embeddings = np.random.default_rng(seed).standard_normal((n, DIMENSION)).astype('float32')
+    store.add_embeddings(embeddings, [(document_id, i, f"{document_id} chunk {i}", 1) for i in range(n)])
+    return embeddings
+
+def _ids(store):
+    ids, _ = store.get_all_vectors()
+    return sorted(ids.tolist())
+
+def _documents(store, query, k=50):
+    return {r['document_id'] for r in store.search(query, k=k)}
+
+def test_torn_log_record_is_cut_off_on_load(store_path):
+    store = _open(store_path)
+    _add(store, "a", 5, seed=0)
+    manifest = store.log.read_manifest()
+    end = store.log.wal_end(manifest)
+    # A crash while appending left half a record
+    with open(store.log._path(manifest.wal), "ab") as f:
+        f.write(b"\x01\x05\x00\x00\x00partial")
+    
+    reopened = _open(store_path)
+    assert reopened.count() == 5
+    assert store.log.wal_end(store.log.read_manifest()) == end
+    
+    # The next add starts on a record boundary and survives another load
+    _add(reopened, "b", 3, seed=1)
+    assert _open(store_path).count() == 8
+
+def test_compaction_drops_deleted_chunks_and_keeps_ids(store_path):
+    store = _open(store_path)
+    kept = _add(store, "keep", 6, seed=0)
+    _add(store, "drop", 4, seed=1)
+    assert store.delete_document("drop") == 4
+    live_ids = _ids(store)
+    hits_before = [(r['chunk_id'], r['document_id']) for r in store.search(kept[2], k=3)]
+    assert store.index.ntotal == 10
+    
+    store.compact()
+    
+    assert store.index.ntotal == 6
+    assert not store._state.tombstones
+    assert _ids(store) == live_ids
+    assert [(r['chunk_id'], r['document_id']) for r in store.search(kept[2], k=3)] == hits_before
+    # Purged rows do not come back as deleted chunks on the next load
+    reopened = _open(store_path)
+    assert _ids(reopened) == live_ids
+    assert reopened.count() == 6
+    assert _documents(reopened, kept[0]) == {"keep"}
+
+def test_changes_from_another_instance_are_picked_up(store_path):
+    writer = _open(store_path)
+    reader = _open(store_path)
+    query = _add(writer, "a", 4, seed=0)[0]
+    
+    assert reader.count() == 0
+    assert reader.reload_if_changed(DIMENSION)
+    assert reader.count() == 4
+    assert _documents(reader, query) == {"a"}
+    assert not reader.reload_if_changed(DIMENSION)
+    
+    _add(writer, "b", 3, seed=1)
+    writer.delete_document("a")
+    assert reader.reload_if_changed(DIMENSION)
+    assert _documents(reader, query) == {"b"}
+    
+    # A snapshot written past the reader's position is loaded instead of replayed
+    _add(writer, "c", 2, seed=2)
+    writer.save()
+    assert reader.reload_if_changed(DIMENSION)
+    assert reader.count() == writer.count() == 5
+    assert _ids(reader) == _ids(writer)
+    
+    # Both instances keep appending to the same log
+    _add(reader, "d", 2, seed=3)
+    assert writer.reload_if_changed(DIMENSION)
+    assert writer.count() == 7
+    assert _documents(_open(store_path), query) == {"b", "c", "d"}
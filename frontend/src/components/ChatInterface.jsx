@@ -1,5 +1,5 @@
 import { useState } from 'react';
-import { askQuestion } from '../services/api';
+import { askQuestionStream } from '../services/api';
 import { FiMessageCircle, FiSend, FiLoader } from 'react-icons/fi';
 import './ChatInterface.css';
 
@@ -18,17 +18,15 @@ function ChatInterface({ documents, user }) {
     setQuestion('');
 
     try {
-      const response = await askQuestion(
-        question,
-        null,
-        user?.major || null,
-        user?.year || null
-      );
-      const assistantMessage = {
-        role: 'assistant',
-        content: response.answer,
-      };
-      setMessages([...messages, userMessage, assistantMessage]);
+      // Show the answer as it streams in
+      await askQuestionStream(question, {
+        userMajor: user?.major || null,
+        userYear: user?.year || null,
+        onDelta: (_text, answer) => {
+          setLoading(false);
+          setMessages([...messages, userMessage, { role: 'assistant', content: answer }]);
+        },
+      });
     } catch (error) {
       let errorMessage = 'Sorry, I encountered an error. ';
       if (error.message && error.message.includes('Cannot connect')) {
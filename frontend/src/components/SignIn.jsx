@@ -121,6 +121,7 @@ function SignIn({ onSignIn }) {
         last_name: userData.last_name,
         year: userData.year,
         major: userData.major,
+        token: userData.token,
       };
       localStorage.setItem('user', JSON.stringify(userToStore));
       onSignIn(userToStore);
@@ -10,6 +10,19 @@ const api = axios.create({
   timeout: 30000, // 30 second timeout
 });
 
+// Send the signed-in user's token, so the backend knows who is asking
+api.interceptors.request.use((config) => {
+  try {
+    const token = JSON.parse(localStorage.getItem('user') || 'null')?.token;
+    if (token) {
+      config.headers.Authorization = `Bearer ${token}`;
+    }
+  } catch (error) {
+    // Unreadable saved user: send the request anonymously
+  }
+  return config;
+});
+
 // Add request interceptor for better error handling
 api.interceptors.response.use(
   (response) => response,
@@ -23,6 +36,7 @@ api.interceptors.response.use(
   }
 );
 
+// Identical files are stored once and linked to each user who uploads them
 export const uploadDocument = async (file) => {
   const formData = new FormData();
   formData.append('file', file);
@@ -33,7 +47,25 @@ export const uploadDocument = async (file) => {
     },
     timeout: 60000, // 60 seconds for file uploads
   });
-  
+
+  // Processing happens in the background; wait for the ingestion job
+  let document = response.data;
+  while (document.job_id && document.status !== 'processed') {
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    const job = await getIngestionJob(document.job_id);
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Document processing failed.');
+    }
+    if (job.status === 'completed') {
+      document = { ...document, chunks_count: job.chunks_total ?? 0, status: 'processed' };
+    }
+  }
+
+  return document;
+};
+
+export const getIngestionJob = async (jobId) => {
+  const response = await api.get(`/api/documents/jobs/${jobId}`);
   return response.data;
 };
 
@@ -47,6 +79,73 @@ export const askQuestion = async (question, documentIds = null, userMajor = null
   return response.data;
 };
 
+// Streams an answer over server-sent events. Calls onSources once with the
+// retrieved sources, onDelta for each piece of answer text, and resolves with
+// { answer, sources, confidence } when the stream ends.
+export const askQuestionStream = async (
+  question,
+  { documentIds = null, userMajor = null, userYear = null, onSources, onDelta } = {}
+) => {
+  let response;
+  try {
+    response = await fetch(`${API_BASE_URL}/api/questions/ask/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        question,
+        document_ids: documentIds,
+        user_major: userMajor,
+        user_year: userYear,
+      }),
+    });
+  } catch (error) {
+    throw new Error('Cannot connect to server. Make sure the backend is running on http://localhost:8000');
+  }
+  if (!response.ok || !response.body) {
+    throw new Error(`Request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  const result = { answer: '', sources: [], confidence: 0 };
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      const payload = data ? JSON.parse(data) : {};
+
+      if (event === 'sources') {
+        result.sources = payload.sources;
+        onSources?.(payload.sources);
+      } else if (event === 'delta') {
+        result.answer += payload.text;
+        onDelta?.(payload.text, result.answer);
+      } else if (event === 'done') {
+        result.confidence = payload.confidence;
+      } else if (event === 'error') {
+        throw new Error(payload.message);
+      }
+    }
+  }
+
+  return result;
+};
+
 export const generateQuiz = async (topic, numQuestions, questionType, documentIds = null) => {
   const response = await api.post('/api/quizzes/generate', {
     topic,